@@ -1,41 +1,254 @@
-from django.contrib import admin
-from .models import Categoria, Leitor, Livro, Emprestimo, Agendamento
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Q
+from django.db.models.functions import Upper
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import (
+    Autor, Categoria, Leitor, Livro, Emprestimo, EmprestimoHistorico, Agendamento, NotificacaoEnviada, Tarefa,
+    VarianteAutor,
+)
+from . import autores, circulacao
 
 
+# ============================================================
+# 🔹 PAGINAÇÃO E BUSCA PARA TABELAS GRANDES
+# ============================================================
+class ContagemEstimadaPaginator(Paginator):
+    """
+    Paginator que, para listagens sem filtro, usa a estimativa de linhas do
+    próprio banco (pg_class no Postgres, information_schema no MySQL) em vez
+    de um COUNT(*) completo. Com filtros ou em tabelas pequenas, conta normalmente.
+    """
+    LIMIAR_ESTIMATIVA = 10000
+
+    @cached_property
+    def count(self):
+        estimativa = self._estimar()
+        if estimativa is not None and estimativa > self.LIMIAR_ESTIMATIVA:
+            return estimativa
+        return super().count
+
+    def _estimar(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query') or queryset.query.where:
+            return None
+        conexao = connections[queryset.db]
+        tabela = queryset.model._meta.db_table
+        if conexao.vendor == 'postgresql':
+            sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+        elif conexao.vendor == 'mysql':
+            sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+        else:
+            return None
+        with conexao.cursor() as cursor:
+            cursor.execute(sql, [tabela])
+            linha = cursor.fetchone()
+        return int(linha[0]) if linha and linha[0] is not None else None
+
+
+def _maiusculas(termo, vendor):
+    # O UPPER() do SQLite só converte ASCII; o índice guarda o resto como está.
+    if vendor == 'sqlite':
+        return ''.join(c.upper() if c.isascii() else c for c in termo)
+    return termo.upper()
+
+
+class BuscaIndexadaMixin:
+    """
+    Troca o LIKE '%termo%' padrão do admin por consultas que usam índice:
+    igualdade nos campos de ``busca_exata`` e intervalo de prefixo sobre
+    UPPER(campo) nos campos de ``busca_prefixo`` (índices funcionais do modelo).
+    Um campo de outro modelo (``leitor__nome``) vira uma subconsulta pelo
+    índice do modelo relacionado, em vez de um LIKE através do JOIN.
+
+    Assim "Dom" acha "Dom Casmurro", mas "Casmurro" não. Um termo começando
+    com PREFIXO_SUBSTRING ("*Casmurro") faz a busca padrão do Django em
+    ``search_fields``, em qualquer parte do texto, varrendo a tabela.
+    """
+    PREFIXO_SUBSTRING = '*'
+    busca_exata = ()
+    busca_prefixo = ()
+    search_help_text = (
+        'Busca pelo início do nome (sem diferenciar maiúsculas) ou pelo código exato. '
+        'Comece com * para procurar em qualquer parte do texto (mais lento em tabelas grandes).'
+    )
+
+    def get_search_results(self, request, queryset, search_term):
+        termo = search_term.strip()
+        if termo.startswith(self.PREFIXO_SUBSTRING):
+            return super().get_search_results(request, queryset, termo[len(self.PREFIXO_SUBSTRING):].strip())
+        if not termo:
+            return queryset, False
+
+        condicao = Q()
+        for campo in self.busca_exata:
+            condicao |= Q(**{campo: termo})
+
+        inicio = _maiusculas(termo, connections[queryset.db].vendor)
+        fim = inicio[:-1] + chr(ord(inicio[-1]) + 1)
+        apelidos = {}
+        for campo in self.busca_prefixo:
+            relacao, _, campo_relacionado = campo.rpartition('__')
+            if relacao:
+                relacionados = queryset.model._meta.get_field(relacao).related_model.objects \
+                    .alias(maiusculo=Upper(campo_relacionado)).filter(maiusculo__gte=inicio, maiusculo__lt=fim)
+                condicao |= Q(**{f'{relacao}__in': relacionados.values('pk')})
+                continue
+            apelido = f'{campo}_maiusculo'
+            apelidos[apelido] = Upper(campo)
+            condicao |= Q(**{f'{apelido}__gte': inicio, f'{apelido}__lt': fim})
+        return queryset.alias(**apelidos).filter(condicao), False
+
+
+class ListaGrandeMixin:
+    """Opções comuns das listagens que passam de milhões de linhas."""
+    paginator = ContagemEstimadaPaginator
+    show_full_result_count = False
+
+
+# ============================================================
+# 🔹 ADMINS
+# ============================================================
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
     list_display = ('nome', 'criado', 'modificado', 'ativo')
 
 
+class VarianteAutorInline(admin.TabularInline):
+    model = VarianteAutor
+    extra = 0
+
+
+@admin.register(Autor)
+class AutorAdmin(BuscaIndexadaMixin, ListaGrandeMixin, admin.ModelAdmin):
+    list_display = ('id', 'nome', 'criado', 'modificado', 'ativo')
+    search_fields = ('nome',)
+    busca_prefixo = ('nome',)
+    ordering = ('nome',)
+    inlines = (VarianteAutorInline,)
+    actions = ('mesclar_autores',)
+
+    @admin.action(description='Mesclar autores selecionados (no que tiver mais livros)')
+    def mesclar_autores(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        if len(ids) < 2:
+            self.message_user(request, 'Selecione pelo menos dois autores.', messages.WARNING)
+            return
+        destino = Autor.livros.through.objects.filter(autor_id__in=ids).values('autor_id') \
+            .annotate(total=Count('id')).order_by('-total', 'autor_id').values_list('autor_id', flat=True).first()
+        total = autores.mesclar(destino or min(ids), ids)
+        self.message_user(request, f'{total} autor(es) mesclado(s).', messages.SUCCESS)
+
+
 @admin.register(Leitor)
-class LeitorAdmin(admin.ModelAdmin):
+class LeitorAdmin(BuscaIndexadaMixin, ListaGrandeMixin, admin.ModelAdmin):
     list_display = ('id', 'nome', 'email', 'telefone', 'criado', 'modificado', 'ativo')
     search_fields = ('nome', 'email')
+    busca_exata = ('email',)
+    busca_prefixo = ('nome',)
     list_filter = ('ativo',)
+    ordering = ('email',)
 
 
 @admin.register(Livro)
-class LivroAdmin(admin.ModelAdmin):
+class LivroAdmin(BuscaIndexadaMixin, ListaGrandeMixin, admin.ModelAdmin):
     list_display = ('codigo', 'nome', 'categoria', 'autor', 'status', 'criado', 'modificado', 'ativo')
+    list_select_related = ('categoria',)
     search_fields = ('nome', 'autor', 'codigo')
-    list_filter = ('status', 'categoria')
+    busca_exata = ('codigo', 'isbn')
+    busca_prefixo = ('nome', 'autor')
+    list_filter = ('status', 'ativo', 'categoria')
+    ordering = ('codigo',)
+    actions = ('ativar_livros', 'desativar_livros')
+    # Derivados do campo autor pelos signals (core/autores.py); correções vão pela mescla em Autores.
+    readonly_fields = ('autores',)
     fieldsets = (
         ('Informações Básicas', {
-            'fields': ('codigo', 'nome', 'autor', 'categoria')
+            'fields': ('codigo', 'nome', 'autor', 'autores', 'categoria')
         }),
         ('Status', {
             'fields': ('status',)
         }),
     )
 
+    @admin.action(description='Ativar livros selecionados')
+    def ativar_livros(self, request, queryset):
+        total = circulacao.definir_ativo(queryset, True)
+        self.message_user(request, f'{total} livro(s) ativado(s).', messages.SUCCESS)
+
+    @admin.action(description='Desativar livros selecionados')
+    def desativar_livros(self, request, queryset):
+        total = circulacao.definir_ativo(queryset, False)
+        self.message_user(request, f'{total} livro(s) desativado(s).', messages.SUCCESS)
+
 
 @admin.register(Emprestimo)
-class EmprestimoAdmin(admin.ModelAdmin):
+class EmprestimoAdmin(ListaGrandeMixin, admin.ModelAdmin):
     list_display = ('leitor', 'livro', 'devolucao', 'status', 'criado', 'modificado', 'ativo')
+    list_select_related = ('leitor', 'livro')
+    autocomplete_fields = ('leitor', 'livro')
+    list_filter = ('status',)
+    actions = ('marcar_devolvidos',)
+
+    @admin.action(description='Marcar como devolvidos e liberar os livros')
+    def marcar_devolvidos(self, request, queryset):
+        total = circulacao.devolver_emprestimos(queryset)
+        self.message_user(request, f'{total} empréstimo(s) finalizado(s).', messages.SUCCESS)
+
+
+@admin.register(EmprestimoHistorico)
+class EmprestimoHistoricoAdmin(ListaGrandeMixin, admin.ModelAdmin):
+    list_display = ('id', 'leitor', 'livro', 'issue_date', 'data_devolvida', 'arquivado')
+    list_select_related = ('leitor', 'livro')
+    raw_id_fields = ('leitor', 'livro')
+    ordering = ('-issue_date',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Agendamento)
-class AgendamentoAdmin(admin.ModelAdmin):
+class AgendamentoAdmin(BuscaIndexadaMixin, ListaGrandeMixin, admin.ModelAdmin):
     list_display = ('leitor', 'livro', 'data_retirada', 'status', 'criado', 'modificado', 'ativo')
+    list_select_related = ('leitor', 'livro')
+    autocomplete_fields = ('leitor', 'livro')
     search_fields = ('leitor__nome', 'livro__nome')
+    busca_prefixo = ('leitor__nome', 'livro__nome')
     list_filter = ('status',)
+    actions = ('cancelar_expirados', 'cancelar_selecionados')
+
+    @admin.action(description='Cancelar agendamentos expirados e liberar os livros')
+    def cancelar_expirados(self, request, queryset):
+        total = circulacao.cancelar_agendamentos(circulacao.agendamentos_expirados(queryset))
+        self.message_user(request, f'{total} agendamento(s) expirado(s) cancelado(s).', messages.SUCCESS)
+
+    @admin.action(description='Cancelar agendamentos selecionados e liberar os livros')
+    def cancelar_selecionados(self, request, queryset):
+        total = circulacao.cancelar_agendamentos(queryset)
+        self.message_user(request, f'{total} agendamento(s) cancelado(s).', messages.SUCCESS)
+
+
+@admin.register(NotificacaoEnviada)
+class NotificacaoEnviadaAdmin(ListaGrandeMixin, admin.ModelAdmin):
+    list_display = ('emprestimo', 'tipo', 'referencia', 'criado')
+    list_select_related = ('emprestimo__leitor', 'emprestimo__livro')
+    list_filter = ('tipo',)
+    raw_id_fields = ('emprestimo',)
+
+
+@admin.register(Tarefa)
+class TarefaAdmin(ListaGrandeMixin, admin.ModelAdmin):
+    list_display = ('id', 'nome', 'fila', 'status', 'tentativas', 'max_tentativas', 'executar_em', 'modificado')
+    list_filter = ('status', 'fila')
+    ordering = ('-id',)
+    readonly_fields = ('reservada_em', 'reservada_por', 'ultimo_erro')
+    actions = ('reenfileirar',)
+
+    @admin.action(description='Executar novamente as tarefas selecionadas')
+    def reenfileirar(self, request, queryset):
+        total = queryset.exclude(status='executando').update(
+            status='pendente', tentativas=0, executar_em=timezone.now(), modificado=timezone.now(),
+        )
+        self.message_user(request, f'{total} tarefa(s) devolvida(s) à fila.', messages.SUCCESS)
@@ -0,0 +1,140 @@
+"""
+Controle de admissão: quantas requisições cada worker (e, opcionalmente, o
+conjunto dos workers) atende ao mesmo tempo, por prioridade da rota.
+
+Cada nome de rota tem uma prioridade (ADMISSAO_PRIORIDADES, padrão
+'normal'), e cada prioridade pode ocupar só uma fração da capacidade
+(ADMISSAO_FRACOES): com as frações padrão, as páginas públicas ('baixa')
+param de entrar com metade da capacidade em uso, o resto do site com três
+quartos, e o último quarto fica reservado para o balcão de circulação.
+Acima do seu limite, a requisição espera uma vaga por até
+ADMISSAO_ESPERA[prioridade] segundos e depois recebe 503 com Retry-After,
+sem ter aberto sessão nem consultado o banco.
+
+ADMISSAO_MAXIMO limita as requisições simultâneas de cada processo (faz
+sentido com workers gthread/threads). ADMISSAO_MAXIMO_GLOBAL soma todos os
+workers num contador do cache compartilhado. Cada entrada renova a validade
+do contador, que só expira depois de ADMISSAO_GLOBAL_JANELA segundos sem
+nenhuma: é assim que some a vaga de um worker que morreu no meio de uma
+requisição, sem zerar o contador debaixo das requisições em andamento. Uma
+saída que ainda assim o levaria abaixo de zero (ele expirou no meio da
+requisição) é desfeita. Com os dois em 0 o middleware se desliga.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics
+
+PRIORIDADE_PADRAO = 'normal'
+CHAVE_GLOBAL = 'admissao:em_andamento'
+INTERVALO_ESPERA_GLOBAL = 0.05  # segundos entre tentativas no contador global
+
+
+def ativa():
+    return settings.ADMISSAO_MAXIMO > 0 or settings.ADMISSAO_MAXIMO_GLOBAL > 0
+
+
+def prioridade(rota):
+    return settings.ADMISSAO_PRIORIDADES.get(rota, PRIORIDADE_PADRAO)
+
+
+def _limite(maximo, prioridade):
+    return max(1, int(maximo * settings.ADMISSAO_FRACOES[prioridade]))
+
+
+# ============================================================
+# 🔹 CONTADOR DO PROCESSO
+# ============================================================
+class _Processo:
+    def __init__(self):
+        self.em_andamento = 0
+        self._condicao = threading.Condition()
+
+    def entrar(self, limite, espera):
+        prazo = time.monotonic() + espera
+        with self._condicao:
+            while self.em_andamento >= limite:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    return False
+                self._condicao.wait(restante)
+            self.em_andamento += 1
+        metrics.registrar_admissao(self.em_andamento)
+        return True
+
+    def sair(self):
+        with self._condicao:
+            self.em_andamento -= 1
+            self._condicao.notify_all()
+        metrics.registrar_admissao(self.em_andamento)
+
+
+_processo = _Processo()
+
+
+# ============================================================
+# 🔹 CONTADOR ENTRE WORKERS (CACHE COMPARTILHADO)
+# ============================================================
+def _incrementar_global():
+    janela = settings.ADMISSAO_GLOBAL_JANELA
+    if cache.add(CHAVE_GLOBAL, 1, janela):
+        return 1
+    try:
+        atual = cache.incr(CHAVE_GLOBAL)
+    except ValueError:
+        # Expirou entre o add e o incr.
+        cache.add(CHAVE_GLOBAL, 1, janela)
+        return 1
+    cache.touch(CHAVE_GLOBAL, janela)
+    return atual
+
+
+def _sair_global():
+    try:
+        atual = cache.decr(CHAVE_GLOBAL)
+        if atual < 0:
+            # O contador expirou e foi recriado no meio da requisição: a vaga dela já tinha saído.
+            cache.incr(CHAVE_GLOBAL, -atual)
+    except ValueError:
+        pass  # Expirou no meio da requisição.
+
+
+def _entrar_global(limite, espera):
+    prazo = time.monotonic() + espera
+    while True:
+        if _incrementar_global() <= limite:
+            return True
+        _sair_global()
+        if time.monotonic() + INTERVALO_ESPERA_GLOBAL > prazo:
+            return False
+        time.sleep(INTERVALO_ESPERA_GLOBAL)
+
+
+# ============================================================
+# 🔹 ADMISSÃO
+# ============================================================
+def entrar(prioridade):
+    """Ocupa uma vaga para uma requisição de ``prioridade``; False se não houve vaga a tempo."""
+    espera = settings.ADMISSAO_ESPERA.get(prioridade, 0)
+    inicio = time.monotonic()
+    if settings.ADMISSAO_MAXIMO > 0:
+        if not _processo.entrar(_limite(settings.ADMISSAO_MAXIMO, prioridade), espera):
+            return False
+    if settings.ADMISSAO_MAXIMO_GLOBAL > 0:
+        restante = max(0.0, espera - (time.monotonic() - inicio))
+        if not _entrar_global(_limite(settings.ADMISSAO_MAXIMO_GLOBAL, prioridade), restante):
+            if settings.ADMISSAO_MAXIMO > 0:
+                _processo.sair()
+            return False
+    metrics.registrar_espera_admissao(prioridade, time.monotonic() - inicio)
+    return True
+
+
+def sair():
+    if settings.ADMISSAO_MAXIMO_GLOBAL > 0:
+        _sair_global()
+    if settings.ADMISSAO_MAXIMO > 0:
+        _processo.sair()
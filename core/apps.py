@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
@@ -7,3 +9,11 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import core.signals  # Importa os signals
+
+        if settings.SQLITE_OTIMIZADO:
+            from core import sqlite
+            connection_created.connect(sqlite.aplicar_pragmas, dispatch_uid='core.sqlite')
+
+        if settings.SQL_MONITOR:
+            from core import monitor_sql
+            connection_created.connect(monitor_sql.instalar, dispatch_uid='core.monitor_sql')
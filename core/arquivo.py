@@ -0,0 +1,119 @@
+"""
+Arquivamento de empréstimos finalizados.
+
+Empréstimos devolvidos há mais de ARQUIVO_EMPRESTIMOS_DIAS saem de
+core_emprestimo e vão para core_emprestimohistorico, em lotes pequenos, cada
+um em sua própria transação. Interromper o processo não perde nada: a próxima
+execução continua de onde parou. Assim a tabela viva guarda só os empréstimos
+em andamento e os recentes.
+
+Quem mostra o histórico do leitor deve usar ``emprestimos_do_leitor``, que
+junta as duas tabelas uma página por vez.
+"""
+from datetime import timedelta
+from heapq import merge
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Emprestimo, EmprestimoHistorico, NotificacaoEnviada
+
+CAMPOS = ('id', 'leitor', 'livro', 'issue_date', 'devolucao', 'data_devolvida', 'criado')
+# Abaixo do limite de parâmetros das versões antigas do SQLite.
+PARAMETROS_POR_CONSULTA = 900
+
+
+def arquivaveis(dias, hoje=None):
+    """
+    Empréstimos finalizados devolvidos há mais de ``dias`` dias. Os finalizados
+    antes de ``data_devolvida`` existir não a têm; para eles vale a data de saída.
+    """
+    limite = (hoje or timezone.localdate()) - timedelta(days=dias)
+    return Emprestimo.objects.filter(status='completed').filter(
+        Q(data_devolvida__lt=limite) | Q(data_devolvida=None, issue_date__lt=limite)
+    )
+
+
+def _mover(ids):
+    """
+    Os ids já foram lidos como finalizados, e finalizado é estado final.
+
+    Copia os empréstimos para o histórico com INSERT ... SELECT e os apaga da
+    tabela viva, sem passar as linhas pelo Python. O DELETE direto pula o
+    post_delete de Emprestimo, que só age sobre empréstimos em andamento.
+    """
+    qn = connection.ops.quote_name
+    historico = qn(EmprestimoHistorico._meta.db_table)
+    viva = qn(Emprestimo._meta.db_table)
+    colunas = ', '.join(qn(Emprestimo._meta.get_field(campo).column) for campo in CAMPOS)
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), PARAMETROS_POR_CONSULTA):
+            parte = ids[inicio:inicio + PARAMETROS_POR_CONSULTA]
+            marcadores = ', '.join(['%s'] * len(parte))
+            cursor.execute(
+                f'INSERT INTO {historico} ({colunas}, {qn("arquivado")}) '
+                f'SELECT {colunas}, %s FROM {viva} WHERE {qn("id")} IN ({marcadores})',
+                [agora, *parte],
+            )
+            cursor.execute(f'DELETE FROM {viva} WHERE {qn("id")} IN ({marcadores})', parte)
+
+
+def arquivar_lote(dias, lote=5000, hoje=None):
+    """Move um lote para o histórico e devolve quantos empréstimos foram movidos."""
+    with transaction.atomic():
+        ids = list(arquivaveis(dias, hoje).order_by('data_devolvida', 'id').values_list('id', flat=True)[:lote])
+        if not ids:
+            return 0
+        # Os avisos de devolução só interessam enquanto o empréstimo está aberto.
+        NotificacaoEnviada.objects.filter(emprestimo_id__in=ids).delete()
+        _mover(ids)
+    return len(ids)
+
+
+def arquivar(dias, lote=5000, limite=None, hoje=None, progresso=None):
+    """Arquiva em lotes até acabar (ou até ``limite`` empréstimos); devolve o total movido."""
+    total = 0
+    while limite is None or total < limite:
+        tamanho = lote if limite is None else min(lote, limite - total)
+        movidos = arquivar_lote(dias, tamanho, hoje)
+        total += movidos
+        if progresso and movidos:
+            progresso(f'{total} empréstimo(s) arquivado(s)...')
+        if movidos < tamanho:
+            break
+    return total
+
+
+def emprestimos_do_leitor(leitor, depois=None, tamanho=None):
+    """
+    Uma página dos empréstimos ativos, recentes e arquivados do leitor, do mais
+    novo para o mais antigo.
+
+    ``depois`` é o id do último empréstimo da página anterior (o histórico
+    guarda o id original, então ele identifica a linha nas duas tabelas). Cada
+    tabela contribui com no máximo ``tamanho + 1`` linhas, lidas por chave
+    (criado, id) a partir dele. Devolve (empréstimos, id do último ou None se
+    esta é a última página).
+    """
+    tamanho = tamanho or settings.HISTORICO_POR_PAGINA
+    fontes = (Emprestimo.objects.filter(leitor=leitor), EmprestimoHistorico.objects.filter(leitor=leitor))
+    if depois:
+        ultimo = next(
+            (linha for linha in (fonte.filter(pk=depois).values('criado', 'id').first() for fonte in fontes) if linha),
+            None,
+        )
+        if ultimo:
+            fontes = tuple(
+                fonte.filter(Q(criado__lt=ultimo['criado']) | Q(criado=ultimo['criado'], id__lt=ultimo['id']))
+                for fonte in fontes
+            )
+    vivos, arquivados = (
+        fonte.select_related('livro').order_by('-criado', '-id')[:tamanho + 1] for fonte in fontes
+    )
+    resultado = list(merge(vivos, arquivados, key=attrgetter('criado', 'id'), reverse=True))[:tamanho + 1]
+    proxima = resultado[tamanho - 1].id if len(resultado) > tamanho else None
+    return resultado[:tamanho], proxima
@@ -0,0 +1,299 @@
+"""
+Autocompletar de títulos e autores a partir de um índice em memória.
+
+Cada processo monta, na primeira busca, um ``Indice`` com todos os livros:
+os textos normalizados (core/texto.py) ficam numa única string com um array
+de posições, em ordem alfabética de título; o vocabulário é uma lista
+ordenada de palavras, cada uma com seu array de entradas, e um índice de
+trigramas sobre o vocabulário acha as palavras a uma edição de distância.
+
+A busca tenta, em ordem: títulos que começam com o texto digitado; entradas
+que contêm todas as palavras (a última como prefixo); e, se ainda faltarem
+resultados, as mesmas palavras com até um erro de digitação cada.
+
+Quando um livro é criado, apagado ou muda de nome ou autor, os signals
+incrementam a versão do namespace 'autocompletar' (core/cache.py); cada
+processo compara a versão que carregou com a atual e remonta o índice numa
+thread, sem bloquear as buscas, no máximo a cada AUTOCOMPLETAR_INTERVALO_MINIMO
+segundos. Com um cache que não é compartilhado entre processos
+(LocMemCache), vale só o limite de idade AUTOCOMPLETAR_MAX_IDADE.
+"""
+import bisect
+import logging
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from core import cache as cache_unico
+from core.models import Livro
+from core.texto import ate_uma_edicao, normalizar, prefixo_proximo, trigramas
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_CACHE = 'autocompletar'
+TAMANHO_MINIMO = 2
+# Palavras com até este tamanho não são corrigidas: erros nelas casam com quase tudo.
+TAMANHO_MINIMO_CORRECAO = 4
+# Prefixos que abrangem mais palavras que isso são conferidos no texto, não cruzados.
+MAX_PALAVRAS_FAIXA = 2000
+# Com até tantas candidatas, conferir no texto sai mais barato que montar outro conjunto.
+POUCAS_CANDIDATAS = 500
+# Limite de entradas conferidas no texto por busca, para consultas muito genéricas.
+MAX_CONFERIDAS = 5000
+
+
+class Termo:
+    """Uma palavra da consulta e as palavras do vocabulário que ela aceita."""
+
+    def __init__(self, texto, prefixo):
+        self.texto = texto
+        self.prefixo = prefixo
+        self.faixa = (0, 0)       # faixa do vocabulário que começa com o prefixo
+        self.palavras = set()     # índices exatos (ou corrigidos) no vocabulário
+        self.aceitas = set()      # as mesmas palavras, como texto
+        self.tamanho = 0          # quantas entradas, no máximo, o termo alcança
+
+    def aceita(self, palavra):
+        return palavra in self.aceitas or (self.prefixo and palavra.startswith(self.texto))
+
+
+class Indice:
+    def __init__(self, linhas):
+        """``linhas``: iterável de (id, nome, autor)."""
+        entradas = sorted((normalizar(nome), normalizar(autor), livro_id) for livro_id, nome, autor in linhas)
+        self.ids = array('q', (livro_id for _, _, livro_id in entradas))
+        self.texto = ''.join(f'{titulo}\t{autor}\n' for titulo, autor, _ in entradas)
+        self.posicoes = array('I', [0])
+        ocorrencias = {}
+        for entrada, (titulo, autor, _) in enumerate(entradas):
+            self.posicoes.append(self.posicoes[-1] + len(titulo) + len(autor) + 2)
+            for palavra in set(titulo.split()) | set(autor.split()):
+                ocorrencias.setdefault(palavra, []).append(entrada)
+        del entradas
+
+        self.vocabulario = sorted(ocorrencias)
+        self.listas = [array('I', ocorrencias.pop(palavra)) for palavra in self.vocabulario]
+        # acumulado[i] = total de entradas das palavras anteriores a i: dá o tamanho de uma faixa em O(1).
+        self.acumulado = array('Q', [0])
+        for lista in self.listas:
+            self.acumulado.append(self.acumulado[-1] + len(lista))
+
+        por_trigrama = {}
+        for posicao, palavra in enumerate(self.vocabulario):
+            for trigrama in trigramas(palavra):
+                por_trigrama.setdefault(trigrama, []).append(posicao)
+        self.trigramas = {trigrama: array('I', lista) for trigrama, lista in por_trigrama.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _linha(self, entrada):
+        return self.texto[self.posicoes[entrada]:self.posicoes[entrada + 1] - 1]
+
+    def _titulo(self, entrada):
+        return self._linha(entrada).partition('\t')[0]
+
+    def _primeiro_titulo(self, consulta):
+        """Primeira entrada cujo título não vem antes de ``consulta`` (busca binária)."""
+        inicio, fim = 0, len(self)
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            if self._titulo(meio) < consulta:
+                inicio = meio + 1
+            else:
+                fim = meio
+        return inicio
+
+    # --------------------------------------------------------
+    # Termos
+    # --------------------------------------------------------
+    def _posicao(self, palavra):
+        posicao = bisect.bisect_left(self.vocabulario, palavra)
+        if posicao < len(self.vocabulario) and self.vocabulario[posicao] == palavra:
+            return posicao
+        return None
+
+    def _proximas(self, termo):
+        """Palavras do vocabulário a uma edição do termo, achadas pelos trigramas em comum."""
+        alvo = trigramas(termo.texto, prefixo=termo.prefixo)
+        contagem = Counter()
+        for trigrama in alvo:
+            contagem.update(self.trigramas.get(trigrama, ()))
+        # Uma edição estraga no máximo três trigramas; uma transposição, quatro.
+        minimo = max(1, len(alvo) - 4)
+        confere = prefixo_proximo if termo.prefixo else ate_uma_edicao
+        return [
+            posicao for posicao, comuns in contagem.items()
+            if comuns >= minimo and confere(termo.texto, self.vocabulario[posicao])
+        ]
+
+    def _termo(self, texto, prefixo, corrigir):
+        termo = Termo(texto, prefixo)
+        if prefixo:
+            inicio = bisect.bisect_left(self.vocabulario, texto)
+            termo.faixa = (inicio, bisect.bisect_left(self.vocabulario, texto + '\uffff', lo=inicio))
+        else:
+            posicao = self._posicao(texto)
+            if posicao is not None:
+                termo.palavras.add(posicao)
+        if corrigir and len(texto) >= TAMANHO_MINIMO_CORRECAO:
+            inicio, fim = termo.faixa
+            termo.palavras.update(posicao for posicao in self._proximas(termo) if not inicio <= posicao < fim)
+        termo.aceitas = {self.vocabulario[posicao] for posicao in termo.palavras}
+        inicio, fim = termo.faixa
+        termo.tamanho = self.acumulado[fim] - self.acumulado[inicio] + sum(
+            len(self.listas[posicao]) for posicao in termo.palavras
+        )
+        return termo
+
+    # --------------------------------------------------------
+    # Busca
+    # --------------------------------------------------------
+    def _conjunto(self, termo):
+        inicio, fim = termo.faixa
+        return set().union(*(self.listas[posicao] for posicao in termo.palavras), *self.listas[inicio:fim])
+
+    def _por_palavras(self, palavras, limite, ignorar, corrigir):
+        termos = [
+            self._termo(palavra, prefixo=posicao == len(palavras) - 1, corrigir=corrigir)
+            for posicao, palavra in enumerate(palavras)
+        ]
+        if any(termo.tamanho == 0 for termo in termos):
+            return []
+
+        # Termos com listas pequenas são cruzados como conjuntos, do menor para o
+        # maior; os muito comuns (ou prefixos com milhares de palavras) são
+        # conferidos no texto das entradas que sobrarem.
+        cruzaveis = sorted(
+            (
+                termo for termo in termos
+                if termo.tamanho <= len(self) // 8 and termo.faixa[1] - termo.faixa[0] <= MAX_PALAVRAS_FAIXA
+            ),
+            key=lambda termo: termo.tamanho,
+        )
+        if cruzaveis:
+            guia = cruzaveis[0]
+            if len(guia.palavras) == 1 and guia.faixa[0] == guia.faixa[1]:
+                candidatas = self.listas[next(iter(guia.palavras))]  # já em ordem
+            else:
+                candidatas = self._conjunto(guia)
+            cruzados = [guia]
+            for termo in cruzaveis[1:]:
+                if len(candidatas) <= POUCAS_CANDIDATAS:
+                    break
+                candidatas = self._conjunto(termo).intersection(candidatas)
+                cruzados.append(termo)
+            if isinstance(candidatas, set):
+                candidatas = sorted(candidatas)
+            conferir = [termo for termo in termos if termo not in cruzados]
+        else:
+            # Só termos muito comuns: percorrer as entradas em ordem acha os primeiros resultados logo.
+            candidatas, conferir = range(len(self)), termos
+
+        achadas = []
+        for conferidas, entrada in enumerate(candidatas):
+            if len(achadas) == limite or conferidas == MAX_CONFERIDAS:
+                break
+            if entrada in ignorar:
+                continue
+            if conferir:
+                palavras_da_entrada = self._linha(entrada).split()
+                if not all(any(termo.aceita(palavra) for palavra in palavras_da_entrada) for termo in conferir):
+                    continue
+            achadas.append(entrada)
+        return achadas
+
+    def buscar(self, consulta, limite=10):
+        """Ids dos livros que casam com ``consulta``, dos mais relevantes para os menos."""
+        consulta = normalizar(consulta)
+        if len(consulta) < TAMANHO_MINIMO:
+            return []
+
+        # 1. Títulos que começam com o texto digitado (contíguos, pois as entradas estão em ordem de título).
+        inicio = self._primeiro_titulo(consulta)
+        fim = min(inicio + limite, len(self))
+        entradas = [entrada for entrada in range(inicio, fim) if self._titulo(entrada).startswith(consulta)]
+
+        # 2. Todas as palavras, a última como prefixo; 3. o mesmo tolerando um erro por palavra.
+        palavras = consulta.split()
+        for corrigir in (False, True):
+            if len(entradas) >= limite:
+                break
+            entradas += self._por_palavras(palavras, limite - len(entradas), set(entradas), corrigir)
+        return [self.ids[entrada] for entrada in entradas]
+
+
+# ============================================================
+# 🔹 ÍNDICE DO PROCESSO
+# ============================================================
+_estado = {'indice': None, 'geracao': None, 'carregado_em': 0.0}
+_trava = threading.Lock()
+
+
+def carregar():
+    linhas = Livro.objects.order_by().values_list('id', 'nome', 'autor').iterator(chunk_size=5000)
+    return Indice(linhas)
+
+
+def _recarregar(geracao):
+    inicio = time.perf_counter()
+    indice = carregar()
+    _estado.update(indice=indice, geracao=geracao, carregado_em=time.monotonic())
+    logger.info('Índice de autocompletar montado: %d livro(s) em %.1fs.', len(indice), time.perf_counter() - inicio)
+
+
+def _recarregar_em_segundo_plano(geracao):
+    try:
+        _recarregar(geracao)
+    except Exception:
+        logger.exception('Falha ao remontar o índice de autocompletar.')
+    finally:
+        connection.close()
+        _trava.release()
+
+
+def obter_indice():
+    """
+    Índice deste processo. A primeira chamada espera a montagem; depois disso,
+    índices desatualizados são remontados em segundo plano e o anterior
+    continua respondendo.
+    """
+    geracao = cache_unico.versao(NAMESPACE_CACHE)
+    if _estado['indice'] is None:
+        with _trava:
+            if _estado['indice'] is None:
+                _recarregar(geracao)
+        return _estado['indice']
+
+    idade = time.monotonic() - _estado['carregado_em']
+    mudou = geracao != _estado['geracao'] and idade > settings.AUTOCOMPLETAR_INTERVALO_MINIMO
+    if (mudou or idade > settings.AUTOCOMPLETAR_MAX_IDADE) and _trava.acquire(blocking=False):
+        threading.Thread(target=_recarregar_em_segundo_plano, args=(geracao,), daemon=True).start()
+    return _estado['indice']
+
+
+def nova_geracao():
+    """Avisa todos os processos de que o índice precisa ser remontado."""
+    cache_unico.invalidar(NAMESPACE_CACHE)
+
+
+def buscar(consulta, limite=None, disponiveis=False):
+    """
+    Até ``limite`` livros para a ``consulta``, como dicionários com ``id``,
+    ``nome`` e ``autor``. A disponibilidade muda a toda hora e por isso não
+    fica no índice: com ``disponiveis``, os candidatos são filtrados no banco
+    numa consulta pela chave primária.
+    """
+    limite = limite or settings.AUTOCOMPLETAR_LIMITE
+    ids = obter_indice().buscar(consulta, limite * 3 if disponiveis else limite)
+    if not ids:
+        return []
+    livros = Livro.objects.filter(id__in=ids)
+    if disponiveis:
+        livros = livros.filter(status=True)
+    encontrados = {livro['id']: livro for livro in livros.values('id', 'nome', 'autor')}
+    return [encontrados[livro_id] for livro_id in ids if livro_id in encontrados][:limite]
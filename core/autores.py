@@ -0,0 +1,325 @@
+"""
+Autores normalizados.
+
+``Livro.autor`` continua sendo o texto livre exibido no catálogo; os vínculos
+com ``Autor`` (``Livro.autores``) são derivados dele. Cada grafia conhecida de
+um nome fica em VarianteAutor pela sua chave normalizada, então "Machado de
+Assis", "ASSIS, Machado de" e "Machado de Assís" caem no mesmo autor sem
+comparar strings.
+
+A chave tira acentos e maiúsculas, desfaz a inversão "Sobrenome, Nome",
+descarta partículas (de, da, dos...) e ordena as palavras. Grafias que
+diferem além disso (um erro de digitação, iniciais no lugar do prenome) são
+agrupadas por ``agrupar``, que só compara nomes dentro do mesmo bloco
+(sobrenome + inicial do prenome, ou prenome + inicial do sobrenome) em vez de
+todos contra todos. Iniciais só juntam quando apontam para um único nome
+completo: "J. Silva" não é mesclado se existirem "João Silva" e "José Silva".
+
+Livros salvos pelo ORM são vinculados pelos signals, só pela chave exata.
+``manage.py agrupar_autores`` vincula os livros carregados em lote e mescla
+os autores que o agrupamento considerar duplicados.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+from core.texto import ate_uma_edicao, normalizar
+
+PARTICULAS = {'de', 'da', 'do', 'das', 'dos', 'e', 'del', 'della', 'di', 'du', 'van', 'von', 'der', 'la', 'le'}
+DESCONHECIDOS = {'', 'desconhecido', 'autor desconhecido', 'anonimo', 'varios', 'varios autores'}
+# Blocos maiores que isso (sobrenomes muito comuns) só juntam pela chave exata.
+MAX_BLOCO = 200
+
+_SEPARADORES = re.compile(r'\s*[;&/]\s*')
+_CONJUNCAO = re.compile(r'\s+e\s+', re.IGNORECASE)
+
+
+# ============================================================
+# 🔹 NOMES E CHAVES
+# ============================================================
+def apresentavel(nome):
+    """Nome em ordem direta e sem espaços repetidos: "Assis, Machado de" -> "Machado de Assis"."""
+    nome = ' '.join((nome or '').split())
+    if nome.count(',') == 1:
+        sobrenome, prenome = (parte.strip() for parte in nome.split(','))
+        if sobrenome and prenome:
+            nome = f'{prenome} {sobrenome}'
+    return nome
+
+
+def separar(texto):
+    """
+    Nomes de autores contidos no texto livre de ``Livro.autor``. Separa em
+    ';', '&' e '/', e em " e " só quando os dois lados têm nome e sobrenome.
+    Textos como "Desconhecido" não geram autor.
+    """
+    nomes = []
+    for parte in _SEPARADORES.split(texto or ''):
+        pedacos = _CONJUNCAO.split(parte)
+        if len(pedacos) > 1 and all(len(pedaco.split()) >= 2 for pedaco in pedacos):
+            nomes.extend(pedacos)
+        else:
+            nomes.append(parte)
+    return [apresentavel(nome) for nome in nomes if normalizar(apresentavel(nome)) not in DESCONHECIDOS]
+
+
+def palavras(nome):
+    """Palavras significativas do nome, em ordem direta e sem partículas (a primeira fica: "E. Lima")."""
+    todas = normalizar(apresentavel(nome)).split()
+    return todas[:1] + [palavra for palavra in todas[1:] if palavra not in PARTICULAS]
+
+
+def chave(nome):
+    return ' '.join(sorted(palavras(nome)))
+
+
+# ============================================================
+# 🔹 AGRUPAMENTO
+# ============================================================
+def _comparar(a, b):
+    """
+    Compara duas listas de palavras de mesmo tamanho, posição a posição.
+    Devolve 'grafia' (iguais com no máximo um erro de digitação), 'iniciais'
+    (algumas palavras abreviadas) ou None.
+    """
+    if len(a) != len(b) or len(a) < 2:
+        return None
+    erros = 0
+    iniciais = False
+    for palavra_a, palavra_b in zip(a, b):
+        if palavra_a == palavra_b:
+            continue
+        if len(palavra_a) == 1 or len(palavra_b) == 1:
+            if palavra_a[0] != palavra_b[0]:
+                return None
+            iniciais = True
+        elif min(len(palavra_a), len(palavra_b)) >= 4 and ate_uma_edicao(palavra_a, palavra_b):
+            erros += 1
+        else:
+            return None
+    if erros > 1 or (iniciais and erros):
+        return None
+    return 'iniciais' if iniciais else 'grafia'
+
+
+def _blocos(palavras_do_nome):
+    prenome, sobrenome = palavras_do_nome[0], palavras_do_nome[-1]
+    yield ('sobrenome', sobrenome, prenome[0])
+    if len(prenome) > 1:
+        yield ('prenome', prenome, sobrenome[0])
+
+
+def agrupar(itens):
+    """
+    Agrupa nomes que parecem ser do mesmo autor.
+
+    ``itens``: iterável de (identificador, nome). Devolve uma lista de grupos,
+    cada um uma lista de identificadores.
+    """
+    # 1. Mesma chave: mesmo autor, sem comparação.
+    por_chave = defaultdict(list)
+    for identificador, nome in itens:
+        por_chave[chave(nome)].append((identificador, palavras(nome)))
+    unidades = list(por_chave.values())
+
+    pai = list(range(len(unidades)))
+
+    def raiz(indice):
+        while pai[indice] != indice:
+            pai[indice] = pai[pai[indice]]
+            indice = pai[indice]
+        return indice
+
+    # 2. Blocos: só nomes que compartilham um bloco são comparados.
+    blocos = defaultdict(list)
+    for indice, unidade in enumerate(unidades):
+        palavras_do_nome = unidade[0][1]
+        if len(palavras_do_nome) >= 2:
+            for bloco in _blocos(palavras_do_nome):
+                blocos[bloco].append(indice)
+
+    abreviados = defaultdict(set)
+    for membros in blocos.values():
+        if len(membros) < 2 or len(membros) > MAX_BLOCO:
+            continue
+        for posicao, primeiro in enumerate(membros):
+            for segundo in membros[posicao + 1:]:
+                a, b = unidades[primeiro][0][1], unidades[segundo][0][1]
+                resultado = _comparar(a, b)
+                if resultado == 'grafia':
+                    pai[raiz(primeiro)] = raiz(segundo)
+                elif resultado == 'iniciais':
+                    curtas_a = sum(len(palavra) == 1 for palavra in a)
+                    curtas_b = sum(len(palavra) == 1 for palavra in b)
+                    if curtas_a != curtas_b:
+                        abreviado, completo = (primeiro, segundo) if curtas_a > curtas_b else (segundo, primeiro)
+                        abreviados[abreviado].add(completo)
+
+    # 3. Iniciais só juntam quando apontam para um único autor.
+    for abreviado, completos in abreviados.items():
+        destinos = {raiz(completo) for completo in completos}
+        if len(destinos) == 1:
+            pai[raiz(abreviado)] = destinos.pop()
+
+    grupos = defaultdict(list)
+    for indice, unidade in enumerate(unidades):
+        grupos[raiz(indice)].extend(identificador for identificador, _ in unidade)
+    return list(grupos.values())
+
+
+def nome_canonico(nomes, pesos):
+    """O nome mais usado do grupo; no empate, o mais completo."""
+    return max(nomes, key=lambda nome: (
+        pesos.get(nome, 0),
+        sum(len(palavra) > 1 for palavra in palavras(nome)),
+        len(nome),
+        nome,
+    ))
+
+
+# ============================================================
+# 🔹 VÍNCULOS EM LOTE (migração e comando)
+# ============================================================
+def _modelos():
+    from core.models import Autor, Livro, VarianteAutor
+    return Livro, Autor, VarianteAutor
+
+
+def importar(modelos=None, lote=5000, progresso=None, contar=True):
+    """
+    Vincula a autores os livros que ainda não têm nenhum, agrupando os nomes
+    novos entre si. Aceita os modelos históricos (``modelos`` = (Livro, Autor,
+    VarianteAutor)) para rodar dentro de uma migração. Devolve (autores
+    criados, vínculos criados).
+
+    O bulk_create não dispara m2m_changed: com ``contar``, a faceta 'autor' é
+    ajustada junto com cada lote. Quem recalcula as facetas logo depois (ou a
+    migração) passa ``contar=False``.
+    """
+    from core import facetas
+    Livro, Autor, VarianteAutor = modelos or _modelos()
+    Vinculo = Livro._meta.get_field('autores').remote_field.through
+    contar = contar and modelos is None
+    progresso = progresso or (lambda mensagem: None)
+    pendentes = Livro.objects.filter(autores__isnull=True)
+
+    # 1. Textos distintos; cada nome pesa quantos livros o usam.
+    nomes_por_texto = {}
+    pesos = Counter()
+    for linha in pendentes.order_by().values('autor').annotate(total=Count('id')):
+        nomes = separar(linha['autor'])
+        nomes_por_texto[linha['autor']] = nomes
+        for nome in nomes:
+            pesos[nome] += linha['total']
+    chaves = {nome: chave(nome) for nome in pesos}
+
+    # 2. Chaves que já têm autor.
+    conhecidas = {}
+    distintas = list(set(chaves.values()))
+    for inicio in range(0, len(distintas), 500):
+        conhecidas.update(
+            VarianteAutor.objects.filter(chave__in=distintas[inicio:inicio + 500]).values_list('chave', 'autor_id')
+        )
+
+    # 3. Nomes novos: um autor por grupo, com todas as chaves do grupo como variantes.
+    novos = [nome for nome in pesos if chaves[nome] not in conhecidas]
+    grupos = agrupar((nome, nome) for nome in novos)
+    criados = Autor.objects.bulk_create(
+        [Autor(nome=nome_canonico(grupo, pesos)) for grupo in grupos], batch_size=lote,
+    )
+    variantes = []
+    for grupo, autor in zip(grupos, criados):
+        for chave_variante in {chaves[nome] for nome in grupo}:
+            conhecidas[chave_variante] = autor.id
+            variantes.append(VarianteAutor(chave=chave_variante, autor_id=autor.id))
+    VarianteAutor.objects.bulk_create(variantes, batch_size=lote, ignore_conflicts=True)
+    progresso(f'{len(criados)} autor(es) novo(s), {len(variantes)} variante(s).')
+
+    # 4. Vínculos, em lotes pela chave primária.
+    autores_por_texto = {
+        texto: list(dict.fromkeys(conhecidas[chaves[nome]] for nome in nomes))
+        for texto, nomes in nomes_por_texto.items()
+    }
+    total = ultimo = 0
+    while True:
+        livros = list(pendentes.filter(id__gt=ultimo).order_by('id').values_list('id', 'autor')[:lote])
+        if not livros:
+            break
+        vinculos = [
+            Vinculo(livro_id=livro_id, autor_id=autor_id)
+            for livro_id, texto in livros
+            for autor_id in autores_por_texto.get(texto, ())
+        ]
+        with transaction.atomic():
+            Vinculo.objects.bulk_create(vinculos, batch_size=lote, ignore_conflicts=True)
+            if contar:
+                facetas.ajustar_autores([vinculo.autor_id for vinculo in vinculos], 1)
+        total += len(vinculos)
+        ultimo = livros[-1][0]
+        progresso(f'{total} vínculo(s)...')
+    return len(criados), total
+
+
+def mesclar(destino_id, origens_ids):
+    """Move livros e variantes dos autores ``origens_ids`` para ``destino_id`` e apaga os de origem."""
+    from core import facetas
+    _, Autor, VarianteAutor = _modelos()
+    Vinculo = Autor.livros.through
+    origens_ids = [autor_id for autor_id in origens_ids if autor_id != destino_id]
+    if not origens_ids:
+        return 0
+    with transaction.atomic():
+        # Livros que já têm o autor de destino perdem só o vínculo duplicado.
+        Vinculo.objects.filter(
+            autor_id__in=origens_ids,
+            livro_id__in=Vinculo.objects.filter(autor_id=destino_id).values('livro_id'),
+        ).delete()
+        Vinculo.objects.filter(autor_id__in=origens_ids).update(autor_id=destino_id)
+        VarianteAutor.objects.filter(autor_id__in=origens_ids).update(autor_id=destino_id)
+        Autor.objects.filter(id__in=origens_ids).delete()
+        facetas.recalcular_autores([destino_id, *origens_ids])
+    return len(origens_ids)
+
+
+def deduplicar(progresso=None):
+    """Agrupa todos os autores cadastrados e mescla os duplicados. Devolve quantos foram mesclados."""
+    _, Autor, _ = _modelos()
+    progresso = progresso or (lambda mensagem: None)
+    pesos = dict(
+        Autor.livros.through.objects.order_by().values('autor_id').annotate(total=Count('id'))
+        .values_list('autor_id', 'total')
+    )
+    grupos = [grupo for grupo in agrupar(Autor.objects.values_list('id', 'nome').iterator()) if len(grupo) > 1]
+    mesclados = 0
+    for grupo in grupos:
+        destino = max(grupo, key=lambda autor_id: (pesos.get(autor_id, 0), -autor_id))
+        mesclados += mesclar(destino, grupo)
+    progresso(f'{len(grupos)} grupo(s) de duplicados.')
+    return mesclados
+
+
+# ============================================================
+# 🔹 VÍNCULO DE UM LIVRO (signals)
+# ============================================================
+def resolver(nome):
+    """Id do autor com a mesma chave do nome, criando-o se ainda não existir."""
+    _, Autor, VarianteAutor = _modelos()
+    chave_nome = chave(nome)
+    autor_id = VarianteAutor.objects.filter(chave=chave_nome).values_list('autor_id', flat=True).first()
+    if autor_id:
+        return autor_id
+    try:
+        with transaction.atomic():
+            autor = Autor.objects.create(nome=apresentavel(nome))
+            VarianteAutor.objects.create(chave=chave_nome, autor=autor)
+            return autor.id
+    except IntegrityError:
+        # Outra transação cadastrou a mesma chave ao mesmo tempo.
+        return VarianteAutor.objects.get(chave=chave_nome).autor_id
+
+
+def vincular(livro):
+    """Refaz ``livro.autores`` a partir do texto de ``livro.autor``."""
+    livro.autores.set(list(dict.fromkeys(resolver(nome) for nome in separar(livro.autor))))
@@ -0,0 +1,143 @@
+"""
+Pool de conexões por processo, usado pelo backend core.backends.postgresql.
+
+Cada worker do gunicorn mantém no máximo ``maximo`` conexões abertas, e elas
+são reaproveitadas entre requisições e threads. Quem pede uma conexão com o
+pool cheio espera até ``timeout`` segundos; o tempo de espera, as conexões
+em uso e livres e os esgotamentos vão para as métricas do Prometheus.
+
+Conexões são recicladas depois de ``max_idade`` segundos e, se ficaram
+paradas mais que ``verificar_apos`` segundos, testadas antes de voltar ao
+uso (a rede ou o servidor podem tê-las derrubado).
+
+O pool não conhece o driver: o backend informa como testar, limpar e fechar
+uma conexão, e cada pedido traz a função que abre uma nova se preciso. As
+conexões precisam aceitar weakref (as do psycopg2 aceitam): a idade de cada
+uma fica num WeakKeyDictionary, que não a mantém viva nem confunde uma
+conexão nova com outra já coletada que tinha o mesmo id().
+"""
+import threading
+import time
+import weakref
+from collections import deque
+
+from django.db import OperationalError
+
+from core import metrics
+
+
+class PoolEsgotado(OperationalError):
+    """Nenhuma conexão ficou livre dentro do tempo de espera."""
+
+
+class PoolConexoes:
+    def __init__(self, nome, verificar, limpar, fechar, maximo=10, timeout=10.0,
+                 max_idade=1800.0, verificar_apos=30.0):
+        self.nome = nome
+        self.verificar = verificar  # conexão -> bool (consulta barata)
+        self.limpar = limpar  # conexão -> bool, desfaz a transação pendente; False = descartar
+        self.fechar_conexao = fechar
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_idade = max_idade
+        self.verificar_apos = verificar_apos
+
+        self._condicao = threading.Condition()
+        self._livres = deque()  # (conexão, devolvida em); a última devolvida sai primeiro
+        self._criadas_em = weakref.WeakKeyDictionary()
+        self._abertas = 0
+        self._em_uso = 0
+        metrics.POOL_MAXIMO.labels(nome).set(maximo)
+
+    # ------------------------------------------------------------
+    def _atualizar_metricas(self):
+        metrics.POOL_CONEXOES.labels(self.nome, 'em_uso').set(self._em_uso)
+        metrics.POOL_CONEXOES.labels(self.nome, 'livres').set(len(self._livres))
+
+    def _reservar(self, limite):
+        """Uma conexão livre, ou None quando há vaga para abrir uma nova."""
+        with self._condicao:
+            while True:
+                if self._livres:
+                    return self._livres.pop()
+                if self._abertas < self.maximo:
+                    self._abertas += 1
+                    return None
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    metrics.POOL_ESGOTADO.labels(self.nome).inc()
+                    raise PoolEsgotado(
+                        f'Pool de conexões "{self.nome}" esgotado: {self.maximo} em uso por mais de {self.timeout}s.'
+                    )
+                self._condicao.wait(restante)
+
+    def _utilizavel(self, conexao, devolvida_em):
+        agora = time.monotonic()
+        if agora - self._criadas_em.get(conexao, agora) > self.max_idade:
+            return False
+        if agora - devolvida_em > self.verificar_apos:
+            return self.verificar(conexao)
+        return True
+
+    def _descartar(self, conexao):
+        self._criadas_em.pop(conexao, None)
+        try:
+            self.fechar_conexao(conexao)
+        except Exception:
+            pass
+        with self._condicao:
+            self._abertas -= 1
+            self._condicao.notify()
+
+    # ------------------------------------------------------------
+    def obter(self, criar):
+        """Uma conexão do pool; ``criar`` abre uma nova quando há vaga e nenhuma livre."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        while True:
+            reservada = self._reservar(limite)
+            if reservada is None:
+                try:
+                    conexao = criar()
+                except Exception:
+                    with self._condicao:
+                        self._abertas -= 1
+                        self._condicao.notify()
+                    raise
+                self._criadas_em[conexao] = time.monotonic()
+                break
+            conexao, devolvida_em = reservada
+            if self._utilizavel(conexao, devolvida_em):
+                break
+            self._descartar(conexao)
+
+        metrics.POOL_ESPERA.labels(self.nome).observe(time.monotonic() - inicio)
+        with self._condicao:
+            self._em_uso += 1
+            self._atualizar_metricas()
+        return conexao
+
+    def devolver(self, conexao):
+        with self._condicao:
+            self._em_uso -= 1
+        if not self.limpar(conexao):
+            self._descartar(conexao)
+        else:
+            with self._condicao:
+                self._livres.append((conexao, time.monotonic()))
+                self._condicao.notify()
+        with self._condicao:
+            self._atualizar_metricas()
+
+    def estatisticas(self):
+        with self._condicao:
+            return {'abertas': self._abertas, 'em_uso': self._em_uso, 'livres': len(self._livres), 'maximo': self.maximo}
+
+    def fechar(self):
+        """Fecha as conexões livres (as em uso são fechadas quando voltarem)."""
+        with self._condicao:
+            livres, self._livres = list(self._livres), deque()
+        for conexao, _ in livres:
+            self._descartar(conexao)
+        with self._condicao:
+            self._atualizar_metricas()
@@ -0,0 +1,86 @@
+"""
+Backend PostgreSQL com pool de conexões por processo (DB_POOL=1).
+
+Igual ao do Django (psycopg2), mas ``connect`` pega uma conexão do pool de
+core/backends/pool.py e ``close`` a devolve em vez de fechá-la. Com o pool,
+CONN_MAX_AGE fica em 0: cada requisição devolve sua conexão ao terminar, e o
+número de conexões com o servidor passa a ser limitado por
+``workers x POOL['MAXIMO']``, não pelo número de threads ou requisições.
+
+Para juntar as conexões de todos os workers (e de várias máquinas) num
+número fixo no servidor, use um pgbouncer em modo transaction na frente do
+Postgres e DB_PGBOUNCER=1 (veja settings.py).
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2 import extensions
+
+from core.backends.pool import PoolConexoes
+
+_pools = {}
+_trava_pools = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _pool(self):
+        # Chave com o pid: depois de um fork o processo filho abre o próprio pool.
+        chave = (self.alias, os.getpid())
+        with _trava_pools:
+            pool = _pools.get(chave)
+            if pool is None:
+                opcoes = self.settings_dict.get('POOL', {})
+                pool = _pools[chave] = PoolConexoes(
+                    self.alias,
+                    verificar=_verificar,
+                    limpar=_limpar,
+                    fechar=lambda conexao: conexao.close(),
+                    maximo=opcoes.get('MAXIMO', 10),
+                    timeout=opcoes.get('TIMEOUT', 10),
+                    max_idade=opcoes.get('MAX_IDADE', 1800),
+                    verificar_apos=opcoes.get('VERIFICAR_APOS', 30),
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        conexao = self._pool().obter(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # O Django guarda no wrapper o nível de isolamento ao abrir a conexão; a
+        # conexão reaproveitada já está nesse nível (OPTIONS['isolation_level']).
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return conexao
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool().devolver(self.connection)
+
+
+def _verificar(conexao):
+    if conexao.closed:
+        return False
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except Exception:
+        return False
+
+
+def _limpar(conexao):
+    """Desfaz qualquer transação aberta; conexões quebradas são descartadas."""
+    if conexao.closed:
+        return False
+    estado = conexao.get_transaction_status()
+    if estado == extensions.TRANSACTION_STATUS_IDLE:
+        return True
+    if estado in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+        try:
+            conexao.rollback()
+            return True
+        except Exception:
+            return False
+    return False
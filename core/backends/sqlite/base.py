@@ -0,0 +1,15 @@
+"""
+Backend SQLite do perfil de produção (veja core/sqlite.py).
+
+Igual ao do Django, mas as transações abrem com BEGIN IMMEDIATE: o lock de
+escrita é pedido logo no início e a espera respeita o busy_timeout, em vez de
+a transação falhar com "database is locked" ao passar da leitura para a
+escrita. Transações só de leitura quase não existem nas views (as leituras
+rodam em autocommit), então o custo de serializá-las é pequeno.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,526 @@
+"""
+Benchmark reprodutível dos fluxos principais do leitor.
+
+Cria um banco de testes descartável (SQLite em arquivo ou o Postgres local
+configurado), popula um acervo sintético e exercita login, catálogo,
+agendamento, cancelamento, devolução e dashboard pelo cliente de testes do
+Django e/ou por um gunicorn local. O resultado é um JSON com vazão e
+percentis de latência por fluxo, para comparar execuções entre commits.
+
+Uso: ``python manage.py medir_desempenho --help``.
+"""
+import http.cookiejar
+import os
+import platform
+import queue
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.models import Agendamento, Emprestimo, Leitor, Livro
+from core.monitor_sql import percentil
+from core.sintetico import GeradorDados
+
+PREFIXO = 'bench'
+SENHA_BENCHMARK = 'benchmark-garoca'
+EMAIL_BENCHMARK = 'bench0@garoca.test'
+LOTE = 1000
+
+# Mesmos ajustes de library_manager/settings_benchmark.py, para o modo em processo.
+AJUSTES_EM_PROCESSO = {
+    'DEBUG': False,
+    'STATICFILES_STORAGE': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+}
+
+
+# ============================================================
+# 🔹 BANCO DESCARTÁVEL
+# ============================================================
+def criar_banco(diretorio):
+    """Cria o banco de testes; SQLite sempre em arquivo para o gunicorn enxergá-lo."""
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(diretorio, 'benchmark.sqlite3')
+    nome_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    return nome_original
+
+
+def destruir_banco(nome_original):
+    connection.creation.destroy_test_db(nome_original, verbosity=0)
+
+
+def url_do_banco():
+    """URL no formato do dj_database_url apontando para o banco de testes atual."""
+    dados = connection.settings_dict
+    if connection.vendor == 'sqlite':
+        return f"sqlite:///{dados['NAME']}"
+    esquema = {'postgresql': 'postgres', 'mysql': 'mysql'}[connection.vendor]
+    usuario = urllib.parse.quote(dados.get('USER') or '')
+    senha = urllib.parse.quote(dados.get('PASSWORD') or '')
+    return f"{esquema}://{usuario}:{senha}@{dados.get('HOST') or 'localhost'}:{dados.get('PORT') or ''}/{dados['NAME']}"
+
+
+# ============================================================
+# 🔹 ACERVO SINTÉTICO
+# ============================================================
+def popular_acervo(livros, leitores, emprestimos, reservados):
+    """
+    Gera o acervo sintético (veja core/sintetico.py) mantendo os ``reservados``
+    primeiros livros disponíveis para os fluxos medidos. Retorna os ids deles.
+    """
+    resumo = GeradorDados(
+        categorias=10, livros=livros, leitores=leitores, emprestimos=emprestimos,
+        agendamentos=emprestimos // 10, taxa_ativos=0.2, prefixo=PREFIXO,
+        senha=SENHA_BENCHMARK, reservados=reservados,
+    ).executar()
+    return resumo['reservados']
+
+
+def preparar_consumiveis(leitor, livros_ids):
+    """
+    Cria, para o leitor do benchmark, um empréstimo em andamento e um agendamento
+    por livro informado. Retorna (ids de empréstimos, ids de agendamentos).
+    """
+    hoje = timezone.localdate()
+    metade = len(livros_ids) // 2
+    para_emprestimo, para_agendamento = livros_ids[:metade], livros_ids[metade:]
+    Livro.objects.filter(id__in=livros_ids).update(status=False)
+    emprestimos = Emprestimo.objects.bulk_create([
+        Emprestimo(leitor=leitor, livro_id=livro_id, devolucao=hoje + timedelta(days=14))
+        for livro_id in para_emprestimo
+    ], batch_size=LOTE)
+    agendamentos = Agendamento.objects.bulk_create([
+        Agendamento(leitor=leitor, livro_id=livro_id, data_agendada=hoje + timedelta(days=3))
+        for livro_id in para_agendamento
+    ], batch_size=LOTE)
+    if emprestimos and emprestimos[0].pk is None:
+        ids_emp = list(Emprestimo.objects.filter(leitor=leitor, livro_id__in=para_emprestimo).values_list('id', flat=True))
+        ids_ag = list(Agendamento.objects.filter(leitor=leitor, livro_id__in=para_agendamento).values_list('id', flat=True))
+        return ids_emp, ids_ag
+    return [e.pk for e in emprestimos], [a.pk for a in agendamentos]
+
+
+# ============================================================
+# 🔹 CLIENTES (TESTE DO DJANGO E HTTP REAL)
+# ============================================================
+class ClienteTeste:
+    """Adapta o django.test.Client para devolver apenas o código de status."""
+
+    def __init__(self):
+        self.cliente = Client()
+
+    def get(self, caminho):
+        return self.cliente.get(caminho, secure=True).status_code
+
+    def post(self, caminho, dados=None):
+        return self.cliente.post(caminho, dados or {}, secure=True).status_code
+
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHTTP:
+    """Cliente HTTP mínimo com cookies e CSRF, usado contra o gunicorn."""
+
+    def __init__(self, base):
+        self.base = base
+        self.cookies = http.cookiejar.CookieJar()
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _SemRedirecionamento,
+        )
+
+    def _csrf(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def _abrir(self, requisicao):
+        try:
+            with self.abridor.open(requisicao, timeout=60) as resposta:
+                resposta.read()
+                return resposta.status
+        except urllib.error.HTTPError as erro:
+            erro.read()
+            return erro.code
+
+    def get(self, caminho):
+        return self._abrir(urllib.request.Request(self.base + caminho))
+
+    def post(self, caminho, dados=None):
+        return self._abrir(urllib.request.Request(
+            self.base + caminho,
+            data=urllib.parse.urlencode(dados or {}).encode(),
+            headers={'X-CSRFToken': self._csrf(), 'Content-Type': 'application/x-www-form-urlencoded'},
+        ))
+
+
+def entrar(cliente):
+    cliente.get('/core/login/')
+    return cliente.post('/core/login/', {'email': EMAIL_BENCHMARK, 'password': SENHA_BENCHMARK})
+
+
+# ============================================================
+# 🔹 FLUXOS MEDIDOS
+# ============================================================
+def fluxo_login(cliente, fabrica, item):
+    return entrar(fabrica())
+
+
+def fluxo_catalogo(cliente, fabrica, item):
+    return cliente.get('/core/livros/view/')
+
+
+def fluxo_dashboard(cliente, fabrica, item):
+    return cliente.get('/core/dashboard/')
+
+
+def fluxo_agendar(cliente, fabrica, item):
+    data = (timezone.localdate() + timedelta(days=5)).isoformat()
+    return cliente.post('/core/agendar-retirada/', {'livro': item, 'data_retirada': data})
+
+
+def fluxo_cancelar(cliente, fabrica, item):
+    return cliente.post(f'/core/agendamento/{item}/cancelar/')
+
+
+def fluxo_devolver(cliente, fabrica, item):
+    return cliente.post(f'/core/api/devolver-livro/{item}/')
+
+
+# nome -> (função, nome da fila de itens consumidos ou None, status esperado)
+FLUXOS = {
+    'login': (fluxo_login, None, 302),
+    'catalogo': (fluxo_catalogo, None, 200),
+    'agendar_retirada': (fluxo_agendar, 'livros', 302),
+    'cancelar_agendamento': (fluxo_cancelar, 'agendamentos', 200),
+    'api_devolver_livro': (fluxo_devolver, 'emprestimos', 200),
+    'dashboard_leitor': (fluxo_dashboard, None, 200),
+}
+
+
+def resumir(duracoes, status, tempo_total, esperado):
+    duracoes = sorted(duracoes)
+    return {
+        'requisicoes': len(duracoes),
+        # Qualquer outro status é erro: um agendamento recusado pelo formulário volta 200, não 302.
+        'erros': sum(n for codigo, n in status.items() if codigo != esperado),
+        'status': {str(codigo): n for codigo, n in sorted(status.items())},
+        'duracao_s': round(tempo_total, 4),
+        'vazao_rps': round(len(duracoes) / tempo_total, 2) if tempo_total else 0.0,
+        'p50_ms': round(percentil(duracoes, 50) * 1000, 3),
+        'p90_ms': round(percentil(duracoes, 90) * 1000, 3),
+        'p95_ms': round(percentil(duracoes, 95) * 1000, 3),
+        'p99_ms': round(percentil(duracoes, 99) * 1000, 3),
+        'max_ms': round(duracoes[-1] * 1000, 3) if duracoes else 0.0,
+    }
+
+
+def executar_fluxo(funcao, fabrica, itens, iteracoes, concorrencia, esperado):
+    """
+    Executa ``iteracoes`` chamadas do fluxo com ``concorrencia`` clientes logados.
+    Cada chamada que consome um item (livro, agendamento, empréstimo) retira-o da fila.
+    """
+    fila = queue.Queue()
+    for item in (itens if itens is not None else [None] * iteracoes)[:iteracoes]:
+        fila.put(item)
+    duracoes, status, lock = [], Counter(), threading.Lock()
+
+    def trabalhar(cliente):
+        while True:
+            try:
+                item = fila.get_nowait()
+            except queue.Empty:
+                return
+            inicio = time.perf_counter()
+            try:
+                codigo = funcao(cliente, fabrica, item)
+            except Exception:
+                codigo = 599
+            duracao = time.perf_counter() - inicio
+            with lock:
+                duracoes.append(duracao)
+                status[codigo] += 1
+
+    clientes = []
+    for _ in range(concorrencia):
+        cliente = fabrica()
+        entrar(cliente)
+        clientes.append(cliente)
+
+    inicio = time.perf_counter()
+    if concorrencia == 1:
+        trabalhar(clientes[0])
+    else:
+        threads = [threading.Thread(target=trabalhar, args=(c,)) for c in clientes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return resumir(duracoes, status, time.perf_counter() - inicio, esperado)
+
+
+def executar_fluxos(fabrica, itens, iteracoes, iteracoes_login, concorrencia, fluxos):
+    resultados = {}
+    for nome in fluxos:
+        funcao, fila, esperado = FLUXOS[nome]
+        n = iteracoes_login if nome == 'login' else iteracoes
+        resultados[nome] = executar_fluxo(funcao, fabrica, itens.get(fila), n, concorrencia, esperado)
+    return resultados
+
+
+# ============================================================
+# 🔹 MODOS DE EXECUÇÃO
+# ============================================================
+def medir_cliente_teste(itens, iteracoes, iteracoes_login, fluxos):
+    with override_settings(**AJUSTES_EM_PROCESSO):
+        return executar_fluxos(ClienteTeste, itens, iteracoes, iteracoes_login, 1, fluxos)
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _aguardar(base, processo, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError('O gunicorn terminou antes de aceitar conexões.')
+        try:
+            urllib.request.urlopen(base + '/core/login/', timeout=2).read()
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Tempo esgotado aguardando o gunicorn.')
+
+
+def medir_gunicorn(itens, iteracoes, iteracoes_login, fluxos, workers, concorrencia):
+    porta = _porta_livre()
+    base = f'http://127.0.0.1:{porta}'
+    ambiente = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'library_manager.settings_benchmark',
+        'JAWSDB_URL': url_do_banco(),
+        # Sem SECRET_KEY fixa cada worker sorteia a sua e as sessões não valem entre eles.
+        'SECRET_KEY': settings.SECRET_KEY,
+    }
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'library_manager.wsgi',
+         '--bind', f'127.0.0.1:{porta}', '--workers', str(workers), '--log-level', 'warning'],
+        cwd=settings.BASE_DIR, env=ambiente,
+    )
+    try:
+        _aguardar(base, processo)
+        return executar_fluxos(lambda: ClienteHTTP(base), itens, iteracoes, iteracoes_login, concorrencia, fluxos)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(livros, leitores, emprestimos, iteracoes, iteracoes_login, modos, fluxos,
+             workers=4, concorrencia=4):
+    """Cria o banco, popula o acervo, mede os modos pedidos e devolve o relatório."""
+    # Cada modo consome seus próprios livros, agendamentos e empréstimos.
+    reservados = 3 * iteracoes * len(modos)
+    if livros < reservados + 1:
+        raise ValueError(f'São necessários pelo menos {reservados + 1} livros para {iteracoes} iterações.')
+
+    with tempfile.TemporaryDirectory(prefix='garoca_benchmark_') as diretorio:
+        nome_original = criar_banco(diretorio)
+        try:
+            inicio = time.perf_counter()
+            livres = popular_acervo(livros, leitores, emprestimos, reservados)
+            leitor = Leitor.objects.get(email=EMAIL_BENCHMARK)
+            relatorio = {
+                'meta': {
+                    'commit': commit_atual(),
+                    'data': timezone.now().isoformat(),
+                    'banco': connection.vendor,
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'livros': livros, 'leitores': leitores, 'emprestimos': emprestimos,
+                    'iteracoes': iteracoes, 'iteracoes_login': iteracoes_login,
+                    'workers': workers, 'concorrencia': concorrencia,
+                    'carga_s': round(time.perf_counter() - inicio, 3),
+                },
+                'resultados': {},
+            }
+            for indice, modo in enumerate(modos):
+                bloco = livres[indice * 3 * iteracoes:(indice + 1) * 3 * iteracoes]
+                ids_emp, ids_ag = preparar_consumiveis(leitor, bloco[iteracoes:])
+                itens = {'livros': bloco[:iteracoes], 'emprestimos': ids_emp, 'agendamentos': ids_ag}
+                if modo == 'cliente':
+                    relatorio['resultados'][modo] = medir_cliente_teste(itens, iteracoes, iteracoes_login, fluxos)
+                else:
+                    relatorio['resultados'][modo] = medir_gunicorn(
+                        itens, iteracoes, iteracoes_login, fluxos, workers, concorrencia,
+                    )
+            return relatorio
+        finally:
+            destruir_banco(nome_original)
+
+
+# ============================================================
+# 🔹 CONCORRÊNCIA NO SQLITE (PERFIL PADRÃO x OTIMIZADO)
+# ============================================================
+def _operacoes_sqlite(duracao, escrita, semente, comecar_em):
+    """
+    Um processo do benchmark de concorrência. Alterna leituras (página do
+    catálogo por categoria) e escritas que leem e depois gravam na mesma
+    transação, como as da circulação. Roda em processo próprio, já com o
+    Django configurado pelo perfil pedido (veja medir_sqlite).
+    """
+    import random
+
+    from django.db import OperationalError, transaction
+
+    from core import facetas
+    from core.models import Categoria
+
+    aleatorio = random.Random(semente)
+    categorias = list(Categoria.objects.values_list('id', flat=True))
+    livros = list(Livro.objects.values_list('id', flat=True)[:5000])
+    resultado = {'leitura': [], 'escrita': [], 'erros_leitura': 0, 'erros_escrita': 0}
+
+    time.sleep(max(0.0, comecar_em - time.time()))
+    limite = time.perf_counter() + duracao
+    while time.perf_counter() < limite:
+        tipo = 'escrita' if aleatorio.random() < escrita else 'leitura'
+        inicio = time.perf_counter()
+        try:
+            if tipo == 'leitura':
+                facetas.pagina({'categoria': str(aleatorio.choice(categorias))}, tamanho=25)
+            else:
+                livro_id = aleatorio.choice(livros)
+                with transaction.atomic():
+                    status = Livro.objects.filter(pk=livro_id).values_list('status', flat=True).first()
+                    Livro.objects.filter(pk=livro_id).update(status=not status)
+        except OperationalError:
+            resultado[f'erros_{tipo}'] += 1
+            continue
+        resultado[tipo].append(time.perf_counter() - inicio)
+    return resultado
+
+
+def _resumir_operacoes(duracoes, erros, tempo_total):
+    duracoes = sorted(duracoes)
+    return {
+        'operacoes': len(duracoes),
+        'erros': erros,
+        'vazao_ops': round(len(duracoes) / tempo_total, 2) if tempo_total else 0.0,
+        'p50_ms': round(percentil(duracoes, 50) * 1000, 3),
+        'p95_ms': round(percentil(duracoes, 95) * 1000, 3),
+        'p99_ms': round(percentil(duracoes, 99) * 1000, 3),
+        'max_ms': round(duracoes[-1] * 1000, 3) if duracoes else 0.0,
+    }
+
+
+def _rodar_perfil(arquivo, otimizado, workers, duracao, escrita):
+    """Sobe ``workers`` processos novos (spawn) apontando para ``arquivo`` com o perfil pedido."""
+    import multiprocessing
+
+    ambiente = {
+        'DJANGO_SETTINGS_MODULE': 'library_manager.settings_benchmark',
+        'JAWSDB_URL': f'sqlite:///{arquivo}',
+        'SQLITE_OTIMIZADO': '1' if otimizado else '0',
+        'SQL_MONITOR': '0',
+    }
+    anteriores = {chave: os.environ.get(chave) for chave in ambiente}
+    os.environ.update(ambiente)  # herdado pelos processos criados com spawn
+    try:
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Pool(workers, initializer=django.setup) as pool:
+            comecar_em = time.time() + 3  # todos começam juntos, depois do django.setup
+            partes = pool.starmap(
+                _operacoes_sqlite, [(duracao, escrita, semente, comecar_em) for semente in range(workers)],
+            )
+    finally:
+        for chave, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+
+    return {
+        tipo: _resumir_operacoes(
+            [d for parte in partes for d in parte[tipo]],
+            sum(parte[f'erros_{tipo}'] for parte in partes),
+            duracao,
+        )
+        for tipo in ('leitura', 'escrita')
+    }
+
+
+def medir_sqlite(livros, leitores, emprestimos, workers=(4, 8), duracao=10, escrita=0.2):
+    """
+    Mede leituras e escritas simultâneas de vários processos num mesmo arquivo
+    SQLite, com o perfil padrão e com o de produção (core/sqlite.py). Os dois
+    perfis partem de cópias do mesmo acervo.
+    """
+    import shutil
+
+    if connection.vendor != 'sqlite':
+        raise ValueError('O benchmark de concorrência do SQLite precisa de um banco SQLite.')
+
+    with tempfile.TemporaryDirectory(prefix='garoca_sqlite_') as diretorio:
+        nome_original = criar_banco(diretorio)
+        try:
+            inicio = time.perf_counter()
+            popular_acervo(livros, leitores, emprestimos, 0)
+            carga = time.perf_counter() - inicio
+            # Volta para o journal padrão e fecha: a cópia fica autocontida, sem -wal.
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = DELETE')
+            connection.close()
+
+            relatorio = {
+                'meta': {
+                    'commit': commit_atual(),
+                    'data': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'livros': livros, 'leitores': leitores, 'emprestimos': emprestimos,
+                    'duracao_s': duracao, 'proporcao_escrita': escrita,
+                    'pragmas': settings.SQLITE_PRAGMAS,
+                    'carga_s': round(carga, 3),
+                },
+                'resultados': {},
+            }
+            for perfil, otimizado in (('padrao', False), ('otimizado', True)):
+                for quantidade in workers:
+                    arquivo = os.path.join(diretorio, f'{perfil}_{quantidade}.sqlite3')
+                    shutil.copyfile(connection.settings_dict['NAME'], arquivo)
+                    relatorio['resultados'].setdefault(perfil, {})[f'{quantidade}_workers'] = _rodar_perfil(
+                        arquivo, otimizado, quantidade, duracao, escrita,
+                    )
+            return relatorio
+        finally:
+            destruir_banco(nome_original)
@@ -0,0 +1,356 @@
+"""
+Enriquecimento do catálogo a partir de um dump bibliográfico local.
+
+O dump (por exemplo o de edições do Open Library: TSV com o JSON na última
+coluna, ou um JSONL com um registro por linha, opcionalmente .gz) é lido uma
+única vez e gravado num índice SQLite em disco, com tabelas chave-valor por
+ISBN e por título normalizado. O catálogo inteiro é então percorrido em
+lotes pela chave primária: cada lote faz uma consulta por chave primária no
+índice para todos os seus ISBNs e outra para os seus títulos, e grava as
+mudanças com um UPDATE parametrizado por livro num único executemany (o
+bulk_update do Django monta um CASE por campo e era o gargalo).
+
+Só campos vazios são preenchidos: ISBN, ano de publicação e o autor quando é
+"Desconhecido". Um livro sem ISBN casa pelo título e, se tiver autor, também
+pelo autor (core.autores.chave); sem autor, só quando todas as edições com
+aquele título são do mesmo autor. O ISBN só é gravado quando o título aponta
+para uma única edição e ninguém no catálogo já o usa.
+"""
+import gzip
+import json
+import os
+import re
+import sqlite3
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import autocompletar, autores, facetas
+from core.models import Livro
+from core.texto import normalizar
+
+# Títulos com mais edições que isso (coletâneas, "Poemas") não são usados para casar.
+MAX_EDICOES_POR_TITULO = 50
+# Parâmetros por consulta ao índice (limite antigo do SQLite: 999).
+LOTE_CONSULTA = 500
+
+_ANO = re.compile(r'\b(1[4-9]\d\d|20\d\d)\b')
+
+ESQUEMA = '''
+    CREATE TABLE obras (id INTEGER PRIMARY KEY, titulo TEXT, autores TEXT, ano INTEGER, isbn TEXT);
+    CREATE TABLE isbns (isbn TEXT PRIMARY KEY, obra INTEGER) WITHOUT ROWID;
+    CREATE TABLE titulos (titulo TEXT, obra INTEGER, PRIMARY KEY (titulo, obra)) WITHOUT ROWID;
+    CREATE TABLE nomes (chave TEXT PRIMARY KEY, nome TEXT) WITHOUT ROWID;
+'''
+
+
+# ============================================================
+# 🔹 LEITURA DO DUMP
+# ============================================================
+def normalizar_isbn(valor):
+    """ISBN-13 só com dígitos, convertendo ISBN-10. Devolve None se o valor não for um ISBN."""
+    digitos = re.sub(r'[^0-9Xx]', '', str(valor or '')).upper()
+    if len(digitos) == 10 and digitos[:9].isdigit():
+        base = '978' + digitos[:9]
+    elif len(digitos) == 13 and digitos.isdigit():
+        return digitos
+    else:
+        return None
+    soma = sum(int(digito) * (3 if posicao % 2 else 1) for posicao, digito in enumerate(base))
+    return base + str((10 - soma % 10) % 10)
+
+
+def _lista(valor):
+    if valor is None:
+        return []
+    return valor if isinstance(valor, list) else [valor]
+
+
+def _isbns(registro):
+    vistos = []
+    for campo in ('isbn_13', 'isbn_10', 'isbn'):
+        for valor in _lista(registro.get(campo)):
+            isbn = normalizar_isbn(valor)
+            if isbn and isbn not in vistos:
+                vistos.append(isbn)
+    return vistos
+
+
+def _autores(registro):
+    """Nomes dos autores; referências ('/authors/OL1A') ficam com '@' para resolver na consulta."""
+    nomes = []
+    for autor in _lista(registro.get('authors')) + _lista(registro.get('author_name')):
+        if isinstance(autor, dict):
+            autor = autor.get('author', autor)
+            if isinstance(autor, dict):
+                autor = autor.get('name') or (f"@{autor['key']}" if autor.get('key') else None)
+        if autor:
+            nomes.append(autor)
+    if not nomes and registro.get('by_statement'):
+        nomes = autores.separar(registro['by_statement'].rstrip('.'))
+    return nomes
+
+
+def _ano(registro):
+    for campo in ('first_publish_year', 'publish_year', 'publish_date', 'ano'):
+        for valor in _lista(registro.get(campo)):
+            encontrado = _ANO.search(str(valor))
+            if encontrado:
+                return int(encontrado.group())
+    return None
+
+
+def _titulos(registro):
+    titulo = normalizar(registro.get('title'))
+    chaves = {titulo} if titulo else set()
+    if titulo and registro.get('subtitle'):
+        chaves.add(normalizar(f"{registro['title']} {registro['subtitle']}"))
+    return chaves
+
+
+def _registros(caminho):
+    abrir = gzip.open if str(caminho).endswith('.gz') else open
+    with abrir(caminho, 'rt', encoding='utf-8', errors='replace') as arquivo:
+        for linha in arquivo:
+            # Dump do Open Library: tipo, chave, revisão, data e o JSON na última coluna.
+            texto = linha if linha.lstrip().startswith('{') else linha.rsplit('\t', 1)[-1]
+            try:
+                registro = json.loads(texto)
+            except ValueError:
+                continue
+            if isinstance(registro, dict):
+                yield registro
+
+
+# ============================================================
+# 🔹 ÍNDICE EM DISCO
+# ============================================================
+def construir_indice(dump, destino, lote=20000, progresso=None):
+    """
+    Lê o ``dump`` uma vez e grava o índice em ``destino``. O arquivo é montado
+    ao lado e trocado no fim, então um índice antigo continua utilizável até
+    lá. Devolve quantas edições foram indexadas.
+    """
+    progresso = progresso or (lambda mensagem: None)
+    temporario = f'{destino}.novo'
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    conexao = sqlite3.connect(temporario)
+    # Arquivo descartável até o os.replace: sem journal nem fsync.
+    conexao.executescript('PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF; PRAGMA cache_size = -200000;')
+    conexao.executescript(ESQUEMA)
+
+    obras, isbns, titulos, nomes = [], [], [], []
+
+    def gravar():
+        conexao.executemany('INSERT INTO obras VALUES (?, ?, ?, ?, ?)', obras)
+        conexao.executemany('INSERT OR IGNORE INTO isbns VALUES (?, ?)', isbns)
+        conexao.executemany('INSERT OR IGNORE INTO titulos VALUES (?, ?)', titulos)
+        conexao.executemany('INSERT OR REPLACE INTO nomes VALUES (?, ?)', nomes)
+        for tabela in (obras, isbns, titulos, nomes):
+            tabela.clear()
+
+    total = 0
+    for registro in _registros(dump):
+        chave = registro.get('key') or ''
+        tipo = registro['type'].get('key') if isinstance(registro.get('type'), dict) else None
+        if tipo == '/type/author' or chave.startswith('/authors/'):
+            if registro.get('name'):
+                nomes.append((chave, registro['name']))
+            continue
+        chaves_titulo = _titulos(registro)
+        if not chaves_titulo:
+            continue
+        total += 1
+        isbns_registro = _isbns(registro)
+        obras.append((
+            total, registro['title'], json.dumps(_autores(registro), ensure_ascii=False),
+            _ano(registro), isbns_registro[0] if isbns_registro else None,
+        ))
+        isbns.extend((isbn, total) for isbn in isbns_registro)
+        titulos.extend((titulo, total) for titulo in chaves_titulo)
+        if len(obras) >= lote:
+            gravar()
+            progresso(f'{total} edição(ões) indexada(s)...')
+    gravar()
+    conexao.commit()
+    conexao.close()
+    os.replace(temporario, destino)
+    return total
+
+
+class Indice:
+    """Consultas em lote ao índice gerado por ``construir_indice`` (somente leitura)."""
+
+    def __init__(self, caminho):
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f'Índice bibliográfico não encontrado: {caminho}')
+        self.conexao = sqlite3.connect(f'file:{caminho}?mode=ro', uri=True)
+
+    def fechar(self):
+        self.conexao.close()
+
+    def _consultar(self, sql, valores):
+        valores = list(valores)
+        for inicio in range(0, len(valores), LOTE_CONSULTA):
+            parte = valores[inicio:inicio + LOTE_CONSULTA]
+            yield from self.conexao.execute(sql.format(','.join('?' * len(parte))), parte)
+
+    def _obras(self, ids):
+        obras = {
+            obra_id: {'titulo': titulo, 'autores': json.loads(nomes), 'ano': ano, 'isbn': isbn}
+            for obra_id, titulo, nomes, ano, isbn in self._consultar(
+                'SELECT id, titulo, autores, ano, isbn FROM obras WHERE id IN ({})', set(ids),
+            )
+        }
+        referencias = {nome[1:] for obra in obras.values() for nome in obra['autores'] if nome.startswith('@')}
+        resolvidos = dict(self._consultar('SELECT chave, nome FROM nomes WHERE chave IN ({})', referencias))
+        for obra in obras.values():
+            obra['autores'] = [
+                resolvidos.get(nome[1:]) if nome.startswith('@') else nome for nome in obra['autores']
+            ]
+            obra['autores'] = [nome for nome in obra['autores'] if nome]
+        return obras
+
+    def por_isbn(self, isbns):
+        """{isbn: edição} para os ISBNs encontrados."""
+        pares = list(self._consultar('SELECT isbn, obra FROM isbns WHERE isbn IN ({})', isbns))
+        obras = self._obras(obra for _, obra in pares)
+        return {isbn: obras[obra] for isbn, obra in pares if obra in obras}
+
+    def por_titulo(self, titulos):
+        """{título normalizado: [edições]}, sem os títulos com edições demais."""
+        candidatos = {}
+        for titulo, obra in self._consultar('SELECT titulo, obra FROM titulos WHERE titulo IN ({})', titulos):
+            candidatos.setdefault(titulo, []).append(obra)
+        candidatos = {titulo: ids for titulo, ids in candidatos.items() if len(ids) <= MAX_EDICOES_POR_TITULO}
+        obras = self._obras(obra for ids in candidatos.values() for obra in ids)
+        return {titulo: [obras[obra] for obra in ids if obra in obras] for titulo, ids in candidatos.items()}
+
+
+# ============================================================
+# 🔹 ENRIQUECIMENTO DO CATÁLOGO
+# ============================================================
+def _escolher(livro, edicoes):
+    """Edições compatíveis com o autor do livro, ou todas se forem de um único autor."""
+    chave_livro = {autores.chave(nome) for nome in autores.separar(livro.autor)}
+    if chave_livro:
+        return [
+            edicao for edicao in edicoes
+            if chave_livro & {autores.chave(nome) for nome in edicao['autores']}
+        ]
+    distintos = {tuple(sorted(autores.chave(nome) for nome in edicao['autores'])) for edicao in edicoes}
+    return edicoes if len(distintos) == 1 and distintos != {()} else []
+
+
+def _mudancas(livro, edicoes, por_isbn):
+    """Campos vazios do livro que as ``edicoes`` preenchem."""
+    mudancas = {}
+    anos = [edicao['ano'] for edicao in edicoes if edicao['ano']]
+    if livro.ano_publicacao is None and anos:
+        mudancas['ano_publicacao'] = min(anos)
+    nomes = next((edicao['autores'] for edicao in edicoes if edicao['autores']), None)
+    if not autores.separar(livro.autor) and nomes:
+        credito = '; '.join(nomes)
+        if len(credito) <= Livro._meta.get_field('autor').max_length:
+            mudancas['autor'] = credito
+    isbns = {edicao['isbn'] for edicao in edicoes if edicao['isbn']}
+    if not livro.isbn and not por_isbn and len(edicoes) == 1 and len(isbns) == 1:
+        mudancas['isbn'] = isbns.pop()
+    return mudancas
+
+
+def _gravar(alterados, agora):
+    """
+    Grava as mudanças sem sobrescrever o que alguém tenha preenchido depois da
+    leitura: cada campo só muda se ainda estiver vazio.
+    """
+    qn = connection.ops.quote_name
+    sql = (
+        f'UPDATE {qn(Livro._meta.db_table)} SET '
+        f'{qn("isbn")} = COALESCE(NULLIF({qn("isbn")}, %s), %s), '
+        f'{qn("ano_publicacao")} = COALESCE({qn("ano_publicacao")}, %s), '
+        f'{qn("autor")} = COALESCE(%s, {qn("autor")}), '
+        f'{qn("modificado")} = %s '
+        f'WHERE {qn("id")} = %s'
+    )
+    modificado = connection.ops.adapt_datetimefield_value(agora)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            ('', mudancas.get('isbn'), mudancas.get('ano_publicacao'), mudancas.get('autor'), modificado, livro_id)
+            for livro_id, mudancas in alterados
+        ])
+
+
+def enriquecer(indice, lote=2000, simular=False, progresso=None):
+    """
+    Preenche os campos vazios de todos os livros que têm algum, em lotes pela
+    chave primária. Com ``simular``, só conta. Devolve um Counter com o que
+    foi (ou seria) alterado.
+    """
+    progresso = progresso or (lambda mensagem: None)
+    pendentes = Livro.objects.filter(
+        Q(isbn__isnull=True) | Q(isbn='') | Q(ano_publicacao__isnull=True) | Q(autores__isnull=True)
+    ).only('id', 'nome', 'autor', 'isbn', 'ano_publicacao').order_by('id')
+    resultado = Counter()
+    usados = set()
+    ultimo = 0
+    while True:
+        livros = list(pendentes.filter(id__gt=ultimo)[:lote])
+        if not livros:
+            break
+        ultimo = livros[-1].id
+        resultado['lidos'] += len(livros)
+
+        isbns = {livro.id: normalizar_isbn(livro.isbn) for livro in livros if livro.isbn}
+        achados = indice.por_isbn({isbn for isbn in isbns.values() if isbn})
+        sem_isbn = [livro for livro in livros if isbns.get(livro.id) not in achados]
+        titulos = indice.por_titulo({normalizar(livro.nome) for livro in sem_isbn})
+
+        propostas = {}
+        for livro in livros:
+            edicao = achados.get(isbns.get(livro.id))
+            if edicao:
+                mudancas = _mudancas(livro, [edicao], por_isbn=True)
+            else:
+                mudancas = _mudancas(livro, _escolher(livro, titulos.get(normalizar(livro.nome), [])), por_isbn=False)
+            if mudancas:
+                propostas[livro] = mudancas
+
+        # ISBN é único: descarta os que outro livro já usa (no banco ou neste processamento).
+        novos_isbns = [mudancas['isbn'] for mudancas in propostas.values() if 'isbn' in mudancas]
+        ocupados = usados | set(Livro.objects.filter(isbn__in=novos_isbns).values_list('isbn', flat=True))
+        alterados = []
+        anos = Counter()
+        agora = timezone.now()
+        for livro, mudancas in propostas.items():
+            if mudancas.get('isbn') in ocupados:
+                del mudancas['isbn']
+                resultado['isbn_em_uso'] += 1
+            if not mudancas:
+                continue
+            if 'isbn' in mudancas:
+                ocupados.add(mudancas['isbn'])
+                usados.add(mudancas['isbn'])
+            if 'ano_publicacao' in mudancas:
+                anos[('ano', '')] -= 1
+                anos[('ano', str(mudancas['ano_publicacao']))] += 1
+            for campo in mudancas:
+                resultado[campo] += 1
+            alterados.append((livro.id, mudancas))
+        resultado['alterados'] += len(alterados)
+
+        if alterados and not simular:
+            # O UPDATE direto não dispara os signals: a faceta de ano é ajustada aqui mesmo.
+            with transaction.atomic():
+                _gravar(alterados, agora)
+                facetas.aplicar(anos)
+        progresso(f"{resultado['lidos']} lido(s), {resultado['alterados']} alterado(s)...")
+
+    if resultado['alterados'] and not simular:
+        if resultado['autor']:
+            autores.importar()
+        autocompletar.nova_geracao()
+    return resultado
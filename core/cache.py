@@ -0,0 +1,214 @@
+"""
+Cache com um único cálculo por chave (single-flight) e renovação antecipada.
+
+Quando uma chave quente vence no pico, cada requisição que a encontrasse
+vazia refaria a mesma consulta ao mesmo tempo. ``obter`` guarda junto do valor o
+vencimento lógico e quanto ele levou para ser calculado, e mantém o valor no
+cache por mais CACHE_OBSOLETO_MAXIMO segundos depois de vencer:
+
+- perto do vencimento, cada leitura sorteia se renova antes da hora, com
+  chance maior quanto mais caro o cálculo (XFetch); as renovações se espalham
+  em vez de acontecerem todas juntas;
+- quem vai renovar pega a trava da chave (core.locks.trava_cache); os outros continuam
+  servindo o valor antigo enquanto isso;
+- sem valor nenhum (primeira leitura ou chave apagada), quem não pegou a
+  trava espera até CACHE_ESPERA_MAXIMA segundos pelo valor de quem pegou e
+  só então calcula por conta própria.
+
+A coordenação vale até onde vale o cache configurado em CACHES (como em
+core.locks.trava_cache). Com o LocMemCache de library_manager/settings.py
+cada processo tem o seu cache e as suas travas: o cálculo é único entre as
+threads de um worker, mas N workers ainda calculam a mesma chave até N vezes,
+uma por processo. Só com um backend compartilhado (Redis, Memcached) ela
+passa a valer entre workers e máquinas. Apagar a chave com ``cache.delete``
+continua invalidando o valor.
+
+Para objetos pequenos lidos a toda requisição, ``obter_local`` põe na frente
+disso um LRU por processo (CacheLocal), limitado a CACHE_LOCAL_MAX_BYTES e
+com validade de até CACHE_LOCAL_TIMEOUT segundos. Os valores ficam agrupados
+em namespaces com um contador de versão no cache compartilhado: a chave de
+cada valor inclui a versão, ``invalidar(namespace)`` só incrementa o
+contador, e um worker só relê o contador (no máximo a cada
+CACHE_LOCAL_VERSAO_TTL segundos) para saber que a cópia local ficou velha,
+sem buscar de novo os valores grandes. Também aqui, com LocMemCache o
+contador é de cada processo e ``invalidar`` só alcança o worker que a chamou.
+"""
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics
+from core.locks import trava_cache
+
+PREFIXO_TRAVA = 'calculo:'
+PREFIXO_VERSAO = 'versao:'
+INTERVALO_ESPERA = 0.05  # segundos entre consultas de quem espera o valor
+
+
+def obter(chave, calcular, timeout, nome):
+    """
+    Valor de ``chave`` no cache, calculado por ``calcular()`` quando preciso.
+    ``timeout`` é a validade em segundos; ``nome`` identifica o cache nas métricas.
+    """
+    guardado = _ler(chave)
+    if guardado is not None:
+        valor, duracao, vence = guardado
+        sorteio = -duracao * settings.CACHE_XFETCH_BETA * math.log(1.0 - random.random())
+        if time.time() + sorteio < vence:
+            metrics.registrar_cache(nome, True)
+            return valor
+        motivo = 'vencido' if time.time() >= vence else 'antecipado'
+    else:
+        motivo = 'ausente'
+
+    with trava_cache(PREFIXO_TRAVA + chave, settings.CACHE_TRAVA_TIMEOUT) as adquirida:
+        if adquirida:
+            metrics.registrar_cache(nome, False)
+            return _calcular(chave, calcular, timeout, nome, motivo)
+
+    if guardado is not None:
+        metrics.registrar_coalescida(nome, 'obsoleto')
+        return guardado[0]
+
+    limite = time.monotonic() + settings.CACHE_ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        guardado = _ler(chave)
+        if guardado is not None:
+            metrics.registrar_coalescida(nome, 'espera')
+            return guardado[0]
+    # Quem estava calculando demorou demais ou morreu no meio.
+    metrics.registrar_cache(nome, False)
+    return _calcular(chave, calcular, timeout, nome, 'espera_esgotada')
+
+
+def _ler(chave):
+    guardado = cache.get(chave)
+    # Valores gravados antes deste formato (ou por outro código) contam como ausentes.
+    if isinstance(guardado, tuple) and len(guardado) == 3:
+        return guardado
+    return None
+
+
+def _calcular(chave, calcular, timeout, nome, motivo):
+    inicio = time.perf_counter()
+    valor = calcular()
+    duracao = time.perf_counter() - inicio
+    metrics.registrar_recalculo(nome, motivo, duracao)
+    if timeout is None:
+        cache.set(chave, (valor, duracao, math.inf), None)
+    else:
+        cache.set(chave, (valor, duracao, time.time() + timeout), timeout + settings.CACHE_OBSOLETO_MAXIMO)
+    return valor
+
+
+# ============================================================
+# 🔹 CACHE LOCAL (PRIMEIRO NÍVEL)
+# ============================================================
+_AUSENTE = object()
+
+
+class CacheLocal:
+    """LRU deste processo limitado em bytes (pelo tamanho em pickle), com validade por entrada."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._itens = OrderedDict()  # chave -> (valor, tamanho, vence)
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return _AUSENTE
+            if item[2] > time.monotonic():
+                self._itens.move_to_end(chave)
+                return item[0]
+            self._remover(chave)
+            tamanho, itens = self.bytes, len(self._itens)
+        metrics.registrar_cache_local(tamanho, itens)
+        return _AUSENTE
+
+    def set(self, chave, valor, timeout):
+        try:
+            tamanho = len(pickle.dumps(valor, pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        # Um valor grande demais expulsaria todo o resto; fica só no cache compartilhado.
+        if tamanho > self.max_bytes // 4:
+            return
+        with self._trava:
+            if chave in self._itens:
+                self._remover(chave)
+            while self._itens and self.bytes + tamanho > self.max_bytes:
+                self._remover(next(iter(self._itens)))
+            self._itens[chave] = (valor, tamanho, time.monotonic() + timeout)
+            self.bytes += tamanho
+            tamanho, itens = self.bytes, len(self._itens)
+        metrics.registrar_cache_local(tamanho, itens)
+
+    def delete(self, chave):
+        with self._trava:
+            if chave not in self._itens:
+                return
+            self._remover(chave)
+            tamanho, itens = self.bytes, len(self._itens)
+        metrics.registrar_cache_local(tamanho, itens)
+
+    def clear(self):
+        with self._trava:
+            self._itens.clear()
+            self.bytes = 0
+        metrics.registrar_cache_local(0, 0)
+
+    def _remover(self, chave):
+        self.bytes -= self._itens.pop(chave)[1]
+
+
+local = CacheLocal(settings.CACHE_LOCAL_MAX_BYTES)
+
+
+def versao(namespace):
+    """Versão atual de ``namespace``; a cópia local do contador vale CACHE_LOCAL_VERSAO_TTL segundos."""
+    chave = PREFIXO_VERSAO + namespace
+    atual = local.get(chave)
+    if atual is _AUSENTE:
+        atual = cache.get(chave)
+        if atual is None:
+            # Começa pelo relógio: um contador perdido (despejo, reinício) não volta a versões antigas.
+            cache.add(chave, time.time_ns() // 1_000_000, None)
+            atual = cache.get(chave)
+        local.set(chave, atual, settings.CACHE_LOCAL_VERSAO_TTL)
+    return atual
+
+
+def invalidar(namespace):
+    """Torna velhos os valores de ``namespace`` nos dois níveis; em todos os workers se o cache for compartilhado."""
+    chave = PREFIXO_VERSAO + namespace
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.add(chave, time.time_ns() // 1_000_000, None)
+    local.delete(chave)
+
+
+def obter_local(namespace, chave, calcular, timeout, nome):
+    """
+    Como ``obter``, com um LRU por processo na frente. A cópia local vale até
+    CACHE_LOCAL_TIMEOUT segundos ou até ``invalidar(namespace)``.
+    """
+    chave = f'{namespace}:{versao(namespace)}:{chave}'
+    valor = local.get(chave)
+    metrics.registrar_nivel_local(nome, valor is not _AUSENTE)
+    if valor is _AUSENTE:
+        valor = obter(chave, calcular, timeout, nome)
+        local.set(chave, valor, min(timeout or math.inf, settings.CACHE_LOCAL_TIMEOUT))
+    return valor
+
@@ -0,0 +1,179 @@
+"""
+Operações de circulação: as transições de estado de empréstimos e
+agendamentos, para uma linha (views) ou em lote (admin, comandos).
+
+Cada transição é um UPDATE condicional (``WHERE status=<origem>``) mais o
+UPDATE do livro afetado, na mesma transação, reproduzindo os efeitos
+colaterais que as views e os signals fariam linha a linha. Quem chega
+depois de outra requisição que já mudou o estado recebe TransicaoInvalida,
+não uma escrita duplicada.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core import facetas
+from core.models import Agendamento, Emprestimo, Livro
+
+
+# ============================================================
+# 🔹 TRANSIÇÕES DE ESTADO
+# ============================================================
+class Transicao:
+    """
+    Mudança de ``status`` de ``modelo`` de ``origem`` para ``destino``.
+    ``livro`` diz o que acontece com o livro da linha: True libera, False
+    prende, None não mexe; ``condicao_livro`` restringe ainda mais quais
+    livros mudam. ``campos`` são gravados junto (callables são chamados na
+    hora).
+    """
+
+    def __init__(self, modelo, origem, destino, livro=None, condicao_livro=None, campos=None):
+        self.modelo = modelo
+        self.origem = origem
+        self.destino = destino
+        self.livro = livro
+        self.condicao_livro = condicao_livro
+        self.campos = campos or {}
+
+    def valores(self):
+        return {campo: valor() if callable(valor) else valor for campo, valor in self.campos.items()}
+
+    def __str__(self):
+        return f'{self.modelo.__name__}: {self.origem} -> {self.destino}'
+
+
+TRANSICOES = {
+    'devolver': Transicao(Emprestimo, 'in_progress', 'completed', livro=True, campos={'data_devolvida': timezone.localdate}),
+    # Um livro agendado pode ter sido emprestado no balcão; cancelar o agendamento não o devolve.
+    'cancelar': Transicao(
+        Agendamento, 'scheduled', 'cancelled', livro=True,
+        condicao_livro=~Exists(Emprestimo.objects.filter(livro=OuterRef('pk'), status='in_progress')),
+    ),
+}
+
+
+class TransicaoInvalida(Exception):
+    """A linha não estava no estado de origem da transição (outra requisição chegou antes)."""
+
+    def __init__(self, transicao, status):
+        self.transicao = transicao
+        self.status = status
+        super().__init__(f'{transicao} não se aplica a uma linha em {status!r}')
+
+
+def transitar(transicao, queryset, agora=None):
+    """
+    Aplica ``transicao`` às linhas do queryset que estão na origem e devolve
+    quantas mudaram. São dois UPDATEs (o livro, pela subconsulta das linhas
+    ainda na origem, e as linhas); o ajuste das facetas, se algum livro
+    mudou, fica para depois do commit. O livro vai primeiro: uma transação
+    concorrente fica esperando por ele e, quando segue, não acha mais nada
+    na origem. ``agora`` vai para ``modificado`` das linhas alteradas.
+    """
+    agora = agora or timezone.now()
+    pendentes = queryset.filter(status=transicao.origem)
+    with transaction.atomic(savepoint=False):
+        livros = 0
+        if transicao.livro is not None:
+            afetados = Livro.objects.filter(id__in=pendentes.values('livro_id'), status=not transicao.livro)
+            if transicao.condicao_livro is not None:
+                afetados = afetados.filter(transicao.condicao_livro)
+            livros = afetados.update(status=transicao.livro, modificado=agora)
+        total = pendentes.update(status=transicao.destino, modificado=agora, **transicao.valores())
+        if livros:
+            facetas.ajustar_disponibilidade(**{'liberados' if transicao.livro else 'presos': livros})
+        return total
+
+
+def transitar_um(nome, pk, **filtros):
+    """
+    Aplica a transição ``nome`` à linha ``pk`` (restrita por ``filtros``, p.ex.
+    ``leitor=request.user``). Levanta DoesNotExist se a linha não existe e
+    TransicaoInvalida se ela não está na origem; nos dois casos nada é gravado.
+    """
+    transicao = TRANSICOES[nome]
+    linha = transicao.modelo.objects.filter(pk=pk, **filtros)
+    with transaction.atomic():
+        if transitar(transicao, linha):
+            return
+        status = linha.values_list('status', flat=True).first()
+        if status is None:
+            raise transicao.modelo.DoesNotExist
+        raise TransicaoInvalida(transicao, status)
+
+
+class LivroIndisponivel(Exception):
+    """O livro já estava emprestado ou agendado (outra requisição chegou antes)."""
+
+
+def agendar(agendamento):
+    """
+    Grava ``agendamento`` e prende o livro dele, desde que ainda esteja
+    disponível. O livro é preso por um UPDATE condicional (``WHERE
+    status=True``): de duas requisições para o mesmo livro, só uma muda a
+    linha; a outra recebe LivroIndisponivel e nada é gravado.
+    """
+    with transaction.atomic():
+        presos = Livro.objects.filter(pk=agendamento.livro_id, status=True).update(
+            status=False, modificado=timezone.now(),
+        )
+        if not presos:
+            raise LivroIndisponivel
+        agendamento.save()
+        facetas.ajustar_disponibilidade(presos=presos)
+
+
+# ============================================================
+# 🔹 OPERAÇÕES EM LOTE
+# ============================================================
+def devolver_emprestimos(queryset):
+    """Finaliza os empréstimos em andamento do queryset e libera seus livros."""
+    return transitar(TRANSICOES['devolver'], queryset)
+
+
+def cancelar_agendamentos(queryset):
+    """Cancela os agendamentos pendentes do queryset e libera seus livros."""
+    return transitar(TRANSICOES['cancelar'], queryset)
+
+
+def agendamentos_expirados(queryset, tolerancia_dias=0, hoje=None):
+    """Agendamentos pendentes cuja data agendada (mais a tolerância) já passou."""
+    hoje = hoje or timezone.localdate()
+    limite = hoje - timedelta(days=tolerancia_dias)
+    return queryset.filter(status='scheduled', data_agendada__lt=limite)
+
+
+def definir_ativo(queryset, ativo):
+    """Ativa ou desativa vários registros de uma vez."""
+    return queryset.exclude(ativo=ativo).update(ativo=ativo, modificado=timezone.now())
+
+
+def expirar_agendamentos(tolerancia_dias=0, hoje=None, lote=1000):
+    """
+    Cancela os agendamentos vencidos e libera seus livros, em lotes.
+
+    Devolve os ids dos agendamentos que esta chamada cancelou, para que quem
+    chamou possa avisar os leitores. Um agendamento que o leitor cancelou (ou
+    retirou) entre a seleção e o UPDATE não entra: as linhas são relidas pelo
+    estado e pelo ``modificado`` que a transição gravou.
+    """
+    vencidos = agendamentos_expirados(Agendamento.objects.all(), tolerancia_dias, hoje)
+    transicao = TRANSICOES['cancelar']
+    cancelados = []
+    while True:
+        with transaction.atomic():
+            ids = list(vencidos.order_by().select_for_update().values_list('id', flat=True)[:lote])
+            if not ids:
+                break
+            agora = timezone.now()
+            lote_agendamentos = Agendamento.objects.filter(id__in=ids)
+            if transitar(transicao, lote_agendamentos, agora):
+                cancelados.extend(
+                    lote_agendamentos.filter(status=transicao.destino, modificado=agora).values_list('id', flat=True)
+                )
+        if len(ids) < lote:
+            break
+    return cancelados
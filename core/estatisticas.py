@@ -0,0 +1,225 @@
+"""
+Estatísticas de circulação pré-agregadas.
+
+As tabelas EstatisticaDiaria, EstatisticaMensal e EstatisticaLivroMensal são
+mantidas pelo comando ``atualizar_estatisticas``. Cada execução olha só os
+empréstimos modificados desde a última marca d'água (``Emprestimo.modificado``)
+e recalcula por inteiro os dias e meses que eles tocam, somando a tabela viva
+e o histórico arquivado (core/arquivo.py). Assim o relatório lê apenas as
+tabelas agregadas, sem agrupar ``core_emprestimo``.
+
+Empréstimos apagados não alteram ``modificado``, e uma data de saída ou de
+devolução corrigida só recalcula o dia novo (o antigo fica com a contagem
+anterior); para refletir os dois casos, rode o comando com ``--recalcular``.
+"""
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from core.models import (
+    Emprestimo, EmprestimoHistorico, EstatisticaDiaria, EstatisticaLivroMensal, EstatisticaMensal,
+    MarcaProcessamento,
+)
+
+MARCA = 'estatisticas'
+DIAS_POR_LOTE = 31
+
+
+def inicio_do_mes(dia):
+    return dia.replace(day=1)
+
+
+def proximo_mes(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+def _em_dias(duracao):
+    return duracao.days if duracao else 0
+
+
+def _fontes():
+    # Arquivados nunca mudam, mas continuam contando nos recálculos.
+    return (Emprestimo.objects.all(), EmprestimoHistorico.objects.all())
+
+
+def _agregados_de_devolucao():
+    return {
+        'devolucoes': Count('id'),
+        'devolucoes_atrasadas': Count('id', filter=Q(data_devolvida__gt=F('devolucao'))),
+        'dias_emprestado': Sum(ExpressionWrapper(F('data_devolvida') - F('issue_date'), output_field=DurationField())),
+    }
+
+
+# ============================================================
+# 🔹 RECÁLCULO
+# ============================================================
+def recalcular_dias(dias):
+    """Refaz as linhas de EstatisticaDiaria dos ``dias`` informados."""
+    dias = sorted(dias)
+    for inicio in range(0, len(dias), DIAS_POR_LOTE):
+        lote = dias[inicio:inicio + DIAS_POR_LOTE]
+        linhas = {}
+
+        def linha(dia, categoria_id):
+            chave = (dia, categoria_id)
+            if chave not in linhas:
+                linhas[chave] = EstatisticaDiaria(dia=dia, categoria_id=categoria_id)
+            return linhas[chave]
+
+        for fonte in _fontes():
+            saidas = (
+                fonte.filter(issue_date__in=lote)
+                .values('issue_date', 'livro__categoria_id')
+                .annotate(total=Count('id'))
+                .order_by()
+            )
+            for saida in saidas:
+                linha(saida['issue_date'], saida['livro__categoria_id']).emprestimos += saida['total']
+
+            devolucoes = (
+                fonte.filter(data_devolvida__in=lote)
+                .values('data_devolvida', 'livro__categoria_id')
+                .annotate(**_agregados_de_devolucao())
+                .order_by()
+            )
+            for devolucao in devolucoes:
+                atual = linha(devolucao['data_devolvida'], devolucao['livro__categoria_id'])
+                atual.devolucoes += devolucao['devolucoes']
+                atual.devolucoes_atrasadas += devolucao['devolucoes_atrasadas']
+                atual.dias_emprestado += _em_dias(devolucao['dias_emprestado'])
+
+        with transaction.atomic():
+            EstatisticaDiaria.objects.filter(dia__in=lote).delete()
+            EstatisticaDiaria.objects.bulk_create(linhas.values())
+
+
+def recalcular_meses(meses):
+    """Refaz EstatisticaMensal e EstatisticaLivroMensal dos ``meses`` (datas no dia 1)."""
+    for mes in sorted(meses):
+        fim = proximo_mes(mes)
+        totais = {'emprestimos': 0, 'devolucoes': 0, 'devolucoes_atrasadas': 0, 'dias_emprestado': 0}
+        leitores = set()
+        por_livro = {}
+        for fonte in _fontes():
+            saidas = fonte.filter(issue_date__gte=mes, issue_date__lt=fim).order_by()
+            for item in saidas.values('livro_id').annotate(total=Count('id')):
+                por_livro[item['livro_id']] = por_livro.get(item['livro_id'], 0) + item['total']
+                totais['emprestimos'] += item['total']
+            # Leitores distintos não se somam entre as tabelas: junta os ids.
+            leitores.update(saidas.values_list('leitor_id', flat=True).distinct())
+
+            devolvidos = (
+                fonte.filter(data_devolvida__gte=mes, data_devolvida__lt=fim)
+                .aggregate(**_agregados_de_devolucao())
+            )
+            totais['devolucoes'] += devolvidos['devolucoes']
+            totais['devolucoes_atrasadas'] += devolvidos['devolucoes_atrasadas']
+            totais['dias_emprestado'] += _em_dias(devolvidos['dias_emprestado'])
+
+        with transaction.atomic():
+            EstatisticaMensal.objects.update_or_create(mes=mes, defaults={
+                **totais, 'leitores_ativos': len(leitores),
+            })
+            EstatisticaLivroMensal.objects.filter(mes=mes).delete()
+            EstatisticaLivroMensal.objects.bulk_create(
+                [EstatisticaLivroMensal(mes=mes, livro_id=livro, emprestimos=total) for livro, total in por_livro.items()],
+                batch_size=5000,
+            )
+
+
+def dias_afetados(desde=None):
+    """
+    Dias de saída e de devolução dos empréstimos modificados após ``desde``.
+    Sem ``desde``, todos os dias, incluindo os do histórico arquivado.
+    """
+    fontes = _fontes() if desde is None else (Emprestimo.objects.filter(modificado__gt=desde),)
+    dias = set()
+    for emprestimos in fontes:
+        emprestimos = emprestimos.order_by()
+        dias.update(emprestimos.values_list('issue_date', flat=True).distinct())
+        dias.update(emprestimos.exclude(data_devolvida=None).values_list('data_devolvida', flat=True).distinct())
+    return dias
+
+
+def atualizar(recalcular=False, margem=60):
+    """
+    Processa os empréstimos modificados desde a marca d'água e a avança.
+
+    A nova marca fica ``margem`` segundos antes de agora, para não pular linhas
+    de transações que ainda não fizeram commit; o que for reprocessado por
+    isso só é recalculado de novo. Devolve quantos dias e meses foram
+    recalculados.
+    """
+    nova_marca = timezone.now() - timedelta(seconds=margem)
+    marca = MarcaProcessamento.objects.filter(nome=MARCA).first()
+    desde = None if recalcular or marca is None else marca.valor
+
+    dias = dias_afetados(desde)
+    if recalcular:
+        EstatisticaDiaria.objects.all().delete()
+        EstatisticaMensal.objects.all().delete()
+        EstatisticaLivroMensal.objects.all().delete()
+    meses = {inicio_do_mes(dia) for dia in dias}
+    recalcular_dias(dias)
+    recalcular_meses(meses)
+
+    MarcaProcessamento.objects.update_or_create(nome=MARCA, defaults={'valor': nova_marca})
+    return {'dias': len(dias), 'meses': len(meses)}
+
+
+# ============================================================
+# 🔹 LEITURA (RELATÓRIO)
+# ============================================================
+def _taxas(linha):
+    devolucoes = linha['devolucoes'] or 0
+    linha['taxa_atraso'] = 100.0 * linha['devolucoes_atrasadas'] / devolucoes if devolucoes else 0.0
+    linha['duracao_media'] = linha['dias_emprestado'] / devolucoes if devolucoes else 0.0
+    return linha
+
+
+def relatorio(mes=None, quantidade_meses=12, top=10):
+    """Dados do relatório de circulação, lidos só das tabelas agregadas."""
+    mensal = list(
+        EstatisticaMensal.objects.order_by('-mes')
+        .values('mes', 'emprestimos', 'leitores_ativos', 'devolucoes', 'devolucoes_atrasadas', 'dias_emprestado')
+        [:quantidade_meses]
+    )
+    if mes is None:
+        mes = mensal[0]['mes'] if mensal else inicio_do_mes(timezone.localdate())
+    mes = inicio_do_mes(mes)
+
+    por_categoria = (
+        EstatisticaDiaria.objects.filter(dia__gte=mes, dia__lt=proximo_mes(mes))
+        .values('categoria__nome')
+        .annotate(
+            emprestimos=Sum('emprestimos'),
+            devolucoes=Sum('devolucoes'),
+            devolucoes_atrasadas=Sum('devolucoes_atrasadas'),
+            dias_emprestado=Sum('dias_emprestado'),
+        )
+        .order_by('-emprestimos')
+    )
+    top_livros = (
+        EstatisticaLivroMensal.objects.filter(mes=mes)
+        .select_related('livro')
+        .order_by('-emprestimos')[:top]
+    )
+    marca = MarcaProcessamento.objects.filter(nome=MARCA).values_list('valor', flat=True).first()
+    return {
+        'mes': mes,
+        'mensal': [_taxas(linha) for linha in reversed(mensal)],
+        'por_categoria': [_taxas(linha) for linha in por_categoria],
+        'top_livros': top_livros,
+        'atualizado_em': marca,
+    }
+
+
+def mes_do_parametro(valor):
+    """Converte 'AAAA-MM' em date; devolve None se inválido."""
+    try:
+        ano, mes = (int(parte) for parte in valor.split('-'))
+        return date(ano, mes, 1)
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,229 @@
+"""
+Navegação do catálogo por facetas (categoria, autor, ano e disponibilidade).
+
+As contagens exibidas ao lado de cada filtro vêm da tabela ContagemFaceta,
+que guarda quantos livros existem por valor de cada faceta. Ela é mantida
+incrementalmente: os signals de Livro aplicam a diferença entre o estado
+antigo e o novo de cada livro salvo ou apagado (e os de ``Livro.autores``, a
+de cada vínculo com autor), e as operações em lote de core/circulacao.py
+ajustam a disponibilidade pelo número de linhas que mudaram. As diferenças
+são somadas depois do commit, numa transação curta própria: as linhas de
+'disponivel' são tocadas por todo empréstimo e devolução, e segurá-las até o
+fim da transação de cada um enfileiraria a circulação inteira nelas. Se o
+processo cair entre os dois commits, a contagem fica defasada até o próximo
+recálculo. Cargas que pulam os signals (bulk_create, UPDATE direto) devem ser
+seguidas de ``manage.py atualizar_facetas``, que recalcula tudo e atualiza
+as estatísticas do planejador da tabela de livros.
+
+As contagens são do catálogo inteiro, não da combinação de filtros aplicada:
+contar por combinação exigiria um GROUP BY por requisição, que é o que a
+tabela existe para evitar. A listagem filtrada usa os índices
+(faceta, nome, id) de Livro e pagina por chave, sem COUNT nem OFFSET.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+
+from core import cache as cache_unico
+from core.models import Autor, Categoria, ContagemFaceta, Livro
+
+NAMESPACE_CACHE = 'facetas'
+
+# Faceta -> campo de Livro. A faceta 'autor' vem de Livro.autores (valor = id do Autor).
+CAMPOS = {
+    'categoria': 'categoria_id',
+    'ano': 'ano_publicacao',
+    'disponivel': 'status',
+}
+Vinculo = Livro.autores.through
+
+
+def _valor(campo, valor):
+    if valor is None:
+        return ''
+    if campo == 'status':
+        return '1' if valor else '0'
+    return str(valor)
+
+
+def chaves(valores):
+    """Pares (faceta, valor) de um livro, a partir de um dict campo -> valor."""
+    return {(faceta, _valor(campo, valores[campo])) for faceta, campo in CAMPOS.items()}
+
+
+def chaves_do_livro(livro):
+    return chaves({campo: getattr(livro, campo) for campo in CAMPOS.values()})
+
+
+# ============================================================
+# 🔹 MANUTENÇÃO DAS CONTAGENS
+# ============================================================
+def aplicar(diferencas):
+    """Soma as ``diferencas`` ({(faceta, valor): delta}) às contagens quando a transação atual fizer commit."""
+    diferencas = {chave: delta for chave, delta in diferencas.items() if delta}
+    if diferencas:
+        transaction.on_commit(lambda: _somar(diferencas), robust=True)
+
+
+def _somar(diferencas):
+    with transaction.atomic():
+        for (faceta, valor), delta in diferencas.items():
+            contagens = ContagemFaceta.objects.filter(faceta=faceta, valor=valor)
+            if contagens.update(total=F('total') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    ContagemFaceta.objects.create(faceta=faceta, valor=valor, total=delta)
+            except IntegrityError:
+                # Outra transação criou a linha entre o UPDATE e o INSERT.
+                contagens.update(total=F('total') + delta)
+    cache_unico.invalidar(NAMESPACE_CACHE)
+
+
+def registrar_mudanca(anteriores, atuais):
+    """Aplica a troca de um livro do conjunto de chaves ``anteriores`` para ``atuais``."""
+    diferencas = Counter()
+    for chave in atuais - anteriores:
+        diferencas[chave] += 1
+    for chave in anteriores - atuais:
+        diferencas[chave] -= 1
+    aplicar(diferencas)
+
+
+def ajustar_disponibilidade(liberados=0, presos=0):
+    """Para UPDATEs em lote de ``Livro.status``: quantos passaram a disponível e a indisponível."""
+    aplicar({
+        ('disponivel', '1'): liberados - presos,
+        ('disponivel', '0'): presos - liberados,
+    })
+
+
+def ajustar_autores(autores, delta):
+    """Soma ``delta`` à contagem de cada autor (ids, com repetição)."""
+    diferencas = Counter()
+    for autor_id in autores:
+        diferencas[('autor', str(autor_id))] += delta
+    aplicar(diferencas)
+
+
+def _linhas_autores(autores=None):
+    grupos = Vinculo.objects.order_by()
+    if autores is not None:
+        grupos = grupos.filter(autor_id__in=autores)
+    return [
+        ContagemFaceta(faceta='autor', valor=str(grupo['autor_id']), total=grupo['total'])
+        for grupo in grupos.values('autor_id').annotate(total=Count('id'))
+    ]
+
+
+def recalcular_autores(autores):
+    """Refaz só as contagens dos ``autores`` (ids), depois de uma mescla."""
+    valores = [str(autor_id) for autor_id in autores]
+    with transaction.atomic():
+        ContagemFaceta.objects.filter(faceta='autor', valor__in=valores).delete()
+        ContagemFaceta.objects.bulk_create(_linhas_autores(autores))
+    transaction.on_commit(lambda: cache_unico.invalidar(NAMESPACE_CACHE))
+
+
+def recalcular():
+    """Refaz a tabela inteira a partir de Livro. Devolve quantas linhas gravou."""
+    linhas = _linhas_autores()
+    for faceta, campo in CAMPOS.items():
+        grupos = Livro.objects.order_by().values(campo).annotate(total=Count('id'))
+        linhas.extend(
+            ContagemFaceta(faceta=faceta, valor=_valor(campo, grupo[campo]), total=grupo['total'])
+            for grupo in grupos
+        )
+    with transaction.atomic():
+        ContagemFaceta.objects.all().delete()
+        ContagemFaceta.objects.bulk_create(linhas, batch_size=2000)
+    transaction.on_commit(lambda: cache_unico.invalidar(NAMESPACE_CACHE))
+    analisar_livros()
+    return len(linhas)
+
+
+def analisar_livros():
+    """
+    Atualiza as estatísticas do planejador para core_livro. Sem elas o SQLite
+    escolhe o índice que evita ordenar (categoria, nome) e varre a categoria
+    inteira quando há vários filtros, em vez de usar o índice composto.
+    """
+    tabela = connection.ops.quote_name(Livro._meta.db_table)
+    comando = {'sqlite': 'ANALYZE', 'postgresql': 'ANALYZE', 'mysql': 'ANALYZE TABLE'}.get(connection.vendor)
+    if comando:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{comando} {tabela}')
+
+
+# ============================================================
+# 🔹 LEITURA (CATÁLOGO)
+# ============================================================
+def contagens():
+    """
+    Valores de cada faceta com suas contagens, já prontos para o template:
+    {faceta: [(valor, rótulo, total), ...]}. Autores são limitados aos
+    FACETAS_AUTORES com mais livros.
+    """
+    return cache_unico.obter_local(NAMESPACE_CACHE, 'catalogo', _montar_contagens, settings.FACETAS_CACHE_TIMEOUT, 'facetas')
+
+
+def _montar_contagens():
+    def linhas(faceta, ordem, limite=None):
+        consulta = ContagemFaceta.objects.filter(faceta=faceta, total__gt=0).order_by(*ordem)
+        return list(consulta.values_list('valor', 'total')[:limite])
+
+    categorias = dict(Categoria.objects.values_list('id', 'nome'))
+    mais_frequentes = linhas('autor', ['-total', 'valor'], settings.FACETAS_AUTORES)
+    autores = dict(Autor.objects.filter(id__in=[int(valor) for valor, _ in mais_frequentes]).values_list('id', 'nome'))
+    facetas = {
+        'categoria': sorted(
+            ((valor, categorias.get(int(valor), valor), total) for valor, total in linhas('categoria', ['valor'])),
+            key=lambda item: item[1],
+        ),
+        'autor': [(valor, autores[int(valor)], total) for valor, total in mais_frequentes if int(valor) in autores],
+        'ano': [(valor, valor or 'Sem ano', total) for valor, total in linhas('ano', ['-valor'])],
+        'disponivel': [
+            (valor, dict(Livro.STATUS_CHOICE)[valor == '1'], total) for valor, total in linhas('disponivel', ['-valor'])
+        ],
+    }
+    return facetas
+
+
+def filtros_da_requisicao(parametros):
+    """Lê os filtros válidos da querystring; valores inválidos são ignorados."""
+    filtros = {}
+    for faceta in ('categoria', 'autor', 'ano'):
+        valor = parametros.get(faceta, '')
+        if valor.isdigit():
+            filtros[faceta] = valor
+    if parametros.get('disponivel') in ('0', '1'):
+        filtros['disponivel'] = parametros['disponivel']
+    return filtros
+
+
+def pagina(filtros, depois=None, tamanho=25):
+    """
+    Uma página de livros com os ``filtros`` aplicados, em ordem de nome.
+
+    ``depois`` é o id do último livro da página anterior. Busca ``tamanho + 1``
+    linhas para saber se há próxima página sem contar o resultado. Devolve
+    (livros, id do último livro ou None se esta é a última página).
+    """
+    livros = Livro.objects.select_related('categoria').prefetch_related('autores')
+    for faceta, valor in filtros.items():
+        if faceta == 'autor':
+            livros = livros.filter(autores=valor)
+            continue
+        campo = CAMPOS[faceta]
+        livros = livros.filter(**{campo: valor == '1' if campo == 'status' else valor})
+
+    if depois:
+        ultimo = Livro.objects.filter(pk=depois).values('nome', 'id').first()
+        if ultimo:
+            livros = livros.filter(Q(nome__gt=ultimo['nome']) | Q(nome=ultimo['nome'], id__gt=ultimo['id']))
+
+    resultado = list(livros.order_by('nome', 'id')[:tamanho + 1])
+    proxima = resultado[tamanho - 1].id if len(resultado) > tamanho else None
+    return resultado[:tamanho], proxima
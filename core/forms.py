@@ -163,9 +163,18 @@ class AgendamentoForm(forms.ModelForm):
         model = Agendamento
         fields = ['livro', 'data_retirada']
         widgets = {
-            'livro': forms.Select(attrs={'class': 'form-control'}),
+            # Escolhido pelo campo de busca do template (autocompletar), não por um <select> com todos os livros.
+            'livro': forms.HiddenInput(),
             'data_retirada': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
         }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # O leitor escolhe só o dia da retirada; é ele que vira a data agendada.
+        data_retirada = cleaned_data.get('data_retirada')
+        if data_retirada:
+            self.instance.data_agendada = timezone.localtime(data_retirada).date()
+        return cleaned_data
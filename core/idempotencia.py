@@ -0,0 +1,136 @@
+"""
+Chaves de idempotência para os POSTs de circulação.
+
+O cliente (leitor de código de barras, JavaScript do dashboard) manda um
+cabeçalho ``Idempotency-Key`` por operação e repete a mesma chave nas
+retransmissões. A primeira requisição reserva a chave numa linha de
+RespostaIdempotente e executa a view; as seguintes recebem a resposta
+guardada, sem tocar em livros, empréstimos ou agendamentos. Formulários
+HTML, que não mandam cabeçalhos, usam o campo oculto ``CAMPO``.
+
+A chave vale por leitor, método e rota. A mesma chave com outro corpo é
+recusada (422), e uma repetição que chega enquanto a primeira ainda roda
+recebe 409 com Retry-After. Erros 5xx não são guardados, para que a
+retransmissão tente de novo. As linhas expiram em IDEMPOTENCIA_TTL
+segundos e saem em lotes pelo comando ``limpar_idempotencia``.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from core import metrics
+from core.models import RespostaIdempotente
+
+CABECALHO = 'HTTP_IDEMPOTENCY_KEY'
+CAMPO = 'chave_idempotencia'
+TAMANHO_MAXIMO_CHAVE = 255
+# Uma reserva sem resposta depois disso é de um worker que morreu no meio da view.
+ABANDONO = timedelta(seconds=60)
+
+
+def _sha256(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _reservar(chave, impressao):
+    """Cria a reserva da chave; devolve None se conseguiu ou a linha que já existia."""
+    agora = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                RespostaIdempotente.objects.create(chave=chave, impressao=impressao, expira=agora + ABANDONO)
+            return None
+        except IntegrityError:
+            existente = RespostaIdempotente.objects.filter(chave=chave).first()
+            if existente is not None and existente.expira > agora:
+                return existente
+            # Expirou (ou sumiu na limpeza): descarta e tenta reservar de novo.
+            RespostaIdempotente.objects.filter(chave=chave, expira__lte=agora).delete()
+    return RespostaIdempotente.objects.filter(chave=chave).first()
+
+
+def _guardar(chave, response):
+    if response.status_code >= 500 or response.streaming:
+        RespostaIdempotente.objects.filter(chave=chave).delete()
+        return
+    conteudo = response.content
+    RespostaIdempotente.objects.filter(chave=chave).update(
+        status=response.status_code,
+        tipo=response.get('Content-Type', '')[:100],
+        location=response.get('Location', '')[:500],
+        # Respostas maiores que o limite são repetidas só com status e cabeçalhos.
+        conteudo=conteudo if len(conteudo) <= settings.IDEMPOTENCIA_MAX_BYTES else b'',
+        expira=timezone.now() + timedelta(seconds=settings.IDEMPOTENCIA_TTL),
+    )
+
+
+def _repetir(salva):
+    response = HttpResponse(bytes(salva.conteudo), status=salva.status, content_type=salva.tipo or None)
+    if salva.location:
+        response['Location'] = salva.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotente(view):
+    """
+    Torna a view idempotente para requisições com ``Idempotency-Key``. Sem a
+    chave a view roda normalmente. Aplique por baixo de ``@login_required``.
+    """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return view(request, *args, **kwargs)
+        # O corpo é lido antes de request.POST, que depois o reaproveita.
+        impressao = _sha256(request.body)
+        chave_cliente = request.META.get(CABECALHO) or request.POST.get(CAMPO)
+        if not chave_cliente:
+            return view(request, *args, **kwargs)
+        if len(chave_cliente) > TAMANHO_MAXIMO_CHAVE:
+            return JsonResponse({'error': 'Idempotency-Key muito longa.'}, status=400)
+
+        usuario = request.user.pk if request.user.is_authenticated else ''
+        chave = _sha256(f'{usuario}:{request.method}:{request.path}:{chave_cliente}'.encode())
+        salva = _reservar(chave, impressao)
+        if salva is not None:
+            if salva.impressao != impressao:
+                metrics.registrar_idempotencia('reutilizada')
+                return JsonResponse({'error': 'Idempotency-Key já usada com outro conteúdo.'}, status=422)
+            if salva.status is None:
+                metrics.registrar_idempotencia('em_andamento')
+                response = JsonResponse({'error': 'Esta operação ainda está em processamento.'}, status=409)
+                response['Retry-After'] = '1'
+                return response
+            metrics.registrar_idempotencia('repetida')
+            return _repetir(salva)
+
+        metrics.registrar_idempotencia('nova')
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            RespostaIdempotente.objects.filter(chave=chave).delete()
+            raise
+        _guardar(chave, response)
+        return response
+    return _view
+
+
+def limpar(lote=5000, agora=None, progresso=None):
+    """Apaga as respostas expiradas em lotes e devolve quantas saíram."""
+    agora = agora or timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            RespostaIdempotente.objects.filter(expira__lte=agora).order_by('expira', 'id').values_list('id', flat=True)[:lote]
+        )
+        if ids:
+            total += RespostaIdempotente.objects.filter(id__in=ids).delete()[0]
+            if progresso:
+                progresso(f'{total} resposta(s) removida(s)...')
+        if len(ids) < lote:
+            return total
@@ -0,0 +1,62 @@
+"""
+Travas de instância única.
+
+``trava`` é a dos jobs (cron, --loop): uma linha de Trava no banco, que
+todas as máquinas e processos enxergam. Quem insere a linha primeiro fica
+com ela até sair do bloco ou até ``timeout`` segundos; a restrição de
+unicidade barra os outros, e uma linha vencida (de um processo que morreu
+sem sair do bloco) é tomada por um UPDATE condicional no vencimento.
+
+``trava_cache`` usa ``cache.add`` e vale onde o cache configurado vale:
+entre máquinas com Redis ou Memcached, só dentro do processo com
+LocMemCache. Serve para travas curtas e frequentes que protegem o próprio
+cache (core.cache), onde uma escrita no banco por chave não compensaria.
+"""
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models import Trava
+
+PREFIXO = 'trava:'
+
+
+@contextmanager
+def trava(nome, timeout=600):
+    """
+    Tenta adquirir a trava ``nome`` por até ``timeout`` segundos.
+
+    Entrega True se conseguiu e False se outra instância já a detém. Ao sair,
+    só remove a linha se ela ainda pertencer a esta instância.
+    """
+    dono = uuid.uuid4().hex
+    agora = timezone.now()
+    expira = agora + timedelta(seconds=timeout)
+    try:
+        with transaction.atomic():
+            Trava.objects.create(nome=nome, dono=dono, expira=expira)
+        adquirida = True
+    except IntegrityError:
+        adquirida = bool(Trava.objects.filter(nome=nome, expira__lte=agora).update(dono=dono, expira=expira))
+    try:
+        yield adquirida
+    finally:
+        if adquirida:
+            Trava.objects.filter(nome=nome, dono=dono).delete()
+
+
+@contextmanager
+def trava_cache(nome, timeout=600):
+    """Como ``trava``, guardada no cache do Django (veja a nota do módulo)."""
+    chave = PREFIXO + nome
+    dono = uuid.uuid4().hex
+    adquirida = cache.add(chave, dono, timeout)
+    try:
+        yield adquirida
+    finally:
+        if adquirida and cache.get(chave) == dono:
+            cache.delete(chave)
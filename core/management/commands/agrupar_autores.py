@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import autores
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Vincula a autores os livros que ainda não têm nenhum (cargas em lote) e mescla '
+        'os autores cujos nomes são variações do mesmo (acentos, iniciais, ordem, erros de digitação).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Livros vinculados por INSERT.')
+        parser.add_argument('--sem-mesclar', action='store_true', help='Só vincula, sem mesclar autores existentes.')
+
+    def handle(self, *args, **options):
+        with trava('agrupar_autores', timeout=1800) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está agrupando os autores.'))
+                return
+
+            inicio = time.perf_counter()
+            progresso = self.stdout.write if options['verbosity'] > 1 else None
+            criados, vinculos = autores.importar(lote=options['lote'], progresso=progresso)
+            mesclados = 0 if options['sem_mesclar'] else autores.deduplicar(progresso=progresso)
+            self.stdout.write(self.style.SUCCESS(
+                f'{criados} autor(es) criado(s), {vinculos} vínculo(s), {mesclados} autor(es) mesclado(s) '
+                f'em {time.perf_counter() - inicio:.1f}s.'
+            ))
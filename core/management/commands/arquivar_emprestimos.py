@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import arquivo
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Move os empréstimos finalizados antigos para a tabela de histórico, em lotes. '
+        'Pode ser interrompido e executado de novo sem perda.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.ARQUIVO_EMPRESTIMOS_DIAS,
+                            help='Arquiva empréstimos finalizados devolvidos há mais de N dias.')
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument('--limite', type=int, help='Máximo de empréstimos arquivados nesta execução.')
+
+    def handle(self, *args, **options):
+        with trava('arquivar_emprestimos', timeout=3600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está arquivando empréstimos.'))
+                return
+
+            inicio = time.perf_counter()
+            total = arquivo.arquivar(
+                options['dias'],
+                lote=options['lote'],
+                limite=options['limite'],
+                progresso=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{total} empréstimo(s) arquivado(s) em {time.perf_counter() - inicio:.1f}s.'
+            ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import estatisticas
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Atualiza as estatísticas pré-agregadas de circulação processando só os '
+        'empréstimos modificados desde a última execução. Feito para rodar todo dia pelo cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recalcular', action='store_true',
+                            help='Ignora a marca d\'água e refaz todas as tabelas.')
+
+    def handle(self, *args, **options):
+        with trava('atualizar_estatisticas', timeout=3600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está atualizando as estatísticas.'))
+                return
+
+            inicio = time.perf_counter()
+            resumo = estatisticas.atualizar(recalcular=options['recalcular'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{resumo['dias']} dia(s) e {resumo['meses']} mês(es) recalculados "
+                f"em {time.perf_counter() - inicio:.1f}s."
+            ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import facetas
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula do zero as contagens de facetas do catálogo. Os signals de Livro '
+        'as mantêm em dia; rode depois de cargas que pulam os signals (bulk_create, UPDATE direto).'
+    )
+
+    def handle(self, *args, **options):
+        with trava('atualizar_facetas', timeout=600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está recalculando as facetas.'))
+                return
+
+            inicio = time.perf_counter()
+            total = facetas.recalcular()
+            self.stdout.write(self.style.SUCCESS(
+                f'{total} contagem(ns) de faceta recalculada(s) em {time.perf_counter() - inicio:.1f}s.'
+            ))
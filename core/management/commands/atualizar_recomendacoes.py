@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import recomendacoes
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Atualiza o top-K de recomendações por livro ("quem pegou este também pegou"), '
+        'só para os livros afetados por empréstimos novos desde a última execução.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recalcular', action='store_true', help='Recalcula todos os livros.')
+        parser.add_argument('--top', type=int, help='Recomendações guardadas por livro.')
+        parser.add_argument('--lote', type=int, default=1000, help='Livros de origem gravados por transação.')
+
+    def handle(self, *args, **options):
+        with trava('atualizar_recomendacoes', timeout=3600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está atualizando as recomendações.'))
+                return
+
+            inicio = time.perf_counter()
+            total = recomendacoes.atualizar(
+                recalcular=options['recalcular'],
+                top=options['top'],
+                lote=options['lote'],
+                progresso=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Recomendações de {total} livro(s) recalculadas em {time.perf_counter() - inicio:.1f}s.'
+            ))
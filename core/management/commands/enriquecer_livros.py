@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import bibliografia
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche ISBN, ano de publicação e autor desconhecido dos livros a partir de um dump '
+        'bibliográfico local (ex.: edições do Open Library), indexado antes em disco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dump', help='Arquivo do dump (JSONL ou TSV do Open Library, .gz aceito). '
+                                           'Quando informado, o índice é refeito antes do enriquecimento.')
+        parser.add_argument('--indice', default=settings.BIBLIOGRAFIA_INDICE, help='Arquivo SQLite do índice.')
+        parser.add_argument('--lote', type=int, default=2000, help='Livros consultados e gravados por vez.')
+        parser.add_argument('--simular', action='store_true', help='Só conta o que seria alterado.')
+
+    def handle(self, *args, **options):
+        with trava('enriquecer_livros', timeout=3600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está enriquecendo o catálogo.'))
+                return
+
+            progresso = self.stdout.write if options['verbosity'] > 1 else None
+            inicio = time.perf_counter()
+            if options['dump']:
+                total = bibliografia.construir_indice(options['dump'], options['indice'], progresso=progresso)
+                self.stdout.write(f'{total} edição(ões) indexada(s) em {time.perf_counter() - inicio:.1f}s.')
+
+            try:
+                indice = bibliografia.Indice(options['indice'])
+            except FileNotFoundError as erro:
+                raise CommandError(f'{erro}. Informe --dump para gerá-lo.')
+            try:
+                resultado = bibliografia.enriquecer(
+                    indice, lote=options['lote'], simular=options['simular'], progresso=progresso,
+                )
+            finally:
+                indice.fechar()
+
+            verbo = 'seriam alterado(s)' if options['simular'] else 'alterado(s)'
+            self.stdout.write(self.style.SUCCESS(
+                f"{resultado['alterados']} de {resultado['lidos']} livro(s) {verbo} "
+                f"(ISBN: {resultado['isbn']}, ano: {resultado['ano_publicacao']}, autor: {resultado['autor']}, "
+                f"ISBN já em uso: {resultado['isbn_em_uso']}) em {time.perf_counter() - inicio:.1f}s."
+            ))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import notificacoes
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia lembretes de devolução e avisos de atraso por e-mail. '
+        'Pode ser repetido: avisos já registrados não são reenviados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.LEMBRETE_DIAS_ANTES,
+                            help='Lembra os empréstimos que vencem de hoje até daqui a quantos dias.')
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument('--simular', action='store_true',
+                            help='Só conta os avisos, sem enviar nem registrar.')
+
+    def handle(self, *args, **options):
+        with trava('enviar_lembretes', timeout=3600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está enviando lembretes.'))
+                return
+
+            inicio = time.perf_counter()
+            totais = notificacoes.enviar_lembretes(
+                options['dias'],
+                lote=options['lote'],
+                simular=options['simular'],
+                progresso=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{totais['lembrete']} lembrete(s) e {totais['atraso']} aviso(s) de atraso "
+                f"em {time.perf_counter() - inicio:.1f}s."
+            ))
@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import circulacao, notificacoes
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancela os agendamentos que passaram da data agendada (mais a tolerância), '
+        'libera os livros e enfileira o aviso aos leitores. Rode pelo cron ou com --loop.'
+    )
+
+    NOME_TRAVA = 'expirar_agendamentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tolerancia', type=int, default=settings.AGENDAMENTO_TOLERANCIA_DIAS,
+                            help='Dias após a data agendada antes de expirar.')
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument('--sem-aviso', action='store_true', help='Não envia e-mail aos leitores.')
+        parser.add_argument('--loop', action='store_true', help='Fica rodando e repete a cada --intervalo.')
+        parser.add_argument('--intervalo', type=int, default=3600, help='Segundos entre execuções no modo --loop.')
+        parser.add_argument('--jitter', type=float, default=0.1,
+                            help='Variação aleatória do intervalo, como fração dele.')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.executar(options)
+            return
+
+        while True:
+            self.executar(options)
+            variacao = options['intervalo'] * options['jitter']
+            time.sleep(max(1, options['intervalo'] + random.uniform(-variacao, variacao)))
+
+    def executar(self, options):
+        # A trava vive um pouco mais que o intervalo para cobrir uma execução longa.
+        with trava(self.NOME_TRAVA, timeout=max(options['intervalo'], 600)) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está expirando agendamentos.'))
+                return
+
+            cancelados = circulacao.expirar_agendamentos(options['tolerancia'], lote=options['lote'])
+            if not options['sem_aviso']:
+                for inicio in range(0, len(cancelados), options['lote']):
+                    notificacoes.avisar_agendamentos_expirados.enfileirar(cancelados[inicio:inicio + options['lote']])
+            self.stdout.write(self.style.SUCCESS(f'{len(cancelados)} agendamento(s) expirado(s).'))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Leitor, Livro
+from core.sintetico import GeradorDados
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera livros, categorias, leitores, empréstimos e agendamentos sintéticos '
+        '(popularidade Zipf, sazonalidade e atrasos) para testes de escala.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=20)
+        parser.add_argument('--livros', type=int, default=10000)
+        parser.add_argument('--leitores', type=int, default=2000)
+        parser.add_argument('--emprestimos', type=int, default=100000)
+        parser.add_argument('--agendamentos', type=int, default=5000)
+        parser.add_argument('--taxa-ativos', type=float, default=0.1,
+                            help='Fração do acervo que está emprestada agora.')
+        parser.add_argument('--taxa-atraso', type=float, default=0.15,
+                            help='Fração dos empréstimos atrasados (em andamento ou já devolvidos).')
+        parser.add_argument('--zipf', type=float, default=0.9, help='Expoente de popularidade dos livros.')
+        parser.add_argument('--anos', type=float, default=3, help='Janela de histórico, em anos.')
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--prefixo', default='gd', help='Prefixo dos códigos de livro e e-mails gerados.')
+        parser.add_argument('--senha', default='garoca123', help='Senha de todos os leitores gerados.')
+
+    def handle(self, *args, **options):
+        prefixo = options['prefixo']
+        if (Livro.objects.filter(codigo__startswith=prefixo.upper()).exists()
+                or Leitor.objects.filter(email__startswith=prefixo, email__endswith='@garoca.test').exists()):
+            raise CommandError(f'Já existem dados com o prefixo "{prefixo}". Use outro --prefixo.')
+
+        inicio = time.perf_counter()
+        try:
+            gerador = GeradorDados(
+                categorias=options['categorias'],
+                livros=options['livros'],
+                leitores=options['leitores'],
+                emprestimos=options['emprestimos'],
+                agendamentos=options['agendamentos'],
+                taxa_ativos=options['taxa_ativos'],
+                taxa_atraso=options['taxa_atraso'],
+                expoente_zipf=options['zipf'],
+                anos=options['anos'],
+                lote=options['lote'],
+                semente=options['semente'],
+                prefixo=prefixo,
+                senha=options['senha'],
+                progresso=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        resumo = gerador.executar()
+        resumo.pop('reservados')
+        for chave, valor in resumo.items():
+            self.stdout.write(f'{chave}: {valor}')
+        self.stdout.write(self.style.SUCCESS(f'Dados gerados em {time.perf_counter() - inicio:.1f}s.'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import idempotencia
+from core.locks import trava
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga em lotes as respostas guardadas para Idempotency-Key que já expiraram '
+        '(IDEMPOTENCIA_TTL). Feito para rodar de hora em hora pelo cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with trava('limpar_idempotencia', timeout=3600) as adquirida:
+            if not adquirida:
+                self.stdout.write(self.style.WARNING('Outra instância já está limpando as respostas idempotentes.'))
+                return
+
+            inicio = time.perf_counter()
+            total = idempotencia.limpar(
+                lote=options['lote'],
+                progresso=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{total} resposta(s) expirada(s) removida(s) em {time.perf_counter() - inicio:.1f}s.'
+            ))
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula um banco descartável com um acervo sintético e mede vazão e latência '
+        'dos fluxos principais (cliente de testes e/ou gunicorn local). Saída em JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--livros', type=int, default=2000)
+        parser.add_argument('--leitores', type=int, default=200)
+        parser.add_argument('--emprestimos', type=int, default=5000)
+        parser.add_argument('--iteracoes', type=int, default=200, help='Requisições por fluxo.')
+        parser.add_argument('--iteracoes-login', type=int, default=20,
+                            help='Requisições do fluxo de login (o hash de senha é caro de propósito).')
+        parser.add_argument('--modo', choices=('cliente', 'gunicorn', 'ambos'), default='cliente')
+        parser.add_argument('--fluxos', nargs='+', choices=list(benchmark.FLUXOS), default=list(benchmark.FLUXOS))
+        parser.add_argument('--workers', type=int, default=4, help='Workers do gunicorn.')
+        parser.add_argument('--concorrencia', type=int, default=4, help='Clientes simultâneos contra o gunicorn.')
+        parser.add_argument('--saida', help='Arquivo JSON de saída (padrão: stdout).')
+
+    def handle(self, *args, **options):
+        modos = ['cliente', 'gunicorn'] if options['modo'] == 'ambos' else [options['modo']]
+        try:
+            relatorio = benchmark.executar(
+                livros=options['livros'],
+                leitores=options['leitores'],
+                emprestimos=options['emprestimos'],
+                iteracoes=options['iteracoes'],
+                iteracoes_login=options['iteracoes_login'],
+                modos=modos,
+                fluxos=options['fluxos'],
+                workers=options['workers'],
+                concorrencia=options['concorrencia'],
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+            self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {options['saida']}"))
+        else:
+            self.stdout.write(saida)
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede leituras e escritas simultâneas de vários processos num arquivo SQLite, '
+        'com o perfil padrão e com o perfil de produção (SQLITE_OTIMIZADO). Saída em JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--livros', type=int, default=5000)
+        parser.add_argument('--leitores', type=int, default=200)
+        parser.add_argument('--emprestimos', type=int, default=5000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[4, 8], help='Processos simultâneos por rodada.')
+        parser.add_argument('--duracao', type=float, default=10, help='Segundos de carga por rodada.')
+        parser.add_argument('--escrita', type=float, default=0.2, help='Fração das operações que escrevem.')
+        parser.add_argument('--saida', help='Arquivo JSON de saída (padrão: stdout).')
+
+    def handle(self, *args, **options):
+        try:
+            relatorio = benchmark.medir_sqlite(
+                livros=options['livros'],
+                leitores=options['leitores'],
+                emprestimos=options['emprestimos'],
+                workers=options['workers'],
+                duracao=options['duracao'],
+                escrita=options['escrita'],
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+            self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {options['saida']}"))
+        else:
+            self.stdout.write(saida)
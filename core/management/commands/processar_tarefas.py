@@ -0,0 +1,81 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import tarefas
+
+
+def _executar_processo(filas, threads, lote, intervalo, uma_vez):
+    """Ponto de entrada de cada processo filho: roda ``threads`` workers até receber SIGTERM."""
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+    signal.signal(signal.SIGINT, lambda *_: parar.set())
+    _executar_threads(filas, threads, lote, intervalo, uma_vez, parar)
+
+
+def _executar_threads(filas, threads, lote, intervalo, uma_vez, parar):
+    trabalhadores = [
+        threading.Thread(target=tarefas.trabalhar, args=(filas, parar, lote, intervalo, uma_vez), daemon=True)
+        for _ in range(threads)
+    ]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for trabalhador in trabalhadores:
+        while trabalhador.is_alive():
+            trabalhador.join(timeout=1)
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas enfileiradas em core.tarefas, com processos e threads configuráveis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', default='padrao', help='Filas atendidas, separadas por vírgula.')
+        parser.add_argument('--processos', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=1, help='Threads por processo.')
+        parser.add_argument('--lote', type=int, default=10, help='Tarefas reservadas por vez em cada thread.')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera quando a fila está vazia.')
+        parser.add_argument('--uma-vez', action='store_true', help='Esvazia a fila e termina.')
+
+    def handle(self, *args, **options):
+        tarefas.carregar_tarefas()
+        filas = [fila.strip() for fila in options['filas'].split(',') if fila.strip()]
+        recuperadas = tarefas.obter_broker().recuperar_abandonadas(settings.TAREFAS_TIMEOUT)
+        if recuperadas:
+            self.stdout.write(self.style.WARNING(f'{recuperadas} tarefa(s) abandonada(s) devolvida(s) à fila.'))
+
+        parametros = (filas, options['threads'], options['lote'], options['intervalo'], options['uma_vez'])
+        self.stdout.write(
+            f"Atendendo {', '.join(filas)} com {options['processos']} processo(s) x {options['threads']} thread(s)."
+        )
+
+        if options['processos'] <= 1:
+            parar = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: parar.set())
+            try:
+                _executar_threads(*parametros, parar)
+            except KeyboardInterrupt:
+                parar.set()
+            return
+
+        # Conexões abertas não podem ser herdadas pelos filhos.
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        processos = [
+            contexto.Process(target=_executar_processo, args=parametros, daemon=False)
+            for _ in range(options['processos'])
+        ]
+        for processo in processos:
+            processo.start()
+        try:
+            for processo in processos:
+                processo.join()
+        except KeyboardInterrupt:
+            for processo in processos:
+                processo.terminate()
+            for processo in processos:
+                processo.join()
@@ -0,0 +1,41 @@
+import json
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import monitor_sql
+
+
+class Command(BaseCommand):
+    help = 'Mostra as consultas SQL mais custosas agrupadas por impressão digital.'
+
+    ORDENACOES = ('tempo_total', 'p95', 'p99', 'p50', 'chamadas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Quantidade de consultas exibidas.')
+        parser.add_argument('--ordem', choices=self.ORDENACOES, default='tempo_total')
+        parser.add_argument('--diretorio', default=settings.SQL_MONITOR_DIR)
+        parser.add_argument('--json', action='store_true', help='Imprime o relatório em JSON.')
+        parser.add_argument('--limpar', action='store_true', help='Apaga as estatísticas após o relatório.')
+
+    def handle(self, *args, **options):
+        linhas = monitor_sql.resumir(monitor_sql.carregar_estatisticas(options['diretorio']))
+        linhas.sort(key=lambda linha: linha[options['ordem']], reverse=True)
+        linhas = linhas[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(linhas, indent=2, ensure_ascii=False))
+        elif not linhas:
+            self.stdout.write(self.style.WARNING('Nenhuma estatística encontrada.'))
+        else:
+            for linha in linhas:
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"[{linha['impressao']}] chamadas={linha['chamadas']} "
+                    f"total={linha['tempo_total']:.1f}ms p50={linha['p50']:.2f}ms "
+                    f"p95={linha['p95']:.2f}ms p99={linha['p99']:.2f}ms"
+                ))
+                self.stdout.write(f"    {linha['sql'][:500]}")
+
+        if options['limpar']:
+            shutil.rmtree(options['diretorio'], ignore_errors=True)
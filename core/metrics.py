@@ -0,0 +1,249 @@
+"""
+Métricas no formato Prometheus.
+
+Com vários workers do gunicorn, defina PROMETHEUS_MULTIPROC_DIR apontando para
+um diretório vazio e gravável antes de iniciar o servidor: cada processo grava
+seus contadores em arquivos mmap e o endpoint /metrics agrega todos eles
+(veja gunicorn.conf.py).
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+CHAVE_INDICADORES = 'metricas:indicadores_circulacao'
+
+# ============================================================
+# 🔹 MÉTRICAS DE PROCESSO (HTTP, BANCO E CACHE)
+# ============================================================
+LATENCIA_REQUISICOES = Histogram(
+    'garoca_http_request_duration_seconds',
+    'Latência das requisições HTTP por nome de rota.',
+    ['rota', 'metodo'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUISICOES = Counter(
+    'garoca_http_requests_total',
+    'Requisições HTTP atendidas por rota e código de status.',
+    ['rota', 'metodo', 'status'],
+)
+CONSULTAS_SQL = Counter(
+    'garoca_db_queries_total',
+    'Consultas SQL executadas durante as requisições, por rota.',
+    ['rota'],
+)
+CONSULTAS_POR_REQUISICAO = Histogram(
+    'garoca_db_queries_per_request',
+    'Quantidade de consultas SQL por requisição.',
+    ['rota'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250),
+)
+CONSULTAS_CACHE = Counter(
+    'garoca_cache_requests_total',
+    'Consultas ao cache por nome lógico e resultado (hit/miss).',
+    ['cache', 'resultado'],
+)
+CONSULTAS_CACHE_LOCAL = Counter(
+    'garoca_cache_local_requests_total',
+    'Consultas ao primeiro nível (LRU do processo, core/cache.py) por resultado; '
+    'as faltas seguem para o cache compartilhado, contado em garoca_cache_requests_total.',
+    ['cache', 'resultado'],
+)
+CACHE_LOCAL_BYTES = Gauge(
+    'garoca_cache_local_bytes',
+    'Bytes (em pickle) guardados no LRU local, somados entre os workers vivos.',
+    multiprocess_mode='livesum',
+)
+CACHE_LOCAL_ITENS = Gauge(
+    'garoca_cache_local_items',
+    'Entradas no LRU local, somadas entre os workers vivos.',
+    multiprocess_mode='livesum',
+)
+CACHE_COALESCIDAS = Counter(
+    'garoca_cache_coalesced_total',
+    'Leituras que não recalcularam porque outro processo já recalculava (core/cache.py): '
+    'obsoleto = serviu o valor antigo, espera = esperou o novo.',
+    ['cache', 'tipo'],
+)
+CACHE_RECALCULOS = Counter(
+    'garoca_cache_recomputations_total',
+    'Recálculos de valores do cache por motivo (ausente, vencido, antecipado, espera_esgotada).',
+    ['cache', 'motivo'],
+)
+CACHE_DURACAO_RECALCULO = Histogram(
+    'garoca_cache_recompute_seconds',
+    'Tempo para recalcular um valor do cache.',
+    ['cache'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_ESPERA = Histogram(
+    'garoca_db_pool_wait_seconds',
+    'Tempo esperando uma conexão do pool (core/backends/pool.py).',
+    ['banco'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_CONEXOES = Gauge(
+    'garoca_db_pool_connections',
+    'Conexões do pool por estado (em_uso, livres); saturação = em_uso / garoca_db_pool_max_connections.',
+    ['banco', 'estado'],
+    multiprocess_mode='livesum',
+)
+POOL_MAXIMO = Gauge(
+    'garoca_db_pool_max_connections',
+    'Tamanho máximo do pool somado entre os workers vivos.',
+    ['banco'],
+    multiprocess_mode='livesum',
+)
+POOL_ESGOTADO = Counter(
+    'garoca_db_pool_timeouts_total',
+    'Pedidos de conexão que desistiram com o pool cheio.',
+    ['banco'],
+)
+IDEMPOTENCIA = Counter(
+    'garoca_idempotency_requests_total',
+    'Requisições com Idempotency-Key por resultado (nova, repetida, em_andamento, reutilizada).',
+    ['resultado'],
+)
+ADMISSAO_EM_ANDAMENTO = Gauge(
+    'garoca_admission_in_flight',
+    'Requisições admitidas em andamento (core/admissao.py), somadas entre os workers vivos.',
+    multiprocess_mode='livesum',
+)
+ADMISSAO_ESPERA = Histogram(
+    'garoca_admission_wait_seconds',
+    'Tempo esperando vaga antes de a requisição ser admitida, por prioridade.',
+    ['prioridade'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+ADMISSAO_REJEITADAS = Counter(
+    'garoca_admission_rejected_total',
+    'Requisições recusadas com 503 por falta de vaga, por rota e prioridade.',
+    ['rota', 'prioridade'],
+)
+INICIO_WORKER = Gauge(
+    'garoca_worker_start_time_seconds',
+    'Instante (epoch) em que o worker começou a atender; uptime = time() - valor.',
+    multiprocess_mode='liveall',
+)
+
+_pid_marcado = None
+
+
+def marcar_inicio_worker():
+    """Registra o início do worker atual uma única vez por processo."""
+    global _pid_marcado
+    pid = os.getpid()
+    if _pid_marcado != pid:
+        _pid_marcado = pid
+        INICIO_WORKER.set(time.time())
+
+
+def registrar_cache(nome, acerto):
+    """Contabiliza um hit ou miss do cache lógico ``nome``."""
+    CONSULTAS_CACHE.labels(nome, 'hit' if acerto else 'miss').inc()
+
+
+def registrar_nivel_local(nome, acerto):
+    CONSULTAS_CACHE_LOCAL.labels(nome, 'hit' if acerto else 'miss').inc()
+
+
+def registrar_cache_local(tamanho, itens):
+    CACHE_LOCAL_BYTES.set(tamanho)
+    CACHE_LOCAL_ITENS.set(itens)
+
+
+def registrar_coalescida(nome, tipo):
+    CACHE_COALESCIDAS.labels(nome, tipo).inc()
+
+
+def registrar_recalculo(nome, motivo, duracao):
+    CACHE_RECALCULOS.labels(nome, motivo).inc()
+    CACHE_DURACAO_RECALCULO.labels(nome).observe(duracao)
+
+
+def registrar_admissao(em_andamento):
+    ADMISSAO_EM_ANDAMENTO.set(em_andamento)
+
+
+def registrar_espera_admissao(prioridade, espera):
+    ADMISSAO_ESPERA.labels(prioridade).observe(espera)
+
+
+def registrar_rejeicao(rota, prioridade):
+    ADMISSAO_REJEITADAS.labels(rota, prioridade).inc()
+
+
+def registrar_idempotencia(resultado):
+    IDEMPOTENCIA.labels(resultado).inc()
+
+
+# ============================================================
+# 🔹 INDICADORES DE CIRCULAÇÃO (AGREGADOS EM CACHE)
+# ============================================================
+def indicadores_circulacao():
+    """
+    Retorna os indicadores do acervo a partir do cache.
+
+    As contagens são recalculadas no máximo uma vez a cada
+    METRICS_CACHE_TIMEOUT segundos, nunca a cada coleta do Prometheus. Os
+    livros disponíveis vêm da faceta 'disponivel' (core/facetas.py), mantida
+    a cada empréstimo e devolução; só empréstimos e agendamentos em aberto
+    são contados na hora, pelos índices de status.
+    """
+    from core import cache as cache_unico
+    from core.models import Agendamento, ContagemFaceta, Emprestimo
+
+    def calcular():
+        hoje = timezone.localdate()
+        dados = {
+            'livros_disponiveis': ContagemFaceta.objects.filter(faceta='disponivel', valor='1')
+            .values_list('total', flat=True).first() or 0,
+        }
+        dados.update(Emprestimo.objects.filter(status='in_progress').aggregate(
+            emprestimos_ativos=Count('id'),
+            emprestimos_atrasados=Count('id', filter=Q(devolucao__lt=hoje)),
+        ))
+        dados.update(Agendamento.objects.filter(status='scheduled').aggregate(
+            agendamentos_ativos=Count('id'),
+        ))
+        return dados
+
+    return cache_unico.obter(CHAVE_INDICADORES, calcular, settings.METRICS_CACHE_TIMEOUT, 'indicadores')
+
+
+class ColetorCirculacao:
+    """Expõe os indicadores de circulação como gauges do Prometheus."""
+
+    DESCRICOES = {
+        'livros_disponiveis': 'Livros disponíveis para empréstimo (contagem da faceta do catálogo).',
+        'emprestimos_ativos': 'Empréstimos em andamento.',
+        'emprestimos_atrasados': 'Empréstimos em andamento com devolução vencida.',
+        'agendamentos_ativos': 'Agendamentos de retirada pendentes.',
+    }
+
+    def collect(self):
+        dados = indicadores_circulacao()
+        for nome, descricao in self.DESCRICOES.items():
+            yield GaugeMetricFamily(f'garoca_{nome}', descricao, value=dados.get(nome, 0))
+
+
+_REGISTRO_DOMINIO = CollectorRegistry()
+_REGISTRO_DOMINIO.register(ColetorCirculacao())
+
+
+def gerar_metricas():
+    """Serializa todas as métricas no formato texto do Prometheus."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro) + generate_latest(_REGISTRO_DOMINIO)
@@ -0,0 +1,148 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+
+from core import admissao, metrics, monitor_sql, replicas
+
+
+class ContadorConsultas:
+    """execute_wrapper que apenas conta as consultas SQL executadas."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def nome_da_rota(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'nao_encontrada'
+    return match.view_name or 'sem_nome'
+
+
+# ============================================================
+# 🔹 MÉTRICAS DE REQUISIÇÃO
+# ============================================================
+class MetricasMiddleware:
+    """
+    Mede latência, status e número de consultas SQL de cada requisição,
+    agrupando pelo nome da rota (e não pela URL, para manter a cardinalidade baixa).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.marcar_inicio_worker()
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        conexoes = connections.all()
+        for conexao in conexoes:
+            conexao.execute_wrappers.append(contador)
+        try:
+            response = self.get_response(request)
+        finally:
+            # Remove pela identidade, não pela posição: uma conexão aberta no meio
+            # da requisição recebe o monitor de SQL depois do contador.
+            for conexao in conexoes:
+                conexao.execute_wrappers[:] = [w for w in conexao.execute_wrappers if w is not contador]
+        duracao = time.perf_counter() - inicio
+
+        rota = nome_da_rota(request)
+        metrics.LATENCIA_REQUISICOES.labels(rota, request.method).observe(duracao)
+        metrics.REQUISICOES.labels(rota, request.method, response.status_code).inc()
+        metrics.CONSULTAS_SQL.labels(rota).inc(contador.total)
+        metrics.CONSULTAS_POR_REQUISICAO.labels(rota).observe(contador.total)
+        return response
+
+
+# ============================================================
+# 🔹 CONTROLE DE ADMISSÃO (CARGA ALTA)
+# ============================================================
+class AdmissaoMiddleware:
+    """
+    Recusa com 503 e Retry-After as requisições que não acham vaga para a
+    prioridade da sua rota (veja core/admissao.py). Fica antes da sessão e da
+    autenticação, para que uma requisição recusada não chegue a ir ao banco.
+    """
+
+    def __init__(self, get_response):
+        if not admissao.ativa():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            match = None
+        rota = match.view_name if match else None
+        prioridade = admissao.prioridade(rota)
+        if not admissao.entrar(prioridade):
+            request.resolver_match = match
+            metrics.registrar_rejeicao(rota or 'nao_encontrada', prioridade)
+            return self._recusar(rota)
+        try:
+            return self.get_response(request)
+        finally:
+            admissao.sair()
+
+    def _recusar(self, rota):
+        mensagem = 'O sistema está sobrecarregado. Tente novamente em alguns segundos.'
+        if rota and rota.startswith('api_'):
+            response = JsonResponse({'error': mensagem}, status=503)
+        else:
+            response = HttpResponse(mensagem, status=503, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(settings.ADMISSAO_RETRY_AFTER)
+        return response
+
+
+# ============================================================
+# 🔹 VIEW ATUAL PARA O LOG DE CONSULTAS LENTAS
+# ============================================================
+class MonitorSQLMiddleware:
+    """Informa ao monitor de SQL qual view está executando as consultas."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = monitor_sql.VIEW_ATUAL.set(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            monitor_sql.VIEW_ATUAL.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        monitor_sql.VIEW_ATUAL.set(nome_da_rota(request))
+
+
+# ============================================================
+# 🔹 LEITURA DO PRIMÁRIO DEPOIS DE UMA ESCRITA
+# ============================================================
+class FixarPrimarioMiddleware:
+    """
+    Depois de uma escrita bem-sucedida, grava o cookie que faz as views com
+    ``@usar_replica`` lerem do primário por REPLICA_JANELA_PRIMARIO segundos
+    (veja core/replicas.py). Sem réplicas configuradas não faz nada.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in replicas.METODOS_SEGUROS and response.status_code < 400 and replicas.replicas():
+            janela = settings.REPLICA_JANELA_PRIMARIO
+            response.set_cookie(
+                replicas.COOKIE_PRIMARIO, str(time.time() + janela), max_age=janela,
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
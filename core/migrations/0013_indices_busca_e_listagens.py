@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-19 00:57
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_alter_agendamento_data_agendada_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['data_agendada', 'id'], name='agendamento_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['issue_date', 'id'], name='emprestimo_issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leitor',
+            index=models.Index(django.db.models.functions.text.Upper('nome'), name='leitor_nome_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(django.db.models.functions.text.Upper('nome'), name='livro_nome_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(django.db.models.functions.text.Upper('autor'), name='livro_autor_upper_idx'),
+        ),
+    ]
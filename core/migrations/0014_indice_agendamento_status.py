@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_indices_busca_e_listagens'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['status', 'data_agendada'], name='agendamento_status_data_idx'),
+        ),
+    ]
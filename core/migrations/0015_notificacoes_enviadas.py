@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_indice_agendamento_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoEnviada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+                ('ativo', models.BooleanField(default=True, verbose_name='Ativo?')),
+                ('tipo', models.CharField(choices=[('lembrete', 'Lembrete de devolução'), ('atraso', 'Aviso de atraso')], max_length=20, verbose_name='Tipo')),
+                ('referencia', models.DateField(verbose_name='Data de devolução avisada')),
+            ],
+            options={
+                'verbose_name': 'Notificação Enviada',
+                'verbose_name_plural': 'Notificações Enviadas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['status', 'devolucao', 'id'], name='emprestimo_status_devol_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificacaoenviada',
+            name='emprestimo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes', to='core.emprestimo'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificacaoenviada',
+            constraint=models.UniqueConstraint(fields=('emprestimo', 'tipo', 'referencia'), name='notificacao_unica'),
+        ),
+    ]
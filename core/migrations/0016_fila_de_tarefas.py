@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:09
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_notificacoes_enviadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+                ('ativo', models.BooleanField(default=True, verbose_name='Ativo?')),
+                ('nome', models.CharField(max_length=200, verbose_name='Nome')),
+                ('fila', models.CharField(default='padrao', max_length=50, verbose_name='Fila')),
+                ('argumentos', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Argumentos')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('executar_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar em')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.PositiveIntegerField(default=3, verbose_name='Máximo de tentativas')),
+                ('reservada_em', models.DateTimeField(blank=True, null=True, verbose_name='Reservada em')),
+                ('reservada_por', models.CharField(blank=True, max_length=100, verbose_name='Reservada por')),
+                ('ultimo_erro', models.TextField(blank=True, verbose_name='Último erro')),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'indexes': [models.Index(fields=['status', 'fila', 'executar_em', 'id'], name='tarefa_fila_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_fila_de_tarefas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Dia')),
+                ('emprestimos', models.PositiveIntegerField(default=0, verbose_name='Empréstimos')),
+                ('devolucoes', models.PositiveIntegerField(default=0, verbose_name='Devoluções')),
+                ('devolucoes_atrasadas', models.PositiveIntegerField(default=0, verbose_name='Devoluções atrasadas')),
+                ('dias_emprestado', models.PositiveIntegerField(default=0, verbose_name='Soma dos dias emprestado')),
+            ],
+            options={
+                'verbose_name': 'Estatística Diária',
+                'verbose_name_plural': 'Estatísticas Diárias',
+            },
+        ),
+        migrations.CreateModel(
+            name='EstatisticaLivroMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mês')),
+                ('emprestimos', models.PositiveIntegerField(default=0, verbose_name='Empréstimos')),
+            ],
+            options={
+                'verbose_name': 'Estatística Mensal de Livro',
+                'verbose_name_plural': 'Estatísticas Mensais de Livros',
+            },
+        ),
+        migrations.CreateModel(
+            name='EstatisticaMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(unique=True, verbose_name='Mês')),
+                ('emprestimos', models.PositiveIntegerField(default=0, verbose_name='Empréstimos')),
+                ('leitores_ativos', models.PositiveIntegerField(default=0, verbose_name='Leitores ativos')),
+                ('devolucoes', models.PositiveIntegerField(default=0, verbose_name='Devoluções')),
+                ('devolucoes_atrasadas', models.PositiveIntegerField(default=0, verbose_name='Devoluções atrasadas')),
+                ('dias_emprestado', models.PositiveIntegerField(default=0, verbose_name='Soma dos dias emprestado')),
+            ],
+            options={
+                'verbose_name': 'Estatística Mensal',
+                'verbose_name_plural': 'Estatísticas Mensais',
+            },
+        ),
+        migrations.CreateModel(
+            name='MarcaProcessamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50, unique=True, verbose_name='Nome')),
+                ('valor', models.DateTimeField(verbose_name='Processado até')),
+            ],
+            options={
+                'verbose_name': 'Marca de Processamento',
+                'verbose_name_plural': 'Marcas de Processamento',
+            },
+        ),
+        migrations.AddField(
+            model_name='emprestimo',
+            name='data_devolvida',
+            field=models.DateField(blank=True, null=True, verbose_name='Devolvido em'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['modificado'], name='emprestimo_modificado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['data_devolvida'], name='emprestimo_devolvido_idx'),
+        ),
+        migrations.AddField(
+            model_name='estatisticalivromensal',
+            name='livro',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.livro'),
+        ),
+        migrations.AddField(
+            model_name='estatisticadiaria',
+            name='categoria',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.categoria'),
+        ),
+        migrations.AddIndex(
+            model_name='estatisticalivromensal',
+            index=models.Index(fields=['mes', '-emprestimos'], name='estatistica_livro_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='estatisticalivromensal',
+            constraint=models.UniqueConstraint(fields=('mes', 'livro'), name='estatistica_livro_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='estatisticadiaria',
+            constraint=models.UniqueConstraint(fields=('dia', 'categoria'), name='estatistica_diaria_unica'),
+        ),
+    ]
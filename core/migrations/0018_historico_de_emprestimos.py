@@ -0,0 +1,56 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_estatisticas_pre_agregadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmprestimoHistorico',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('issue_date', models.DateField(verbose_name='Data de Empréstimo')),
+                ('devolucao', models.DateField(blank=True, null=True, verbose_name='Data de Devolução')),
+                ('data_devolvida', models.DateField(blank=True, null=True, verbose_name='Devolvido em')),
+                ('criado', models.DateTimeField(verbose_name='Data de Criação')),
+                ('arquivado', models.DateTimeField(auto_now_add=True, verbose_name='Arquivado em')),
+            ],
+            options={
+                'verbose_name': 'Empréstimo Arquivado',
+                'verbose_name_plural': 'Empréstimos Arquivados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['status', 'issue_date', 'id'], name='emprestimo_status_issue_idx'),
+        ),
+        migrations.AddField(
+            model_name='emprestimohistorico',
+            name='leitor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='emprestimohistorico',
+            name='livro',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.livro'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimohistorico',
+            index=models.Index(fields=['leitor', 'criado'], name='historico_leitor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimohistorico',
+            index=models.Index(fields=['issue_date'], name='historico_issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimohistorico',
+            index=models.Index(fields=['data_devolvida'], name='historico_devolvido_idx'),
+        ),
+    ]
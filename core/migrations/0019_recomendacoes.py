@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_historico_de_emprestimos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recomendacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveSmallIntegerField(verbose_name='Posição')),
+                ('leitores', models.PositiveIntegerField(verbose_name='Leitores em comum')),
+                ('pontuacao', models.FloatField(verbose_name='Pontuação')),
+                ('livro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendacoes', to='core.livro')),
+                ('recomendado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.livro')),
+            ],
+            options={
+                'verbose_name': 'Recomendação',
+                'verbose_name_plural': 'Recomendações',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recomendacao',
+            constraint=models.UniqueConstraint(fields=('livro', 'posicao'), name='recomendacao_posicao_unica'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.16 on 2026-10-19 01:45
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def contar_facetas(apps, schema_editor):
+    """Preenche as contagens a partir dos livros já cadastrados."""
+    Livro = apps.get_model('core', 'Livro')
+    ContagemFaceta = apps.get_model('core', 'ContagemFaceta')
+    campos = {'categoria': 'categoria_id', 'autor': 'autor', 'ano': 'ano_publicacao', 'disponivel': 'status'}
+    linhas = []
+    for faceta, campo in campos.items():
+        for grupo in Livro.objects.order_by().values(campo).annotate(total=Count('id')):
+            valor = grupo[campo]
+            if campo == 'status':
+                valor = '1' if valor else '0'
+            linhas.append(ContagemFaceta(faceta=faceta, valor='' if valor is None else str(valor), total=grupo['total']))
+    ContagemFaceta.objects.bulk_create(linhas, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_recomendacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('faceta', models.CharField(choices=[('categoria', 'Categoria'), ('autor', 'Autor'), ('ano', 'Ano de Publicação'), ('disponivel', 'Disponibilidade')], max_length=20, verbose_name='Faceta')),
+                ('valor', models.CharField(max_length=100, verbose_name='Valor')),
+                ('total', models.IntegerField(default=0, verbose_name='Livros')),
+            ],
+            options={
+                'verbose_name': 'Contagem de Faceta',
+                'verbose_name_plural': 'Contagens de Facetas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['nome', 'id'], name='livro_nome_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['categoria', 'nome', 'id'], name='livro_categoria_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['categoria', 'ano_publicacao', 'status', 'nome', 'id'], name='livro_cat_ano_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['autor', 'nome', 'id'], name='livro_autor_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['ano_publicacao', 'nome', 'id'], name='livro_ano_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livro',
+            index=models.Index(fields=['status', 'nome', 'id'], name='livro_status_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contagemfaceta',
+            index=models.Index(fields=['faceta', '-total'], name='contagem_faceta_total_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='contagemfaceta',
+            constraint=models.UniqueConstraint(fields=('faceta', 'valor'), name='contagem_faceta_unica'),
+        ),
+        migrations.RunPython(contar_facetas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.16 on 2026-10-19 02:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db.models import Count
+
+from core import autores
+
+
+def importar_autores(apps, schema_editor):
+    """
+    Agrupa os nomes de ``Livro.autor`` já cadastrados em autores e vincula os
+    livros; a faceta 'autor' passa a contar por id de Autor.
+    """
+    Livro = apps.get_model('core', 'Livro')
+    Autor = apps.get_model('core', 'Autor')
+    VarianteAutor = apps.get_model('core', 'VarianteAutor')
+    ContagemFaceta = apps.get_model('core', 'ContagemFaceta')
+    autores.importar((Livro, Autor, VarianteAutor))
+
+    Vinculo = Livro._meta.get_field('autores').remote_field.through
+    ContagemFaceta.objects.filter(faceta='autor').delete()
+    ContagemFaceta.objects.bulk_create(
+        [
+            ContagemFaceta(faceta='autor', valor=str(grupo['autor_id']), total=grupo['total'])
+            for grupo in Vinculo.objects.order_by().values('autor_id').annotate(total=Count('id'))
+        ],
+        batch_size=2000,
+    )
+
+
+def contar_autores_por_texto(apps, schema_editor):
+    """Volta a faceta 'autor' para o texto de ``Livro.autor``."""
+    Livro = apps.get_model('core', 'Livro')
+    ContagemFaceta = apps.get_model('core', 'ContagemFaceta')
+    ContagemFaceta.objects.filter(faceta='autor').delete()
+    ContagemFaceta.objects.bulk_create(
+        [
+            ContagemFaceta(faceta='autor', valor=grupo['autor'], total=grupo['total'])
+            for grupo in Livro.objects.order_by().values('autor').annotate(total=Count('id'))
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_facetas_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Autor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+                ('ativo', models.BooleanField(default=True, verbose_name='Ativo?')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+            ],
+            options={
+                'verbose_name': 'Autor',
+                'verbose_name_plural': 'Autores',
+            },
+        ),
+        migrations.CreateModel(
+            name='VarianteAutor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=150, unique=True, verbose_name='Chave')),
+            ],
+            options={
+                'verbose_name': 'Variante de Autor',
+                'verbose_name_plural': 'Variantes de Autores',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='livro',
+            name='livro_autor_nome_idx',
+        ),
+        migrations.AddField(
+            model_name='varianteautor',
+            name='autor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variantes', to='core.autor'),
+        ),
+        migrations.AddIndex(
+            model_name='autor',
+            index=models.Index(django.db.models.functions.text.Upper('nome'), name='autor_nome_upper_idx'),
+        ),
+        migrations.AddField(
+            model_name='livro',
+            name='autores',
+            field=models.ManyToManyField(blank=True, related_name='livros', to='core.autor', verbose_name='Autores'),
+        ),
+        migrations.RunPython(importar_autores, contar_autores_por_texto),
+    ]
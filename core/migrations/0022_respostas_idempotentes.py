@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-19 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_autores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RespostaIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True, verbose_name='Chave')),
+                ('impressao', models.CharField(max_length=64, verbose_name='Impressão do corpo')),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Status HTTP')),
+                ('tipo', models.CharField(blank=True, max_length=100, verbose_name='Content-Type')),
+                ('location', models.CharField(blank=True, max_length=500, verbose_name='Location')),
+                ('conteudo', models.BinaryField(blank=True, default=b'', verbose_name='Conteúdo')),
+                ('expira', models.DateTimeField(verbose_name='Expira em')),
+            ],
+            options={
+                'verbose_name': 'Resposta Idempotente',
+                'verbose_name_plural': 'Respostas Idempotentes',
+                'indexes': [models.Index(fields=['expira', 'id'], name='idempotencia_expira_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-19 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_respostas_idempotentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trava',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=200, unique=True, verbose_name='Nome')),
+                ('dono', models.CharField(max_length=32, verbose_name='Dono')),
+                ('expira', models.DateTimeField(verbose_name='Expira em')),
+            ],
+            options={
+                'verbose_name': 'Trava',
+                'verbose_name_plural': 'Travas',
+            },
+        ),
+    ]
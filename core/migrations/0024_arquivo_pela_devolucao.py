@@ -0,0 +1,21 @@
+# Generated by Django 4.2.16 on 2026-10-19 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_travas'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emprestimo',
+            name='emprestimo_status_issue_idx',
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['status', 'data_devolvida', 'id'], name='emprestimo_status_devol_id_idx'),
+        ),
+    ]
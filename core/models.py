@@ -1,6 +1,11 @@
-from django.db import models
+import copy
+
+from django.db import DatabaseError, models
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import date
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from decimal import Decimal
@@ -9,6 +14,13 @@ from decimal import Decimal
 # 🔹 CLASSE BASE (GENÉRICA)
 # ============================================================
 class Base(models.Model):
+    """
+    Guarda os valores lidos do banco (``from_db``) para saber o que mudou.
+    Num objeto já salvo, ``save()`` sem ``update_fields`` grava só as colunas
+    alteradas ou atribuídas desde a leitura (mais ``modificado``) e não vai ao
+    banco se nenhuma foi. Um campo atribuído é gravado mesmo com o valor que
+    foi lido: outra transação pode tê-lo mudado no banco nesse meio tempo.
+    """
     criado = models.DateTimeField('Data de Criação', auto_now_add=True)
     modificado = models.DateTimeField('Data de Atualização', auto_now=True)
     ativo = models.BooleanField('Ativo?', default=True)
@@ -16,6 +28,106 @@ class Base(models.Model):
     class Meta:
         abstract = True
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._originais = {campo: _copiar(valor) for campo, valor in zip(field_names, values)}
+        instancia._atribuidos = set()
+        return instancia
+
+    def __setattr__(self, nome, valor):
+        atribuidos = self.__dict__.get('_atribuidos')
+        if atribuidos is not None:
+            atribuidos.add(nome)
+        super().__setattr__(nome, valor)
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._registrar_originais(fields)
+
+    def campos_alterados(self):
+        """attnames dos campos carregados que mudaram desde a leitura; num objeto novo, todos."""
+        originais = getattr(self, '_originais', None)
+        if originais is None or self._state.adding:
+            return {campo.attname for campo in self._meta.concrete_fields}
+        return {
+            campo.attname for campo in self._meta.concrete_fields
+            if campo.attname in self.__dict__
+            and (campo.attname not in originais or getattr(self, campo.attname) != originais[campo.attname])
+        }
+
+    def campos_atribuidos(self):
+        """attnames dos campos atribuídos desde a leitura, tenham ou não mudado de valor."""
+        atribuidos = getattr(self, '_atribuidos', None) or set()
+        return {campo.attname for campo in self._meta.concrete_fields if campo.attname in atribuidos}
+
+    def valores_originais(self, campos):
+        """Valores lidos do banco para ``campos`` (attnames), ou None se algum não foi carregado."""
+        originais = getattr(self, '_originais', None)
+        if originais is None or self._state.adding or not all(campo in originais for campo in campos):
+            return None
+        return {campo: originais[campo] for campo in campos}
+
+    def validar_alterados(self):
+        """``full_clean()`` restrito aos campos alterados (tudo num objeto novo); ``clean()`` roda sempre que algo mudou."""
+        alterados = self.campos_alterados()
+        if alterados:
+            self.full_clean(exclude=[campo.name for campo in self._meta.fields if campo.attname not in alterados])
+
+    def save(self, *args, **kwargs):
+        # Um save pulado (nada alterado) não chega ao Model.save: pre_save e
+        # post_save não disparam para ele.
+        update_fields = kwargs.get('update_fields')
+        if (
+            update_fields is None and not args and not kwargs.get('force_insert')
+            and kwargs.get('using') in (None, self._state.db)
+            and getattr(self, '_originais', None) is not None and not self._state.adding
+        ):
+            alterados = self.campos_alterados() | self.campos_atribuidos()
+            if not alterados:
+                return
+            if self._meta.pk.attname not in alterados:
+                automaticos = {campo.attname for campo in self._meta.concrete_fields if getattr(campo, 'auto_now', False)}
+                update_fields = kwargs['update_fields'] = alterados | automaticos
+                self.__dict__['_update_fields_automatico'] = True
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self.__dict__.pop('_update_fields_automatico', None)
+        self._registrar_originais(update_fields)
+
+    def _save_table(self, raw=False, cls=None, force_insert=False, force_update=False, using=None, update_fields=None):
+        try:
+            return super()._save_table(raw, cls, force_insert, force_update, using, update_fields)
+        except DatabaseError as erro:
+            # Sem linha para o UPDATE (apagada por outro), o save sem update_fields
+            # inseria de novo; o update_fields escolhido por save() faz o mesmo.
+            automatico = self.__dict__.get('_update_fields_automatico')
+            if not automatico or str(erro) != 'Save with update_fields did not affect any rows.':
+                raise
+            return super()._save_table(raw, cls, force_insert, force_update, using, None)
+
+    def _registrar_originais(self, campos=None):
+        """Passa a tratar como lidos do banco os valores atuais de ``campos`` (todos os carregados se None)."""
+        if campos is None:
+            self._originais = {}
+            self._atribuidos = set()
+            campos = [campo.attname for campo in self._meta.concrete_fields]
+        elif getattr(self, '_originais', None) is None:
+            return
+        for campo in campos:
+            campo = self._meta.get_field(campo).attname
+            self._atribuidos.discard(campo)
+            if campo in self.__dict__:
+                self._originais[campo] = _copiar(getattr(self, campo))
+
+
+def _copiar(valor):
+    # JSONField devolve dict/list mutáveis; arquivos são comparados pelo nome.
+    if isinstance(valor, (dict, list)):
+        return copy.deepcopy(valor)
+    return getattr(valor, 'name', valor) if isinstance(valor, FieldFile) else valor
+
 
 # ============================================================
 # 🔹 GERENCIADOR DE LEITORES
@@ -59,6 +171,11 @@ class Leitor(Base, AbstractBaseUser, PermissionsMixin):
 
     objects = LeitorManager()
 
+    class Meta:
+        indexes = [
+            models.Index(Upper('nome'), name='leitor_nome_upper_idx'),
+        ]
+
     def clean(self):
         super().clean()
         if not self.telefone.isdigit():
@@ -90,6 +207,36 @@ class Categoria(Base):
         return self.nome
 
 
+# ============================================================
+# 🔹 AUTOR
+# ============================================================
+class Autor(Base):
+    nome = models.CharField('Nome', max_length=100)
+
+    class Meta:
+        verbose_name = 'Autor'
+        verbose_name_plural = 'Autores'
+        indexes = [
+            models.Index(Upper('nome'), name='autor_nome_upper_idx'),
+        ]
+
+    def __str__(self):
+        return self.nome
+
+
+class VarianteAutor(models.Model):
+    """Grafia de um nome de autor, pela chave normalizada de core.autores.chave."""
+    chave = models.CharField('Chave', max_length=150, unique=True)
+    autor = models.ForeignKey(Autor, on_delete=models.CASCADE, related_name='variantes')
+
+    class Meta:
+        verbose_name = 'Variante de Autor'
+        verbose_name_plural = 'Variantes de Autores'
+
+    def __str__(self):
+        return f'{self.chave} -> {self.autor}'
+
+
 # ============================================================
 # 🔹 LIVRO
 # ============================================================
@@ -101,7 +248,9 @@ class Livro(Base):
 
     codigo = models.CharField('Código', max_length=15, unique=True)
     nome = models.CharField('Nome', max_length=100)
+    # Crédito como está no livro; os autores normalizados ficam em ``autores`` (veja core/autores.py)
     autor = models.CharField('Autor', max_length=100, default='Desconhecido')
+    autores = models.ManyToManyField(Autor, verbose_name='Autores', related_name='livros', blank=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     status = models.BooleanField('Status', choices=STATUS_CHOICE, default=True)
     isbn = models.CharField('ISBN', max_length=13, unique=True, blank=True, null=True)
@@ -110,6 +259,17 @@ class Livro(Base):
     class Meta:
         verbose_name = 'Livro'
         verbose_name_plural = 'Livros'
+        indexes = [
+            # Busca por prefixo no admin e no autocomplete (veja core/admin.py)
+            models.Index(Upper('nome'), name='livro_nome_upper_idx'),
+            models.Index(Upper('autor'), name='livro_autor_upper_idx'),
+            # Navegação do catálogo por faceta, já na ordem da listagem (veja core/facetas.py)
+            models.Index(fields=['nome', 'id'], name='livro_nome_id_idx'),
+            models.Index(fields=['categoria', 'nome', 'id'], name='livro_categoria_nome_idx'),
+            models.Index(fields=['categoria', 'ano_publicacao', 'status', 'nome', 'id'], name='livro_cat_ano_status_idx'),
+            models.Index(fields=['ano_publicacao', 'nome', 'id'], name='livro_ano_nome_idx'),
+            models.Index(fields=['status', 'nome', 'id'], name='livro_status_nome_idx'),
+        ]
 
     def __str__(self):
         return self.nome
@@ -118,6 +278,33 @@ class Livro(Base):
         return bool(self.status)
 
 
+class ContagemFaceta(models.Model):
+    """Quantos livros do catálogo têm cada valor de faceta (mantida por core.facetas)."""
+    FACETA_CHOICES = (
+        ('categoria', 'Categoria'),
+        ('autor', 'Autor'),
+        ('ano', 'Ano de Publicação'),
+        ('disponivel', 'Disponibilidade'),
+    )
+
+    faceta = models.CharField('Faceta', max_length=20, choices=FACETA_CHOICES)
+    valor = models.CharField('Valor', max_length=100)
+    total = models.IntegerField('Livros', default=0)
+
+    class Meta:
+        verbose_name = 'Contagem de Faceta'
+        verbose_name_plural = 'Contagens de Facetas'
+        constraints = [
+            models.UniqueConstraint(fields=['faceta', 'valor'], name='contagem_faceta_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['faceta', '-total'], name='contagem_faceta_total_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.faceta}={self.valor} | {self.total}'
+
+
 # ============================================================
 # 🔹 EMPRÉSTIMO
 # ============================================================
@@ -129,6 +316,7 @@ class Emprestimo(Base):
 
     issue_date = models.DateField('Data de Empréstimo', default=timezone.localdate)
     devolucao = models.DateField('Data de Devolução', blank=True, null=True)
+    data_devolvida = models.DateField('Devolvido em', blank=True, null=True)
     status = models.CharField('Status', max_length=20, choices=STATUS_CHOICE, default='in_progress')
     leitor = models.ForeignKey(Leitor, on_delete=models.CASCADE)
     livro = models.ForeignKey(Livro, on_delete=models.CASCADE)
@@ -142,17 +330,64 @@ class Emprestimo(Base):
         return max(0, dias_atraso) * self.MULTA_POR_DIA
 
     def clean(self):
+        if not {'devolucao', 'issue_date'} & self.campos_alterados():
+            return
         if self.devolucao and self.devolucao <= self.issue_date:
             raise ValidationError('A data de devolução deve ser posterior à data de empréstimo.')
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        self.validar_alterados()
         super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['-issue_date']
         verbose_name = 'Empréstimo'
         verbose_name_plural = 'Empréstimos'
+        indexes = [
+            models.Index(fields=['issue_date', 'id'], name='emprestimo_issue_date_idx'),
+            models.Index(fields=['status', 'devolucao', 'id'], name='emprestimo_status_devol_idx'),
+            # Marca d'água e dias de devolução usados por core/estatisticas.py
+            models.Index(fields=['modificado'], name='emprestimo_modificado_idx'),
+            models.Index(fields=['data_devolvida'], name='emprestimo_devolvido_idx'),
+            # Seleção dos finalizados antigos em core/arquivo.py
+            models.Index(fields=['status', 'data_devolvida', 'id'], name='emprestimo_status_devol_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.livro} — {self.leitor}'
+
+
+# ============================================================
+# 🔹 HISTÓRICO DE EMPRÉSTIMOS (core.arquivo)
+# ============================================================
+class EmprestimoHistorico(models.Model):
+    """
+    Empréstimos finalizados e antigos, movidos para fora de core_emprestimo
+    por ``arquivar_emprestimos``. Mantém o id original e só as colunas que o
+    histórico usa; todos já estão devolvidos.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    leitor = models.ForeignKey(Leitor, on_delete=models.CASCADE)
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE)
+    issue_date = models.DateField('Data de Empréstimo')
+    devolucao = models.DateField('Data de Devolução', blank=True, null=True)
+    data_devolvida = models.DateField('Devolvido em', blank=True, null=True)
+    criado = models.DateTimeField('Data de Criação')
+    arquivado = models.DateTimeField('Arquivado em', auto_now_add=True)
+
+    status = 'completed'
+
+    class Meta:
+        verbose_name = 'Empréstimo Arquivado'
+        verbose_name_plural = 'Empréstimos Arquivados'
+        indexes = [
+            models.Index(fields=['leitor', 'criado'], name='historico_leitor_idx'),
+            models.Index(fields=['issue_date'], name='historico_issue_date_idx'),
+            models.Index(fields=['data_devolvida'], name='historico_devolvido_idx'),
+        ]
+
+    def get_status_display(self):
+        return 'Finalizado'
 
     def __str__(self):
         return f'{self.livro} — {self.leitor}'
@@ -179,22 +414,214 @@ class Agendamento(Base):
         if self.status == 'cancelled':
             return
 
+        # Só valida as datas que este save altera: concluir um agendamento de hoje não é reagendá-lo
+        alterados = self.campos_alterados()
         data_hoje = timezone.localdate()
 
-        if self.data_agendada and self.data_agendada <= data_hoje:
+        if 'data_agendada' in alterados and self.data_agendada and self.data_agendada <= data_hoje:
             raise ValidationError('A data agendada deve ser posterior à data de hoje.')
 
-        if self.data_retirada and self.data_retirada.date() < self.data_agendada:
+        if {'data_agendada', 'data_retirada'} & alterados and self.data_retirada and self.data_retirada.date() < self.data_agendada:
             raise ValidationError('A retirada deve ocorrer após a data agendada.')
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        self.validar_alterados()
         super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = 'Agendamento de Retirada'
         verbose_name_plural = 'Agendamentos de Retirada'
         ordering = ['-data_agendada']
+        indexes = [
+            models.Index(fields=['data_agendada', 'id'], name='agendamento_data_idx'),
+            models.Index(fields=['status', 'data_agendada'], name='agendamento_status_data_idx'),
+        ]
 
     def __str__(self):
         return f'{self.leitor.nome} | {self.livro.nome} | {self.data_agendada.strftime("%d/%m/%Y")}'
+
+
+# ============================================================
+# 🔹 NOTIFICAÇÕES ENVIADAS
+# ============================================================
+class NotificacaoEnviada(Base):
+    """Registro dos avisos já enviados, para que o envio possa ser repetido sem duplicar e-mails."""
+    TIPO_CHOICE = (
+        ('lembrete', 'Lembrete de devolução'),
+        ('atraso', 'Aviso de atraso'),
+    )
+
+    emprestimo = models.ForeignKey(Emprestimo, on_delete=models.CASCADE, related_name='notificacoes')
+    tipo = models.CharField('Tipo', max_length=20, choices=TIPO_CHOICE)
+    referencia = models.DateField('Data de devolução avisada')
+
+    class Meta:
+        verbose_name = 'Notificação Enviada'
+        verbose_name_plural = 'Notificações Enviadas'
+        constraints = [
+            models.UniqueConstraint(fields=['emprestimo', 'tipo', 'referencia'], name='notificacao_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} | {self.emprestimo_id} | {self.referencia.strftime("%d/%m/%Y")}'
+
+
+# ============================================================
+# 🔹 FILA DE TAREFAS (core.tarefas)
+# ============================================================
+class Tarefa(Base):
+    STATUS_CHOICE = (
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    )
+
+    nome = models.CharField('Nome', max_length=200)
+    fila = models.CharField('Fila', max_length=50, default='padrao')
+    argumentos = models.JSONField('Argumentos', default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICE, default='pendente')
+    executar_em = models.DateTimeField('Executar em', default=timezone.now)
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    max_tentativas = models.PositiveIntegerField('Máximo de tentativas', default=3)
+    reservada_em = models.DateTimeField('Reservada em', blank=True, null=True)
+    reservada_por = models.CharField('Reservada por', max_length=100, blank=True)
+    ultimo_erro = models.TextField('Último erro', blank=True)
+
+    class Meta:
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+        indexes = [
+            models.Index(fields=['status', 'fila', 'executar_em', 'id'], name='tarefa_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.nome} | {self.get_status_display()} | {self.tentativas}/{self.max_tentativas}'
+
+
+# ============================================================
+# 🔹 RESPOSTAS IDEMPOTENTES (core.idempotencia)
+# ============================================================
+class RespostaIdempotente(models.Model):
+    """
+    Resposta de uma requisição com Idempotency-Key, repetida para as
+    retransmissões da mesma chave até ``expira``. Sem ``status`` a primeira
+    requisição ainda está em andamento.
+    """
+    chave = models.CharField('Chave', max_length=64, unique=True)  # sha256 de leitor, método, rota e chave
+    impressao = models.CharField('Impressão do corpo', max_length=64)  # sha256 do corpo da requisição
+    status = models.PositiveSmallIntegerField('Status HTTP', blank=True, null=True)
+    tipo = models.CharField('Content-Type', max_length=100, blank=True)
+    location = models.CharField('Location', max_length=500, blank=True)
+    conteudo = models.BinaryField('Conteúdo', blank=True, default=b'')
+    expira = models.DateTimeField('Expira em')
+
+    class Meta:
+        verbose_name = 'Resposta Idempotente'
+        verbose_name_plural = 'Respostas Idempotentes'
+        indexes = [
+            models.Index(fields=['expira', 'id'], name='idempotencia_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.chave[:12]} | {self.status or "em andamento"}'
+
+
+class Trava(models.Model):
+    """Trava de instância única de um job (core.locks): quem a detém e até quando."""
+    nome = models.CharField('Nome', max_length=200, unique=True)
+    dono = models.CharField('Dono', max_length=32)
+    expira = models.DateTimeField('Expira em')
+
+    class Meta:
+        verbose_name = 'Trava'
+        verbose_name_plural = 'Travas'
+
+    def __str__(self):
+        return f'{self.nome} até {self.expira:%d/%m/%Y %H:%M}'
+
+
+# ============================================================
+# 🔹 ESTATÍSTICAS PRÉ-AGREGADAS (core.estatisticas)
+# ============================================================
+class MarcaProcessamento(models.Model):
+    """Marca d'água de processos incrementais: até onde cada um já processou."""
+    nome = models.CharField('Nome', max_length=50, unique=True)
+    valor = models.DateTimeField('Processado até')
+
+    class Meta:
+        verbose_name = 'Marca de Processamento'
+        verbose_name_plural = 'Marcas de Processamento'
+
+    def __str__(self):
+        return f'{self.nome} | {self.valor:%d/%m/%Y %H:%M}'
+
+
+class EstatisticaDiaria(models.Model):
+    """
+    Totais de um dia por categoria. Empréstimos contam no dia em que saíram;
+    devoluções, atrasos e dias emprestados contam no dia da devolução.
+    """
+    dia = models.DateField('Dia')
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    emprestimos = models.PositiveIntegerField('Empréstimos', default=0)
+    devolucoes = models.PositiveIntegerField('Devoluções', default=0)
+    devolucoes_atrasadas = models.PositiveIntegerField('Devoluções atrasadas', default=0)
+    dias_emprestado = models.PositiveIntegerField('Soma dos dias emprestado', default=0)
+
+    class Meta:
+        verbose_name = 'Estatística Diária'
+        verbose_name_plural = 'Estatísticas Diárias'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'categoria'], name='estatistica_diaria_unica'),
+        ]
+
+
+class EstatisticaMensal(models.Model):
+    """Totais do mês (``mes`` é sempre o dia 1), incluindo leitores distintos, que não se somam por dia."""
+    mes = models.DateField('Mês', unique=True)
+    emprestimos = models.PositiveIntegerField('Empréstimos', default=0)
+    leitores_ativos = models.PositiveIntegerField('Leitores ativos', default=0)
+    devolucoes = models.PositiveIntegerField('Devoluções', default=0)
+    devolucoes_atrasadas = models.PositiveIntegerField('Devoluções atrasadas', default=0)
+    dias_emprestado = models.PositiveIntegerField('Soma dos dias emprestado', default=0)
+
+    class Meta:
+        verbose_name = 'Estatística Mensal'
+        verbose_name_plural = 'Estatísticas Mensais'
+
+
+class EstatisticaLivroMensal(models.Model):
+    """Empréstimos de cada livro por mês, para o ranking dos mais emprestados."""
+    mes = models.DateField('Mês')
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE)
+    emprestimos = models.PositiveIntegerField('Empréstimos', default=0)
+
+    class Meta:
+        verbose_name = 'Estatística Mensal de Livro'
+        verbose_name_plural = 'Estatísticas Mensais de Livros'
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'livro'], name='estatistica_livro_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['mes', '-emprestimos'], name='estatistica_livro_rank_idx'),
+        ]
+
+
+# ============================================================
+# 🔹 RECOMENDAÇÕES (core.recomendacoes)
+# ============================================================
+class Recomendacao(models.Model):
+    """Top-K de livros emprestados pelos mesmos leitores de ``livro``, já ordenado por ``posicao``."""
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='recomendacoes')
+    recomendado = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='+')
+    posicao = models.PositiveSmallIntegerField('Posição')
+    leitores = models.PositiveIntegerField('Leitores em comum')
+    pontuacao = models.FloatField('Pontuação')
+
+    class Meta:
+        verbose_name = 'Recomendação'
+        verbose_name_plural = 'Recomendações'
+        constraints = [
+            models.UniqueConstraint(fields=['livro', 'posicao'], name='recomendacao_posicao_unica'),
+        ]
@@ -0,0 +1,209 @@
+"""
+Instrumentação do banco de dados: log de consultas lentas e impressões digitais.
+
+Toda consulta executada é normalizada em uma "impressão digital" (SQL sem
+literais e com listas IN colapsadas). Para cada impressão guardamos as últimas
+SQL_MONITOR_AMOSTRAS durações, de onde saem p50/p95/p99. Consultas acima de
+SLOW_QUERY_MS vão para o logger ``core.monitor_sql`` com a view e o trecho de
+código que as originaram.
+
+Cada processo grava periodicamente suas estatísticas em
+SQL_MONITOR_DIR/<pid>.json; o comando ``relatorio_sql`` junta esses arquivos.
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+VIEW_ATUAL = contextvars.ContextVar('view_atual', default=None)
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_RE_VALUES = re.compile(r'(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+', re.IGNORECASE)
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+# ============================================================
+# 🔹 NORMALIZAÇÃO
+# ============================================================
+@lru_cache(maxsize=4096)
+def normalizar_sql(sql):
+    """Remove literais e colapsa listas de parâmetros de uma consulta."""
+    texto = _RE_STRING.sub('?', sql)
+    texto = _RE_NUMERO.sub('?', texto)
+    texto = texto.replace('%s', '?')
+    texto = _RE_LISTA.sub('(...)', texto)
+    texto = _RE_VALUES.sub(r'\1', texto)
+    return _RE_ESPACOS.sub(' ', texto).strip()
+
+
+@lru_cache(maxsize=4096)
+def impressao_digital(sql):
+    """Retorna (id curto, sql normalizado) de uma consulta."""
+    normalizado = normalizar_sql(sql)
+    return hashlib.md5(normalizado.encode()).hexdigest()[:12], normalizado
+
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método do posto mais próximo (lista já ordenada)."""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+# ============================================================
+# 🔹 ESTATÍSTICAS POR IMPRESSÃO DIGITAL
+# ============================================================
+class EstatisticasSQL:
+    """Janela deslizante de durações (em ms) por impressão digital."""
+
+    def __init__(self, amostras):
+        self.amostras = amostras
+        self.dados = {}
+        self.lock = threading.Lock()
+        self.ultima_gravacao = time.monotonic()
+
+    def registrar(self, chave, sql, duracao_ms):
+        with self.lock:
+            item = self.dados.get(chave)
+            if item is None:
+                item = self.dados[chave] = {
+                    'sql': sql, 'chamadas': 0, 'tempo_total': 0.0,
+                    'duracoes': deque(maxlen=self.amostras),
+                }
+            item['chamadas'] += 1
+            item['tempo_total'] += duracao_ms
+            item['duracoes'].append(duracao_ms)
+
+    def exportar(self):
+        with self.lock:
+            return {
+                chave: {**item, 'duracoes': list(item['duracoes'])}
+                for chave, item in self.dados.items()
+            }
+
+    def gravar(self, diretorio):
+        """Grava as estatísticas deste processo em <diretorio>/<pid>.json."""
+        self.ultima_gravacao = time.monotonic()
+        dados = self.exportar()
+        if not dados:
+            return
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        temporario = diretorio / f'.{os.getpid()}.json.tmp'
+        temporario.write_text(json.dumps(dados))
+        temporario.replace(diretorio / f'{os.getpid()}.json')
+
+
+def carregar_estatisticas(diretorio):
+    """Junta os arquivos gravados por todos os processos."""
+    combinado = {}
+    for arquivo in Path(diretorio).glob('*.json'):
+        try:
+            dados = json.loads(arquivo.read_text())
+        except (OSError, ValueError):
+            continue
+        for chave, item in dados.items():
+            atual = combinado.setdefault(chave, {
+                'sql': item['sql'], 'chamadas': 0, 'tempo_total': 0.0, 'duracoes': [],
+            })
+            atual['chamadas'] += item['chamadas']
+            atual['tempo_total'] += item['tempo_total']
+            atual['duracoes'].extend(item['duracoes'])
+    return combinado
+
+
+def resumir(combinado):
+    """Calcula chamadas, tempo total e p50/p95/p99 de cada impressão digital."""
+    linhas = []
+    for chave, item in combinado.items():
+        duracoes = sorted(item['duracoes'])
+        linhas.append({
+            'impressao': chave,
+            'sql': item['sql'],
+            'chamadas': item['chamadas'],
+            'tempo_total': item['tempo_total'],
+            'p50': percentil(duracoes, 50),
+            'p95': percentil(duracoes, 95),
+            'p99': percentil(duracoes, 99),
+        })
+    return linhas
+
+
+# ============================================================
+# 🔹 WRAPPER DE EXECUÇÃO
+# ============================================================
+def _origem_da_consulta():
+    """Último frame do código do projeto (fora do Django e deste módulo)."""
+    raiz = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        arquivo = frame.filename
+        if arquivo.startswith(raiz) and 'site-packages' not in arquivo and arquivo != __file__:
+            return f'{os.path.relpath(arquivo, raiz)}:{frame.lineno} em {frame.name}'
+    return 'desconhecida'
+
+
+class MonitorSQL:
+    """execute_wrapper instalado em cada conexão pelo sinal connection_created."""
+
+    def __init__(self):
+        self.limite_ms = settings.SLOW_QUERY_MS
+        self.diretorio = settings.SQL_MONITOR_DIR
+        self.intervalo = settings.SQL_MONITOR_FLUSH
+        self.estatisticas = EstatisticasSQL(settings.SQL_MONITOR_AMOSTRAS)
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            chave, normalizado = impressao_digital(sql)
+            self.estatisticas.registrar(chave, normalizado, duracao_ms)
+            if duracao_ms >= self.limite_ms:
+                logger.warning(
+                    'Consulta lenta (%.1f ms) [%s] view=%s origem=%s sql=%s',
+                    duracao_ms, chave, VIEW_ATUAL.get() or '-', _origem_da_consulta(), normalizado,
+                )
+            if time.monotonic() - self.estatisticas.ultima_gravacao >= self.intervalo:
+                self.gravar()
+
+    def gravar(self):
+        try:
+            self.estatisticas.gravar(self.diretorio)
+        except OSError as e:
+            logger.error(f"Erro ao gravar estatísticas de SQL: {str(e)}")
+
+
+_monitor = None
+
+
+def obter_monitor():
+    global _monitor
+    if _monitor is None:
+        _monitor = MonitorSQL()
+        atexit.register(_monitor.gravar)
+    return _monitor
+
+
+def instalar(sender, connection, **kwargs):
+    """Receptor de connection_created: instala o monitor uma vez por conexão."""
+    monitor = obter_monitor()
+    if monitor not in connection.execute_wrappers:
+        connection.execute_wrappers.append(monitor)
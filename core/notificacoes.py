@@ -0,0 +1,211 @@
+"""
+Envio de e-mails aos leitores.
+
+As mensagens são montadas a partir de templates em ``templates/emails`` e
+enviadas por uma única conexão com o servidor de e-mail por execução. Em
+desenvolvimento, EMAIL_BACKEND aponta para o console ou para arquivos.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from core.models import Agendamento, Emprestimo, NotificacaoEnviada
+from core.tarefas import tarefa
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# 🔹 MONTAGEM E ENVIO
+# ============================================================
+def montar_mensagens(template, itens):
+    """
+    Cria um EmailMessage por ``(contexto, destinatario)`` de ``itens``.
+
+    Os templates ``emails/<template>_assunto.txt`` e ``emails/<template>.txt``
+    são carregados uma vez só para o lote inteiro.
+    """
+    assunto = get_template(f'emails/{template}_assunto.txt')
+    corpo = get_template(f'emails/{template}.txt')
+    return [
+        EmailMessage(assunto.render(contexto).strip(), corpo.render(contexto),
+                     settings.DEFAULT_FROM_EMAIL, [destinatario])
+        for contexto, destinatario in itens
+        if destinatario
+    ]
+
+
+def enviar_mensagens(mensagens, conexao=None):
+    """
+    Envia as mensagens e devolve quantas foram aceitas pelo servidor.
+
+    Sem ``conexao``, abre e fecha uma só para este lote.
+    """
+    if not mensagens:
+        return 0
+    if conexao is not None:
+        return conexao.send_messages(mensagens) or 0
+    try:
+        with get_connection() as conexao:
+            return conexao.send_messages(mensagens) or 0
+    except Exception:
+        logger.exception('Falha ao enviar %d e-mail(s).', len(mensagens))
+        return 0
+
+
+def _enviar_uma(mensagem, conexao):
+    """True se o servidor aceitou a mensagem; uma falha fica no log e não interrompe o lote."""
+    try:
+        return bool(conexao.send_messages([mensagem]))
+    except Exception:
+        logger.exception('Falha ao enviar e-mail para %s.', ', '.join(mensagem.to))
+        return False
+
+
+# ============================================================
+# 🔹 AGENDAMENTOS
+# ============================================================
+@tarefa
+def avisar_agendamentos_expirados(ids):
+    """Tarefa: avisa os leitores dos agendamentos ``ids``, já cancelados por expiração."""
+    agendamentos = Agendamento.objects.filter(id__in=ids, status='cancelled').values(
+        'leitor__email', 'leitor__nome', 'livro__nome', 'data_agendada',
+    )
+    mensagens = montar_mensagens('agendamento_expirado', (
+        ({
+            'nome': agendamento['leitor__nome'],
+            'livro': agendamento['livro__nome'],
+            'data_agendada': agendamento['data_agendada'],
+        }, agendamento['leitor__email'])
+        for agendamento in agendamentos
+    ))
+    # Sem capturar exceções: uma falha de envio faz a fila tentar de novo.
+    with get_connection() as conexao:
+        return enviar_mensagens(mensagens, conexao)
+
+
+@tarefa
+def confirmar_agendamento(agendamento_id):
+    """Tarefa: envia ao leitor a confirmação de um agendamento recém-criado."""
+    agendamento = Agendamento.objects.select_related('leitor', 'livro').filter(id=agendamento_id).first()
+    if agendamento is None:
+        return 0
+    mensagens = montar_mensagens('agendamento_confirmado', [({
+        'nome': agendamento.leitor.nome,
+        'livro': agendamento.livro.nome,
+        'data_agendada': agendamento.data_agendada,
+    }, agendamento.leitor.email)])
+    with get_connection() as conexao:
+        return enviar_mensagens(mensagens, conexao)
+
+
+# ============================================================
+# 🔹 LEMBRETES DE DEVOLUÇÃO E ATRASOS
+# ============================================================
+TEMPLATES_EMPRESTIMO = {
+    'lembrete': 'lembrete_devolucao',
+    'atraso': 'emprestimo_atrasado',
+}
+
+
+def emprestimos_a_notificar(dias_antes, hoje=None):
+    """
+    Empréstimos em andamento que vencem de hoje até daqui a ``dias_antes``
+    dias ou que já venceram, e que ainda não receberam o aviso correspondente.
+    Como o lembrete vale para a janela inteira, uma execução perdida ou
+    atrasada do cron não perde os lembretes daquele dia; NotificacaoEnviada
+    impede que os já avisados recebam outro.
+
+    Uma única consulta, servida pelo índice (status, devolucao, id).
+    """
+    hoje = hoje or timezone.localdate()
+    alvo = hoje + timedelta(days=dias_antes)
+
+    def ja_avisado(tipo):
+        return Exists(NotificacaoEnviada.objects.filter(
+            emprestimo=OuterRef('pk'), tipo=tipo, referencia=OuterRef('devolucao'),
+        ))
+
+    return (
+        Emprestimo.objects
+        .filter(status='in_progress', devolucao__lte=alvo)
+        .filter(
+            Q(devolucao__gte=hoje) & ~ja_avisado('lembrete')
+            | Q(devolucao__lt=hoje) & ~ja_avisado('atraso')
+        )
+        .order_by('devolucao', 'id')
+    )
+
+
+def _lotes_por_chave(queryset, campos, lote):
+    """Percorre o queryset ordenado por (devolucao, id) sem OFFSET, de ``lote`` em ``lote``."""
+    ultimo = None
+    while True:
+        pagina = queryset
+        if ultimo is not None:
+            pagina = pagina.filter(
+                Q(devolucao__gt=ultimo['devolucao'])
+                | Q(devolucao=ultimo['devolucao'], id__gt=ultimo['id'])
+            )
+        linhas = list(pagina.values(*campos)[:lote])
+        if not linhas:
+            return
+        yield linhas
+        if len(linhas) < lote:
+            return
+        ultimo = linhas[-1]
+
+
+def enviar_lembretes(dias_antes, hoje=None, lote=1000, simular=False, progresso=None):
+    """
+    Envia lembretes de devolução e avisos de atraso em lotes.
+
+    Cada lote é lido, renderizado e enviado pela mesma conexão SMTP, e só
+    então registrado em NotificacaoEnviada; repetir a execução não reenvia o
+    que já foi registrado. Só entra no registro (e na contagem por tipo
+    devolvida) o que o servidor aceitou: o resto é tentado na próxima execução.
+    """
+    hoje = hoje or timezone.localdate()
+    campos = ('id', 'devolucao', 'leitor__email', 'leitor__nome', 'livro__nome')
+    consulta = emprestimos_a_notificar(dias_antes, hoje)
+    totais = {'lembrete': 0, 'atraso': 0}
+
+    with get_connection() as conexao:
+        for linhas in _lotes_por_chave(consulta, campos, lote):
+            por_tipo = {'lembrete': [], 'atraso': []}
+            for linha in linhas:
+                por_tipo['atraso' if linha['devolucao'] < hoje else 'lembrete'].append(linha)
+
+            registros = []
+            for tipo, grupo in por_tipo.items():
+                if not grupo:
+                    continue
+                if simular:
+                    totais[tipo] += len(grupo)
+                    continue
+                grupo = [linha for linha in grupo if linha['leitor__email']]
+                mensagens = montar_mensagens(TEMPLATES_EMPRESTIMO[tipo], (
+                    ({
+                        'nome': linha['leitor__nome'],
+                        'livro': linha['livro__nome'],
+                        'devolucao': linha['devolucao'],
+                        'dias': abs((linha['devolucao'] - hoje).days),
+                    }, linha['leitor__email'])
+                    for linha in grupo
+                ))
+                for linha, mensagem in zip(grupo, mensagens):
+                    if _enviar_uma(mensagem, conexao):
+                        registros.append(
+                            NotificacaoEnviada(emprestimo_id=linha['id'], tipo=tipo, referencia=linha['devolucao'])
+                        )
+                        totais[tipo] += 1
+
+            NotificacaoEnviada.objects.bulk_create(registros, ignore_conflicts=True)
+            if progresso:
+                progresso(f"{totais['lembrete']} lembrete(s), {totais['atraso']} aviso(s) de atraso...")
+    return totais
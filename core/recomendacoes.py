@@ -0,0 +1,188 @@
+"""
+Recomendações "quem pegou este livro também pegou...".
+
+Os pares (leitor, livro) distintos dos empréstimos vivos e arquivados são
+lidos do banco numa única consulta e indexados em memória nos dois sentidos;
+a co-ocorrência de cada livro é a soma dos livros dos seus leitores (um
+produto de matriz esparsa feito com Counter, sem dependências novas). Um
+self-join no SQLite refazia a CTE a cada lote e ficava inviável com centenas
+de milhares de empréstimos.
+
+Cada leitor contribui só com seus RECOMENDACOES_POR_LEITOR livros mais
+recentes, para que poucos leitores muito ativos não dominem o resultado nem
+explodam o número de pares.
+
+A pontuação é a similaridade do cosseno entre os conjuntos de leitores dos
+dois livros, o que evita recomendar sempre os mesmos campeões de empréstimo.
+O top-K de cada livro fica na tabela Recomendacao; a página só consulta essa
+tabela (e o cache).
+"""
+import heapq
+import math
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import cache as cache_unico
+from core.models import Emprestimo, EmprestimoHistorico, Livro, MarcaProcessamento, Recomendacao
+
+MARCA = 'recomendacoes'
+PREFIXO_CACHE = 'recomendacoes:'
+
+
+# ============================================================
+# 🔹 CÁLCULO
+# ============================================================
+def _sql_leituras():
+    """CTE com os pares (leitor, livro) distintos, limitados aos mais recentes de cada leitor."""
+    qn = connection.ops.quote_name
+    viva = qn(Emprestimo._meta.db_table)
+    historico = qn(EmprestimoHistorico._meta.db_table)
+    return f'''
+        WITH todas AS (
+            SELECT leitor_id, livro_id, issue_date FROM {viva}
+            UNION ALL
+            SELECT leitor_id, livro_id, issue_date FROM {historico}
+        ), distintas AS (
+            SELECT leitor_id, livro_id, MAX(issue_date) AS ultima
+            FROM todas GROUP BY leitor_id, livro_id
+        ), leituras AS (
+            SELECT leitor_id, livro_id FROM (
+                SELECT leitor_id, livro_id,
+                       ROW_NUMBER() OVER (PARTITION BY leitor_id ORDER BY ultima DESC, livro_id) AS ordem
+                FROM distintas
+            ) numeradas
+            WHERE ordem <= %s
+        )
+    '''
+
+
+def leituras():
+    """
+    Lê os pares (leitor, livro) uma única vez e devolve os dois índices:
+    livros de cada leitor e leitores de cada livro.
+    """
+    livros_por_leitor = {}
+    leitores_por_livro = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _sql_leituras() + 'SELECT leitor_id, livro_id FROM leituras',
+            [settings.RECOMENDACOES_POR_LEITOR],
+        )
+        for leitor, livro in cursor:
+            livros_por_leitor.setdefault(leitor, []).append(livro)
+            leitores_por_livro.setdefault(livro, []).append(leitor)
+    return livros_por_leitor, leitores_por_livro
+
+
+def co_ocorrencias(livro, livros_por_leitor, leitores_por_livro):
+    """Contagem de leitores em comum entre ``livro`` e cada outro livro."""
+    comuns = Counter()
+    for leitor in leitores_por_livro.get(livro, ()):
+        comuns.update(livros_por_leitor[leitor])
+    comuns.pop(livro, None)
+    return comuns
+
+
+def recalcular_livros(livros, indices, top):
+    """Refaz o top-K dos ``livros`` de origem."""
+    livros_por_leitor, leitores_por_livro = indices
+    minimo = settings.RECOMENDACOES_MINIMO_LEITORES
+    linhas = []
+    for origem in livros:
+        leitores_origem = len(leitores_por_livro.get(origem, ()))
+        candidatos = (
+            (comuns / math.sqrt(leitores_origem * len(leitores_por_livro[outro])), comuns, -outro)
+            for outro, comuns in co_ocorrencias(origem, livros_por_leitor, leitores_por_livro).items()
+            if comuns >= minimo
+        )
+        for posicao, (pontuacao, comuns, outro) in enumerate(heapq.nlargest(top, candidatos), start=1):
+            linhas.append(Recomendacao(
+                livro_id=origem, recomendado_id=-outro, posicao=posicao,
+                leitores=comuns, pontuacao=round(pontuacao, 6),
+            ))
+
+    with transaction.atomic():
+        Recomendacao.objects.filter(livro_id__in=livros).delete()
+        Recomendacao.objects.bulk_create(linhas, batch_size=2000)
+    return len(linhas)
+
+
+def livros_afetados(desde):
+    """
+    Livros cujo top-K pode ter mudado com os empréstimos criados após ``desde``:
+    todos os livros dos leitores que pegaram algo novo.
+    """
+    novos = Emprestimo.objects.filter(modificado__gt=desde, criado__gt=desde).order_by()
+    leitores = novos.values('leitor_id')
+    afetados = set(Emprestimo.objects.filter(leitor_id__in=leitores).order_by().values_list('livro_id', flat=True).distinct())
+    afetados.update(
+        EmprestimoHistorico.objects.filter(leitor_id__in=leitores).order_by().values_list('livro_id', flat=True).distinct()
+    )
+    return afetados
+
+
+def atualizar(recalcular=False, top=None, lote=1000, margem=60, progresso=None):
+    """
+    Recalcula as recomendações dos livros afetados desde a última marca
+    d'água (ou de todos, com ``recalcular``). Os pares (leitor, livro) são
+    lidos uma vez por execução; os lotes só controlam o tamanho de cada
+    transação de escrita. Devolve quantos livros foram recalculados.
+    """
+    top = top or settings.RECOMENDACOES_TOP
+    nova_marca = timezone.now() - timedelta(seconds=margem)
+    marca = MarcaProcessamento.objects.filter(nome=MARCA).first()
+
+    if recalcular or marca is None:
+        livros = list(Livro.objects.order_by('id').values_list('id', flat=True))
+    else:
+        livros = sorted(livros_afetados(marca.valor))
+
+    indices = leituras() if livros else ({}, {})
+    for inicio in range(0, len(livros), lote):
+        recalcular_livros(livros[inicio:inicio + lote], indices, top)
+        if progresso:
+            progresso(f'{min(inicio + lote, len(livros))}/{len(livros)} livro(s)...')
+
+    MarcaProcessamento.objects.update_or_create(nome=MARCA, defaults={'valor': nova_marca})
+    return len(livros)
+
+
+# ============================================================
+# 🔹 LEITURA (DASHBOARD)
+# ============================================================
+def para_leitor(leitor, emprestimos, quantidade=6):
+    """
+    Recomendações para o leitor a partir dos livros que ele pegou por último,
+    como dicionários com ``id``, ``nome`` e ``autor``.
+
+    ``emprestimos`` é o histórico já carregado pela página, do mais novo para o
+    mais antigo. Fora do cache, é uma única consulta pelo índice (livro, posição).
+    """
+    recentes = list(dict.fromkeys(emprestimo.livro_id for emprestimo in emprestimos))[:5]
+    if not recentes:
+        return []
+
+    chave = f"{PREFIXO_CACHE}{leitor.pk}:{'-'.join(map(str, recentes))}"
+
+    def calcular():
+        ja_lidos = {emprestimo.livro_id for emprestimo in emprestimos}
+        candidatos = (
+            Recomendacao.objects.filter(livro_id__in=recentes)
+            .order_by('posicao', '-pontuacao')
+            .values('recomendado_id', 'recomendado__nome', 'recomendado__autor')
+        )
+        sugestoes = {}
+        for candidato in candidatos:
+            livro = candidato['recomendado_id']
+            if livro in ja_lidos or livro in sugestoes:
+                continue
+            sugestoes[livro] = {'id': livro, 'nome': candidato['recomendado__nome'], 'autor': candidato['recomendado__autor']}
+            if len(sugestoes) == quantidade:
+                break
+        return list(sugestoes.values())
+
+    return cache_unico.obter(chave, calcular, settings.RECOMENDACOES_CACHE_TIMEOUT, 'recomendacoes')
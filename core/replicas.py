@@ -0,0 +1,85 @@
+"""
+Leituras em réplicas do banco (DATABASE_REPLICA_URLS).
+
+Só as views marcadas com ``@usar_replica`` (catálogo, dashboard, histórico e
+relatórios) leem de uma réplica; todo o resto, e qualquer escrita, vai para
+o default. Dentro de uma transação no default as leituras também ficam no
+primário, para não ler de uma réplica o que a própria transação ainda não
+gravou.
+
+A replicação tem atraso: quem acabou de agendar ou devolver um livro e volta
+para o dashboard precisa ver a mudança. Por isso toda requisição de escrita
+bem-sucedida (POST, PUT, PATCH, DELETE) grava o cookie ``COOKIE_PRIMARIO``
+(core.middleware.FixarPrimarioMiddleware),
+e enquanto ele vale (REPLICA_JANELA_PRIMARIO segundos) as views daquele
+navegador leem do primário.
+
+A réplica é sorteada uma vez por requisição, na entrada da view: todas as
+consultas dela leem da mesma réplica, e a página não mistura réplicas com
+atrasos diferentes.
+
+Aplique o decorador por baixo de ``@login_required``: a sessão e o usuário
+são lidos antes, no primário, então um login recém-feito não depende da
+réplica já tê-lo recebido.
+"""
+import contextvars
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE_PRIMARIO = 'garoca_primario'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Alias da réplica sorteada para a requisição atual; None fora de ``@usar_replica``.
+_usar_replica = contextvars.ContextVar('usar_replica', default=None)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+def fixado_no_primario(request):
+    """True se o navegador escreveu algo há menos de REPLICA_JANELA_PRIMARIO segundos."""
+    try:
+        return float(request.COOKIES.get(COOKIE_PRIMARIO, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def usar_replica(view):
+    """Faz as leituras da view irem para uma réplica, salvo se o navegador estiver fixado no primário."""
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        disponiveis = replicas()
+        if not disponiveis or fixado_no_primario(request):
+            return view(request, *args, **kwargs)
+        token = _usar_replica.set(random.choice(disponiveis))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _usar_replica.reset(token)
+    return _view
+
+
+class RoteadorReplicas:
+    """Router do Django: leituras marcadas vão para a réplica da requisição, o resto para o default."""
+
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return _usar_replica.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O esquema chega às réplicas pela replicação.
+        return db == DEFAULT_DB_ALIAS
+
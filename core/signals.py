@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Emprestimo, Livro
+from .models import Autor, Categoria, ContagemFaceta, Emprestimo, Livro
+from . import autocompletar, autores, facetas
 
 @receiver(post_save, sender=Emprestimo)
 def atualizar_quantidade_livros_emprestimo(sender, instance, created, **kwargs):
@@ -17,7 +19,82 @@ def atualizar_quantidade_livros_devolucao(sender, instance, **kwargs):
     """
     Atualiza a quantidade de livros ao deletar um empréstimo (devolução).
     """
+    # Na exclusão em cascata de um livro (ou da sua categoria) não há o que liberar.
+    origem = kwargs.get('origin')
+    if isinstance(origem, (Livro, Categoria)) or getattr(origem, 'model', None) in (Livro, Categoria):
+        return
     if instance.status == 'in_progress':
         livro = instance.livro
         livro.status = True  # Marca o livro como disponível
-        livro.save()
\ No newline at end of file
+        livro.save()
+
+# ============================================================
+# 🔹 ÍNDICES DERIVADOS DE LIVRO (core.facetas, core.autocompletar, core.autores)
+# ============================================================
+CAMPOS_OBSERVADOS = ('nome', 'autor', *facetas.CAMPOS.values())
+
+
+@receiver(pre_save, sender=Livro)
+def guardar_valores_anteriores(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda os valores que o livro tinha antes deste save, para que o post_save
+    aplique só a diferença. Fica None quando o save não toca em nenhum campo
+    observado. Quando ele grava um campo de faceta, os valores vêm do banco:
+    outra transação (uma devolução, um empréstimo) pode ter mudado o livro
+    depois da leitura, e a diferença tem que ser somada ao que está gravado.
+    Senão vêm da leitura original (``Base.valores_originais``).
+    """
+    instance._valores_anteriores = {}
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & {'categoria', *CAMPOS_OBSERVADOS}:
+        instance._valores_anteriores = None
+        return
+    anteriores = None
+    if update_fields is not None and not set(update_fields) & {'categoria', *facetas.CAMPOS.values()}:
+        anteriores = instance.valores_originais(CAMPOS_OBSERVADOS)
+    if anteriores is None:
+        anteriores = Livro.objects.filter(pk=instance.pk).values(*CAMPOS_OBSERVADOS).first() or {}
+    instance._valores_anteriores = anteriores
+
+
+@receiver(post_save, sender=Livro)
+def atualizar_indices_livro(sender, instance, **kwargs):
+    anteriores = getattr(instance, '_valores_anteriores', {})
+    if anteriores is None:
+        return
+    facetas.registrar_mudanca(facetas.chaves(anteriores) if anteriores else set(), facetas.chaves_do_livro(instance))
+    if anteriores.get('autor') != instance.autor:
+        autores.vincular(instance)
+    if anteriores.get('nome') != instance.nome or anteriores.get('autor') != instance.autor:
+        transaction.on_commit(autocompletar.nova_geracao)
+
+
+@receiver(pre_delete, sender=Livro)
+def descontar_autores_livro(sender, instance, **kwargs):
+    # Os vínculos somem em cascata sem m2m_changed; a exclusão roda na mesma transação.
+    facetas.ajustar_autores(instance.autores.values_list('id', flat=True), -1)
+
+
+@receiver(post_delete, sender=Livro)
+def remover_indices_livro(sender, instance, **kwargs):
+    facetas.registrar_mudanca(facetas.chaves_do_livro(instance), set())
+    transaction.on_commit(autocompletar.nova_geracao)
+
+
+@receiver(m2m_changed, sender=Livro.autores.through)
+def atualizar_faceta_autores(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mantém a faceta 'autor' a cada vínculo criado ou desfeito, pelos dois lados da relação."""
+    if action == 'pre_clear':
+        if reverse:
+            facetas.ajustar_autores([instance.pk] * instance.livros.count(), -1)
+        else:
+            facetas.ajustar_autores(instance.autores.values_list('id', flat=True), -1)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        facetas.ajustar_autores([instance.pk] * len(pk_set) if reverse else pk_set, delta)
+
+
+@receiver(post_delete, sender=Autor)
+def remover_faceta_autor(sender, instance, **kwargs):
+    ContagemFaceta.objects.filter(faceta='autor', valor=str(instance.pk)).delete()
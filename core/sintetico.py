@@ -0,0 +1,282 @@
+"""
+Gerador de dados sintéticos para testes de escala.
+
+Popularidade dos livros (e atividade dos leitores) segue uma distribuição de
+Zipf; os empréstimos concentram-se nos meses letivos; uma parcela dos
+empréstimos em andamento já está atrasada. Tudo é gravado com bulk_create em
+lotes, sem passar pelo save()/full_clean() de cada linha, e a senha dos
+leitores é criptografada uma única vez.
+"""
+import itertools
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from core import autocompletar, autores, facetas
+from core.models import Agendamento, Categoria, Emprestimo, Leitor, Livro
+
+CATEGORIAS = (
+    'Romance', 'Ficção Científica', 'Fantasia', 'Suspense', 'Terror', 'Biografia',
+    'História', 'Poesia', 'Infantil', 'Juvenil', 'Autoajuda', 'Filosofia',
+    'Ciências', 'Tecnologia', 'Religião', 'Artes', 'Culinária', 'Viagem',
+    'Quadrinhos', 'Didático',
+)
+PALAVRAS_TITULO = (
+    'Sombra', 'Mar', 'Cidade', 'Noite', 'Jardim', 'Caminho', 'Segredo', 'Vento',
+    'Memória', 'Rio', 'Sertão', 'Estrela', 'Casa', 'Silêncio', 'Fogo', 'Tempo',
+    'Ilha', 'Lua', 'Montanha', 'Espelho', 'Cachorro', 'Menina', 'Viagem', 'Coração',
+)
+COMPLEMENTOS_TITULO = (
+    'Perdido', 'Eterno', 'Proibido', 'do Norte', 'de Papel', 'Esquecido',
+    'das Águas', 'de Ontem', 'Invisível', 'Selvagem', 'sem Fim', 'de Vidro',
+)
+NOMES = (
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Heitor',
+    'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael',
+    'Sofia', 'Tiago', 'Vitória', 'Fernanda', 'José', 'Maria', 'Clarice', 'Machado',
+)
+SOBRENOMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Almeida',
+    'Ferreira', 'Rodrigues', 'Gomes', 'Martins', 'Araújo', 'Ribeiro', 'Dantas',
+    'Barbosa', 'Cardoso', 'Rocha', 'Teixeira', 'Lispector', 'Assis', 'Amado',
+)
+# Peso relativo de empréstimos por mês (jan..dez): picos nos semestres letivos.
+SAZONALIDADE = (0.45, 0.6, 1.3, 1.4, 1.35, 1.1, 0.5, 1.25, 1.35, 1.3, 1.15, 0.4)
+
+PRAZO_DIAS = 14
+DIGITOS_CODIGO = 9  # dígitos depois do prefixo nos códigos de livro
+
+
+def pesos_zipf(n, expoente):
+    """Pesos acumulados de uma distribuição de Zipf com n postos."""
+    return list(itertools.accumulate(1.0 / (posto ** expoente) for posto in range(1, n + 1)))
+
+
+class GeradorDados:
+    """
+    Cria categorias, livros, leitores, empréstimos e agendamentos em lote.
+
+    Os ``reservados`` primeiros livros nunca recebem empréstimo ativo nem
+    agendamento pendente, ficando disponíveis para quem chamou o gerador
+    (o benchmark usa isso para os fluxos que consomem livros).
+    """
+
+    def __init__(self, categorias=20, livros=10000, leitores=2000, emprestimos=100000,
+                 agendamentos=5000, taxa_ativos=0.1, taxa_atraso=0.15, expoente_zipf=0.9,
+                 anos=3, lote=5000, semente=42, prefixo='gd', senha='garoca123',
+                 reservados=0, progresso=None):
+        self.qtd_categorias = categorias
+        self.qtd_livros = livros
+        self.qtd_leitores = leitores
+        self.qtd_emprestimos = emprestimos
+        self.qtd_agendamentos = agendamentos
+        self.taxa_ativos = taxa_ativos
+        self.taxa_atraso = taxa_atraso
+        self.expoente_zipf = expoente_zipf
+        self.dias = int(anos * 365)
+        self.lote = lote
+        self.prefixo = prefixo
+        self.senha = senha
+        self.reservados = reservados
+        self.progresso = progresso or (lambda mensagem: None)
+        self.aleatorio = random.Random(semente)
+        self.hoje = timezone.localdate()
+
+        # Códigos são o prefixo mais DIGITOS_CODIGO dígitos; cortá-los faria livros colidirem no meio de um lote.
+        maximo = Livro._meta.get_field('codigo').max_length - DIGITOS_CODIGO
+        if len(prefixo) > maximo:
+            raise ValueError(f'O prefixo "{prefixo}" tem mais de {maximo} caracteres.')
+        if livros > 10 ** DIGITOS_CODIGO:
+            raise ValueError(f'No máximo {10 ** DIGITOS_CODIGO} livros por prefixo.')
+
+    # --------------------------------------------------------
+    # Utilitários
+    # --------------------------------------------------------
+    def email(self, indice):
+        return f'{self.prefixo}{indice}@garoca.test'
+
+    def _inserir(self, modelo, objetos, rotulo):
+        total = 0
+        while True:
+            lote = list(itertools.islice(objetos, self.lote))
+            if not lote:
+                break
+            with transaction.atomic():
+                modelo.objects.bulk_create(lote, batch_size=self.lote)
+            total += len(lote)
+            self.progresso(f'{rotulo}: {total}')
+        return total
+
+    def _ids_criados(self, modelo, **filtros):
+        return list(modelo.objects.filter(**filtros).order_by('id').values_list('id', flat=True))
+
+    def _data_sazonal(self):
+        """Sorteia uma data nos últimos ``self.dias`` dias, ponderada pela sazonalidade."""
+        while True:
+            data = self.hoje - timedelta(days=self.aleatorio.randrange(self.dias))
+            if self.aleatorio.random() * max(SAZONALIDADE) <= SAZONALIDADE[data.month - 1]:
+                return data
+
+    # --------------------------------------------------------
+    # Etapas
+    # --------------------------------------------------------
+    def gerar_categorias(self):
+        """Reaproveita categorias de mesmo nome já cadastradas."""
+        nomes = [
+            (CATEGORIAS[i % len(CATEGORIAS)] + ('' if i < len(CATEGORIAS) else f' {i // len(CATEGORIAS)}'))[:30]
+            for i in range(self.qtd_categorias)
+        ]
+        existentes = set(Categoria.objects.filter(nome__in=nomes).values_list('nome', flat=True))
+        Categoria.objects.bulk_create([Categoria(nome=nome) for nome in nomes if nome not in existentes])
+        return self._ids_criados(Categoria, nome__in=nomes)
+
+    def gerar_livros(self, categorias):
+        aleatorio = self.aleatorio
+        autores = [
+            f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)}'
+            for _ in range(max(1, self.qtd_livros // 8))
+        ]
+        prefixo = self.prefixo.upper()
+
+        def objetos():
+            for i in range(self.qtd_livros):
+                yield Livro(
+                    codigo=f'{prefixo}{i:0{DIGITOS_CODIGO}d}',
+                    nome=f'{aleatorio.choice(PALAVRAS_TITULO)} {aleatorio.choice(COMPLEMENTOS_TITULO)} {i}',
+                    autor=aleatorio.choice(autores),
+                    categoria_id=aleatorio.choice(categorias),
+                    ano_publicacao=min(self.hoje.year, int(aleatorio.triangular(1900, self.hoje.year, 2015))),
+                )
+        self._inserir(Livro, objetos(), 'livros')
+        return self._ids_criados(Livro, codigo__startswith=prefixo)
+
+    def gerar_leitores(self):
+        senha = make_password(self.senha)
+
+        def objetos():
+            for i in range(self.qtd_leitores):
+                yield Leitor(
+                    nome=f'{self.aleatorio.choice(NOMES)} {self.aleatorio.choice(SOBRENOMES)}',
+                    email=self.email(i),
+                    telefone=f'119{i:08d}'[:15],
+                    password=senha,
+                )
+        self._inserir(Leitor, objetos(), 'leitores')
+        return self._ids_criados(Leitor, email__endswith='@garoca.test', email__startswith=self.prefixo)
+
+    def gerar_emprestimos(self, livros, leitores):
+        """
+        Empréstimos históricos (finalizados) com popularidade Zipf e sazonalidade,
+        mais empréstimos em andamento em livros distintos, parte deles atrasada.
+        Retorna os ids dos livros que ficaram emprestados.
+        """
+        aleatorio = self.aleatorio
+        # A ordem de popularidade é uma permutação aleatória do acervo.
+        populares = livros[:]
+        aleatorio.shuffle(populares)
+        pesos_livros = pesos_zipf(len(populares), self.expoente_zipf)
+        ativos_leitores = leitores[:]
+        aleatorio.shuffle(ativos_leitores)
+        pesos_leitores = pesos_zipf(len(ativos_leitores), 0.8)
+
+        # Cada livro tem no máximo um empréstimo ativo: sorteia pela popularidade,
+        # descarta repetidos e completa uniformemente se a cauda não bastar.
+        elegiveis = set(livros[self.reservados:])
+        qtd_ativos = min(int(len(livros) * self.taxa_ativos), self.qtd_emprestimos, len(elegiveis))
+        sorteados = aleatorio.choices(populares, cum_weights=pesos_livros, k=qtd_ativos * 2)
+        emprestados = [livro for livro in dict.fromkeys(sorteados) if livro in elegiveis][:qtd_ativos]
+        if len(emprestados) < qtd_ativos:
+            faltantes = sorted(elegiveis.difference(emprestados))
+            aleatorio.shuffle(faltantes)
+            emprestados += faltantes[:qtd_ativos - len(emprestados)]
+
+        def historicos():
+            restantes = self.qtd_emprestimos - len(emprestados)
+            while restantes > 0:
+                k = min(self.lote, restantes)
+                livros_lote = aleatorio.choices(populares, cum_weights=pesos_livros, k=k)
+                leitores_lote = aleatorio.choices(ativos_leitores, cum_weights=pesos_leitores, k=k)
+                for livro, leitor in zip(livros_lote, leitores_lote):
+                    inicio = self._data_sazonal()
+                    if aleatorio.random() < self.taxa_atraso:
+                        dias = PRAZO_DIAS + aleatorio.randint(1, 30)
+                    else:
+                        dias = aleatorio.randint(1, PRAZO_DIAS)
+                    yield Emprestimo(
+                        leitor_id=leitor, livro_id=livro, issue_date=inicio,
+                        devolucao=inicio + timedelta(days=PRAZO_DIAS), status='completed',
+                        data_devolvida=min(inicio + timedelta(days=dias), self.hoje),
+                    )
+                restantes -= k
+
+        def em_andamento():
+            leitores_lote = aleatorio.choices(ativos_leitores, cum_weights=pesos_leitores, k=len(emprestados))
+            for livro, leitor in zip(emprestados, leitores_lote):
+                if aleatorio.random() < self.taxa_atraso:
+                    inicio = self.hoje - timedelta(days=aleatorio.randint(PRAZO_DIAS + 1, 90))
+                else:
+                    inicio = self.hoje - timedelta(days=aleatorio.randint(0, PRAZO_DIAS - 1))
+                yield Emprestimo(
+                    leitor_id=leitor, livro_id=livro, issue_date=inicio,
+                    devolucao=inicio + timedelta(days=PRAZO_DIAS), status='in_progress',
+                )
+
+        self._inserir(Emprestimo, itertools.chain(historicos(), em_andamento()), 'empréstimos')
+        return emprestados
+
+    def gerar_agendamentos(self, livros, leitores, indisponiveis):
+        """Agendamentos antigos (concluídos/cancelados) e pendentes em livros livres."""
+        aleatorio = self.aleatorio
+        livres = [livro for livro in livros[self.reservados:] if livro not in indisponiveis]
+        aleatorio.shuffle(livres)
+        qtd_pendentes = min(self.qtd_agendamentos // 5, len(livres))
+        pendentes = livres[:qtd_pendentes]
+
+        def objetos():
+            for livro in pendentes:
+                yield Agendamento(
+                    leitor_id=aleatorio.choice(leitores), livro_id=livro,
+                    data_agendada=self.hoje + timedelta(days=aleatorio.randint(1, 7)),
+                    status='scheduled',
+                )
+            for _ in range(self.qtd_agendamentos - qtd_pendentes):
+                data = self._data_sazonal()
+                concluido = aleatorio.random() < 0.7
+                yield Agendamento(
+                    leitor_id=aleatorio.choice(leitores), livro_id=aleatorio.choice(livros),
+                    data_agendada=data,
+                    data_retirada=timezone.make_aware(datetime.combine(data, time(10))) if concluido else None,
+                    status='completed' if concluido else 'cancelled',
+                )
+        self._inserir(Agendamento, objetos(), 'agendamentos')
+        return pendentes
+
+    def marcar_indisponiveis(self, ids):
+        ids = list(ids)
+        for inicio in range(0, len(ids), self.lote):
+            Livro.objects.filter(id__in=ids[inicio:inicio + self.lote]).update(status=False)
+
+    def executar(self):
+        categorias = self.gerar_categorias()
+        livros = self.gerar_livros(categorias)
+        leitores = self.gerar_leitores()
+        emprestados = self.gerar_emprestimos(livros, leitores)
+        agendados = self.gerar_agendamentos(livros, leitores, set(emprestados))
+        self.marcar_indisponiveis(emprestados + agendados)
+        # bulk_create e update() não disparam os signals que mantêm autores, facetas e o autocompletar.
+        autores.importar(lote=self.lote, contar=False)
+        facetas.recalcular()
+        autocompletar.nova_geracao()
+        return {
+            'categorias': len(categorias),
+            'livros': len(livros),
+            'leitores': len(leitores),
+            'emprestimos': self.qtd_emprestimos,
+            'emprestimos_ativos': len(emprestados),
+            'agendamentos': self.qtd_agendamentos,
+            'agendamentos_pendentes': len(agendados),
+            'reservados': livros[:self.reservados],
+        }
@@ -0,0 +1,35 @@
+"""
+Perfil de produção do SQLite (SQLITE_OTIMIZADO).
+
+Com o journal padrão (DELETE) um escritor bloqueia todos os leitores, e com
+vários workers do gunicorn as requisições esbarram em "database is locked".
+O perfil liga o WAL (leitores não bloqueiam o escritor nem são bloqueados
+por ele), relaxa o fsync para o fim de cada checkpoint (synchronous=NORMAL,
+seguro com WAL), mapeia o arquivo em memória, aumenta o cache de páginas e
+faz a conexão esperar pelo lock em vez de falhar na hora.
+
+Os PRAGMAs valem por conexão e são aplicados pelo sinal connection_created.
+As transações de escrita abrem com BEGIN IMMEDIATE (veja
+core/backends/sqlite): no BEGIN padrão (DEFERRED) uma transação que lê e
+depois escreve falha com SQLITE_BUSY ao tentar promover o lock, sem respeitar
+o busy_timeout.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def aplicar_pragmas(sender, connection, **kwargs):
+    """Receptor de connection_created: aplica SQLITE_PRAGMAS às conexões SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nome, valor in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {nome} = {valor}')
+            if nome == 'journal_mode':
+                modo = cursor.fetchone()[0]
+                # Banco em memória (testes) fica em 'memory'; não é erro.
+                if modo not in (str(valor).lower(), 'memory'):
+                    logger.warning('SQLite ficou em journal_mode=%s em vez de %s.', modo, valor)
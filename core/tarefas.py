@@ -0,0 +1,257 @@
+"""
+Fila de tarefas em segundo plano.
+
+Funções marcadas com ``@tarefa`` podem ser enfileiradas pelas views e
+executadas depois pelo comando ``processar_tarefas``::
+
+    @tarefa(max_tentativas=5)
+    def enviar_confirmacao(agendamento_id):
+        ...
+
+    enviar_confirmacao.enfileirar(agendamento.id)
+
+O broker padrão guarda as tarefas na tabela ``core_tarefa`` e as reserva com
+``SELECT ... FOR UPDATE SKIP LOCKED`` quando o banco permite. Outros brokers
+podem ser plugados por TAREFAS_BROKER, implementando a interface ``Broker``.
+"""
+import importlib
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+REGISTRO = {}
+
+
+# ============================================================
+# 🔹 REGISTRO DE TAREFAS
+# ============================================================
+class TarefaRegistrada:
+    """Envolve a função original e sabe se enfileirar."""
+
+    def __init__(self, funcao, nome, fila, max_tentativas):
+        self.funcao = funcao
+        self.nome = nome
+        self.fila = fila
+        self.max_tentativas = max_tentativas
+        self.__doc__ = funcao.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.funcao(*args, **kwargs)
+
+    def enfileirar(self, *args, atraso=None, **kwargs):
+        """
+        Agenda a execução com os argumentos dados (precisam ser serializáveis em
+        JSON). Dentro de uma transação, a tarefa só fica visível após o commit.
+        """
+        executar_em = timezone.now() + timedelta(seconds=atraso) if atraso else None
+        return obter_broker().enfileirar(
+            self.nome, args, kwargs, fila=self.fila,
+            executar_em=executar_em, max_tentativas=self.max_tentativas,
+        )
+
+
+def tarefa(funcao=None, *, nome=None, fila='padrao', max_tentativas=None):
+    """Registra a função como tarefa; pode ser usado com ou sem parênteses."""
+    def registrar(funcao):
+        registrada = TarefaRegistrada(
+            funcao,
+            nome or f'{funcao.__module__}.{funcao.__name__}',
+            fila,
+            max_tentativas or settings.TAREFAS_TENTATIVAS,
+        )
+        REGISTRO[registrada.nome] = registrada
+        return registrada
+
+    return registrar(funcao) if funcao else registrar
+
+
+def carregar_tarefas():
+    """Importa os módulos de TAREFAS_MODULOS para preencher o registro."""
+    for modulo in settings.TAREFAS_MODULOS:
+        importlib.import_module(modulo)
+
+
+def executar(nome, argumentos):
+    try:
+        registrada = REGISTRO[nome]
+    except KeyError:
+        raise LookupError(f'Tarefa não registrada: {nome}')
+    return registrada(*argumentos.get('args', ()), **argumentos.get('kwargs', {}))
+
+
+def calcular_espera(tentativas):
+    """Backoff exponencial com jitter, limitado a TAREFAS_BACKOFF_MAX segundos."""
+    espera = min(settings.TAREFAS_BACKOFF_BASE * 2 ** max(tentativas - 1, 0), settings.TAREFAS_BACKOFF_MAX)
+    return espera * random.uniform(0.5, 1.0)
+
+
+# ============================================================
+# 🔹 BROKERS
+# ============================================================
+class Broker:
+    """Interface dos brokers. Tarefas reservadas são instâncias de ``Tarefa``."""
+
+    def enfileirar(self, nome, args, kwargs, fila='padrao', executar_em=None, max_tentativas=3):
+        raise NotImplementedError
+
+    def reservar(self, filas, quantidade, trabalhador):
+        """Marca até ``quantidade`` tarefas prontas como em execução e as devolve."""
+        raise NotImplementedError
+
+    def concluir(self, tarefa):
+        raise NotImplementedError
+
+    def falhar(self, tarefa, erro):
+        """Reagenda a tarefa com backoff ou, esgotadas as tentativas, a marca como falha."""
+        raise NotImplementedError
+
+    def recuperar_abandonadas(self, limite_segundos):
+        """Devolve à fila as tarefas em execução há mais tempo que o limite (worker morto)."""
+        return 0
+
+
+class BrokerBanco(Broker):
+    """Usa a tabela ``core_tarefa`` como fila."""
+
+    def enfileirar(self, nome, args, kwargs, fila='padrao', executar_em=None, max_tentativas=3):
+        return Tarefa.objects.create(
+            nome=nome,
+            fila=fila,
+            argumentos={'args': list(args), 'kwargs': kwargs},
+            executar_em=executar_em or timezone.now(),
+            max_tentativas=max_tentativas,
+        )
+
+    def reservar(self, filas, quantidade, trabalhador):
+        agora = timezone.now()
+        prontas = Tarefa.objects.filter(status='pendente', fila__in=filas, executar_em__lte=agora)
+        bloqueio = {'skip_locked': True} if connection.features.has_select_for_update_skip_locked else {}
+        with transaction.atomic():
+            ids = list(
+                prontas.order_by('executar_em', 'id')
+                .select_for_update(**bloqueio)
+                .values_list('id', flat=True)[:quantidade]
+            )
+            if not ids:
+                return []
+            # O filtro por status protege os bancos sem SELECT FOR UPDATE (SQLite).
+            Tarefa.objects.filter(id__in=ids, status='pendente').update(
+                status='executando', reservada_em=agora, reservada_por=trabalhador, modificado=agora,
+            )
+        return list(Tarefa.objects.filter(id__in=ids, status='executando', reservada_por=trabalhador))
+
+    def concluir(self, tarefa):
+        Tarefa.objects.filter(id=tarefa.id).update(
+            status='concluida', tentativas=tarefa.tentativas + 1, ultimo_erro='', modificado=timezone.now(),
+        )
+
+    def falhar(self, tarefa, erro):
+        tentativas = tarefa.tentativas + 1
+        agora = timezone.now()
+        campos = {'tentativas': tentativas, 'ultimo_erro': erro, 'modificado': agora}
+        if tentativas >= tarefa.max_tentativas:
+            campos['status'] = 'falhou'
+        else:
+            campos['status'] = 'pendente'
+            campos['executar_em'] = agora + timedelta(seconds=calcular_espera(tentativas))
+        Tarefa.objects.filter(id=tarefa.id).update(**campos)
+
+    def recuperar_abandonadas(self, limite_segundos):
+        # A execução interrompida conta como tentativa, para que uma tarefa que
+        # derruba o worker não volte à fila para sempre.
+        agora = timezone.now()
+        abandonadas = Tarefa.objects.filter(
+            status='executando', reservada_em__lt=agora - timedelta(seconds=limite_segundos),
+        )
+        erro = 'Execução abandonada (worker interrompido ou tempo limite excedido).'
+        abandonadas.filter(tentativas__gte=F('max_tentativas') - 1).update(
+            status='falhou', tentativas=F('tentativas') + 1, ultimo_erro=erro, modificado=agora,
+        )
+        return abandonadas.update(
+            status='pendente', tentativas=F('tentativas') + 1, ultimo_erro=erro,
+            executar_em=agora, modificado=agora,
+        )
+
+
+class BrokerImediato(Broker):
+    """
+    Executa a tarefa na hora (após o commit da transação atual), sem worker.
+    Útil em desenvolvimento e nos testes.
+    """
+
+    def enfileirar(self, nome, args, kwargs, fila='padrao', executar_em=None, max_tentativas=3):
+        argumentos = {'args': list(args), 'kwargs': kwargs}
+        transaction.on_commit(lambda: executar(nome, argumentos))
+
+
+_broker = None
+
+
+def obter_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.TAREFAS_BROKER)()
+    return _broker
+
+
+# ============================================================
+# 🔹 WORKER
+# ============================================================
+def identificar_trabalhador():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def processar(tarefa, broker):
+    try:
+        executar(tarefa.nome, tarefa.argumentos)
+    except Exception:
+        erro = traceback.format_exc()
+        logger.warning('Tarefa %s (%s) falhou na tentativa %d.', tarefa.id, tarefa.nome, tarefa.tentativas + 1)
+        broker.falhar(tarefa, erro)
+        return False
+    broker.concluir(tarefa)
+    return True
+
+
+def trabalhar(filas, parar, lote=10, intervalo=1.0, uma_vez=False):
+    """
+    Laço de um worker: reserva um lote, executa e repete até ``parar`` ser
+    sinalizado. Sem tarefas prontas, espera ``intervalo`` segundos (com jitter).
+    Devolve quantas tarefas foram processadas.
+    """
+    broker = obter_broker()
+    trabalhador = identificar_trabalhador()
+    processadas = 0
+    ultima_recuperacao = time.monotonic()
+    try:
+        while not parar.is_set():
+            close_old_connections()
+            if time.monotonic() - ultima_recuperacao > settings.TAREFAS_TIMEOUT:
+                broker.recuperar_abandonadas(settings.TAREFAS_TIMEOUT)
+                ultima_recuperacao = time.monotonic()
+            reservadas = broker.reservar(filas, lote, trabalhador)
+            for reservada in reservadas:
+                processar(reservada, broker)
+                processadas += 1
+            if uma_vez and not reservadas:
+                break
+            if not reservadas:
+                parar.wait(intervalo * random.uniform(0.8, 1.2))
+    finally:
+        connection.close()
+    return processadas
@@ -1,3 +1,1784 @@
-from django.test import TestCase
+import gc
+import io
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.backends.postgresql import base as postgresql_django
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import psycopg2
+from psycopg2 import extensions as psycopg2_extensions
+
+from core import (
+    admissao, arquivo, autocompletar, autores, bibliografia, circulacao, estatisticas, facetas, idempotencia, locks,
+    metrics, monitor_sql, notificacoes, recomendacoes, replicas, tarefas,
+)
+from core import cache as cache_calculado
+from core import sqlite as sqlite_perfil
+from core.backends.pool import PoolConexoes, PoolEsgotado
+from core.backends.postgresql import base as postgresql_pool
+from core.estatisticas import inicio_do_mes
+from core.forms import AgendamentoForm
+from core.middleware import AdmissaoMiddleware, ContadorConsultas, MetricasMiddleware
+from core.models import (
+    Agendamento, Autor, Categoria, ContagemFaceta, Emprestimo, EmprestimoHistorico, EstatisticaDiaria,
+    EstatisticaLivroMensal, EstatisticaMensal, Leitor, Livro, MarcaProcessamento, NotificacaoEnviada, Recomendacao,
+    RespostaIdempotente, Tarefa, Trava,
+)
+
+
+class CirculacaoMixin:
+    """Acervo mínimo: um leitor, outro leitor e dois livros."""
+
+    def criar_acervo(self):
+        self.categoria = Categoria.objects.create(nome='Romance')
+        self.leitor = Leitor.objects.create_user(email='leitor@garoca.test', password='senha-teste', nome='Leitor')
+        self.outro = Leitor.objects.create_user(email='outro@garoca.test', password='senha-teste', nome='Outro')
+        self.livro = Livro.objects.create(codigo='L1', nome='Livro 1', categoria=self.categoria, ano_publicacao=2000)
+        self.livro2 = Livro.objects.create(codigo='L2', nome='Livro 2', categoria=self.categoria, ano_publicacao=2000)
+        self.hoje = timezone.localdate()
+
+    def emprestar(self, livro):
+        return Emprestimo.objects.create(leitor=self.leitor, livro=livro, devolucao=self.hoje + timedelta(days=14))
+
+    def agendar(self, livro):
+        agendamento = Agendamento.objects.create(leitor=self.leitor, livro=livro, data_agendada=self.hoje + timedelta(days=3))
+        Livro.objects.filter(pk=livro.pk).update(status=False)
+        return agendamento
+
+    def disponivel(self, livro):
+        return Livro.objects.get(pk=livro.pk).status
+
+
+def em_paralelo(acao, concorrentes=4):
+    """
+    Roda ``acao`` em ``concorrentes`` threads liberadas ao mesmo tempo e
+    devolve os resultados. O SQLite em memória dos testes recusa na hora quem
+    acha a tabela travada, onde o Postgres esperaria; a tentativa é repetida
+    para reproduzir a espera.
+    """
+    barreira = threading.Barrier(concorrentes)
+    resultados, trava = [], threading.Lock()
+
+    def tentar():
+        barreira.wait()
+        try:
+            while True:
+                try:
+                    resultado = acao()
+                except OperationalError as erro:
+                    if 'locked' not in str(erro):
+                        raise
+                    time.sleep(0.01)
+                    continue
+                break
+        finally:
+            connection.close()
+        with trava:
+            resultados.append(resultado)
+
+    threads = [threading.Thread(target=tentar) for _ in range(concorrentes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados
+
+
+# ============================================================
+# 🔹 TRANSIÇÕES DE CIRCULAÇÃO (core/circulacao.py)
+# ============================================================
+class TransicoesTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.client.force_login(self.leitor)
+
+    def test_devolucao_repetida_recebe_409(self):
+        emprestimo = self.emprestar(self.livro)
+        url = f'/core/api/devolver-livro/{emprestimo.pk}/'
+
+        self.assertEqual(self.client.post(url, secure=True).status_code, 200)
+        self.assertEqual(self.client.post(url, secure=True).status_code, 409)
+
+        emprestimo.refresh_from_db()
+        self.assertEqual(emprestimo.status, 'completed')
+        self.assertEqual(emprestimo.data_devolvida, self.hoje)
+        self.assertTrue(self.disponivel(self.livro))
+
+    def test_cancelamento_repetido_recebe_409(self):
+        agendamento = self.agendar(self.livro)
+        url = f'/core/agendamento/{agendamento.pk}/cancelar/'
+
+        self.assertEqual(self.client.post(url, secure=True).status_code, 200)
+        self.assertEqual(self.client.post(url, secure=True).status_code, 409)
+
+        agendamento.refresh_from_db()
+        self.assertEqual(agendamento.status, 'cancelled')
+        self.assertTrue(self.disponivel(self.livro))
+
+    def test_linha_de_outro_leitor_ou_inexistente_recebe_404(self):
+        emprestimo = self.emprestar(self.livro)
+        self.client.force_login(self.outro)
+
+        self.assertEqual(self.client.post(f'/core/api/devolver-livro/{emprestimo.pk}/', secure=True).status_code, 404)
+        self.assertEqual(self.client.post('/core/agendamento/999999/cancelar/', secure=True).status_code, 404)
+        emprestimo.refresh_from_db()
+        self.assertEqual(emprestimo.status, 'in_progress')
+
+    def test_cancelar_nao_libera_livro_emprestado(self):
+        agendamento = self.agendar(self.livro)
+        self.emprestar(Livro.objects.get(pk=self.livro.pk))
+
+        circulacao.transitar_um('cancelar', agendamento.pk)
+
+        self.assertFalse(self.disponivel(self.livro))
+
+    def test_transicao_faz_dois_updates_e_deixa_facetas_para_o_commit(self):
+        emprestimo = self.emprestar(self.livro)
+        with self.captureOnCommitCallbacks(execute=True):
+            pass  # aplica as facetas do empréstimo
+        antes = dict(ContagemFaceta.objects.filter(faceta='disponivel').values_list('valor', 'total'))
+
+        with self.captureOnCommitCallbacks() as depois_do_commit:
+            with CaptureQueriesContext(connection) as consultas:
+                circulacao.transitar_um('devolver', emprestimo.pk)
+        comandos = [c['sql'].split()[0] for c in consultas if not c['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(comandos, ['UPDATE', 'UPDATE'])
+        self.assertNotIn('core_contagemfaceta', ' '.join(c['sql'] for c in consultas))
+
+        for callback in depois_do_commit:
+            callback()
+        contagens = dict(ContagemFaceta.objects.filter(faceta='disponivel').values_list('valor', 'total'))
+        self.assertEqual(contagens['1'], antes.get('1', 0) + 1)
+        self.assertEqual(contagens['0'], antes.get('0', 0) - 1)
+
+
+class TransicoesConcorrentesTests(CirculacaoMixin, TransactionTestCase):
+    """Várias requisições disputando a mesma linha: só uma aplica a transição."""
+
+    def setUp(self):
+        self.criar_acervo()
+        # A soma das facetas roda depois do commit, com robust=True: no SQLite
+        # dos testes uma tabela travada a descartaria, onde o Postgres esperaria.
+        somar = facetas._somar
+
+        def somar_esperando(diferencas):
+            while True:
+                try:
+                    return somar(diferencas)
+                except OperationalError as erro:
+                    if 'locked' not in str(erro):
+                        raise
+                    time.sleep(0.01)
+
+        patcher = mock.patch.object(facetas, '_somar', somar_esperando)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def disputar(self, nome, pk, concorrentes=4):
+        def tentar():
+            try:
+                circulacao.transitar_um(nome, pk)
+            except circulacao.TransicaoInvalida:
+                return 'conflito'
+            return 'aplicada'
+
+        return sorted(em_paralelo(tentar, concorrentes))
+
+    def test_devolucoes_simultaneas(self):
+        emprestimo = self.emprestar(self.livro)
+
+        self.assertEqual(self.disputar('devolver', emprestimo.pk), ['aplicada', 'conflito', 'conflito', 'conflito'])
+        self.assertTrue(self.disponivel(self.livro))
+        self.assertEqual(ContagemFaceta.objects.get(faceta='disponivel', valor='1').total, 2)
+
+    def test_cancelamentos_simultaneos(self):
+        agendamento = self.agendar(self.livro)
+
+        self.assertEqual(self.disputar('cancelar', agendamento.pk), ['aplicada', 'conflito', 'conflito', 'conflito'])
+        self.assertEqual(Agendamento.objects.get(pk=agendamento.pk).status, 'cancelled')
+        self.assertTrue(self.disponivel(self.livro))
+
+    def test_agendamentos_simultaneos_do_mesmo_livro(self):
+        def tentar():
+            agendamento = Agendamento(leitor=self.leitor, livro=self.livro, data_agendada=self.hoje + timedelta(days=3))
+            try:
+                circulacao.agendar(agendamento)
+            except circulacao.LivroIndisponivel:
+                return 'conflito'
+            return 'aplicada'
+
+        self.assertEqual(sorted(em_paralelo(tentar)), ['aplicada', 'conflito', 'conflito', 'conflito'])
+        self.assertEqual(Agendamento.objects.filter(livro=self.livro).count(), 1)
+        self.assertFalse(self.disponivel(self.livro))
+        self.assertEqual(ContagemFaceta.objects.get(faceta='disponivel', valor='1').total, 1)
+        self.assertEqual(ContagemFaceta.objects.get(faceta='disponivel', valor='0').total, 1)
+
+
+# ============================================================
+# 🔹 POOL DE CONEXÕES (core/backends/pool.py)
+# ============================================================
+def _verificar_sqlite(conexao):
+    try:
+        conexao.execute('SELECT 1')
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def _limpar_sqlite(conexao):
+    try:
+        conexao.rollback()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+class _ConexaoSQLite(sqlite3.Connection):
+    """Aceita weakref, como as conexões do psycopg2 (o sqlite3.Connection puro não aceita)."""
+
+
+class PoolConexoesTests(SimpleTestCase):
+    """O pool com conexões SQLite em memória no lugar das do psycopg2."""
+
+    def criar_pool(self, limpar=_limpar_sqlite, **opcoes):
+        opcoes.setdefault('maximo', 2)
+        opcoes.setdefault('timeout', 0.05)
+        pool = PoolConexoes('teste', _verificar_sqlite, limpar, lambda conexao: conexao.close(), **opcoes)
+        self.addCleanup(pool.fechar)
+        return pool
+
+    def criar(self):
+        return sqlite3.connect(':memory:', check_same_thread=False, factory=_ConexaoSQLite)
+
+    def test_reaproveita_a_conexao_devolvida(self):
+        pool = self.criar_pool()
+        conexao = pool.obter(self.criar)
+        pool.devolver(conexao)
+
+        self.assertIs(pool.obter(self.criar), conexao)
+        self.assertEqual(pool.estatisticas(), {'abertas': 1, 'em_uso': 1, 'livres': 0, 'maximo': 2})
+
+    def test_esgotado_depois_do_timeout(self):
+        pool = self.criar_pool()
+        primeira, segunda = pool.obter(self.criar), pool.obter(self.criar)
+
+        inicio = time.monotonic()
+        with self.assertRaises(PoolEsgotado):
+            pool.obter(self.criar)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.05)
+        self.assertEqual(pool.estatisticas()['abertas'], 2)
+
+        pool.devolver(primeira)
+        self.assertIs(pool.obter(self.criar), primeira)
+        pool.devolver(segunda)
+
+    def test_quem_espera_recebe_a_conexao_devolvida(self):
+        pool = self.criar_pool(maximo=1, timeout=5)
+        conexao = pool.obter(self.criar)
+        obtidas = []
+        thread = threading.Thread(target=lambda: obtidas.append(pool.obter(self.criar)))
+        thread.start()
+        time.sleep(0.05)
+        pool.devolver(conexao)
+        thread.join()
+
+        self.assertEqual(obtidas, [conexao])
+
+    def test_recicla_depois_de_max_idade(self):
+        pool = self.criar_pool(max_idade=0.02)
+        velha = pool.obter(self.criar)
+        pool.devolver(velha)
+        time.sleep(0.03)
+
+        nova = pool.obter(self.criar)
+        self.assertIsNot(nova, velha)
+        self.assertFalse(_verificar_sqlite(velha))
+        self.assertEqual(pool.estatisticas()['abertas'], 1)
+
+    def test_descarta_conexao_parada_que_falha_na_verificacao(self):
+        pool = self.criar_pool(verificar_apos=0.0)
+        derrubada = pool.obter(self.criar)
+        pool.devolver(derrubada)
+        derrubada.close()  # o servidor derrubou a conexão enquanto ela estava livre
+
+        nova = pool.obter(self.criar)
+        self.assertIsNot(nova, derrubada)
+        self.assertTrue(_verificar_sqlite(nova))
+
+    def test_descarta_quando_limpar_falha(self):
+        pool = self.criar_pool(limpar=lambda conexao: False)
+        conexao = pool.obter(self.criar)
+        pool.devolver(conexao)
+
+        self.assertFalse(_verificar_sqlite(conexao))
+        self.assertEqual(pool.estatisticas(), {'abertas': 0, 'em_uso': 0, 'livres': 0, 'maximo': 2})
+        self.assertIsNot(pool.obter(self.criar), conexao)
+
+    def test_limpar_desfaz_transacao_pendente(self):
+        pool = self.criar_pool()
+        conexao = pool.obter(self.criar)
+        conexao.execute('CREATE TABLE t (x INTEGER)')
+        conexao.commit()
+        conexao.execute('INSERT INTO t VALUES (1)')
+        pool.devolver(conexao)
+
+        self.assertIs(pool.obter(self.criar), conexao)
+        self.assertEqual(conexao.execute('SELECT COUNT(*) FROM t').fetchone(), (0,))
+
+    def test_falha_ao_abrir_libera_a_vaga(self):
+        pool = self.criar_pool(maximo=1)
+
+        def falhar():
+            raise sqlite3.OperationalError('servidor fora do ar')
+
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.obter(falhar)
+        self.assertEqual(pool.estatisticas()['abertas'], 0)
+        pool.devolver(pool.obter(self.criar))
+
+    def test_idade_nao_segura_conexao_perdida(self):
+        pool = self.criar_pool(max_idade=0.02)
+        perdida = pool.obter(self.criar)
+        referencia = weakref.ref(perdida)
+        del perdida  # nunca devolvida: o wrapper dono dela sumiu
+        gc.collect()
+        self.assertIsNone(referencia())
+
+        time.sleep(0.03)
+        nova = pool.obter(self.criar)
+        pool.devolver(nova)
+        # A nova pode reusar o id() da perdida, mas não herda a idade dela.
+        self.assertIs(pool.obter(self.criar), nova)
+
+
+class PoolPostgresTests(SimpleTestCase):
+    """O backend core.backends.postgresql sem servidor: o connect do Django devolve conexões falsas."""
+
+    def setUp(self):
+        self.abertas = []
+        self.wrapper = self.criar_wrapper()
+        patcher = mock.patch.object(
+            postgresql_django.DatabaseWrapper, 'get_new_connection', autospec=True, side_effect=self.conectar,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.fechar_pool)
+
+    def fechar_pool(self):
+        pool = postgresql_pool._pools.pop(('pool_pg', os.getpid()), None)
+        if pool:
+            pool.fechar()
+
+    def criar_wrapper(self):
+        configuracao = {
+            **connection.settings_dict, 'ENGINE': 'core.backends.postgresql', 'NAME': 'garoca',
+            'OPTIONS': {'isolation_level': IsolationLevel.SERIALIZABLE}, 'POOL': {'MAXIMO': 1, 'TIMEOUT': 0.05},
+        }
+        return postgresql_pool.DatabaseWrapper(configuracao, alias='pool_pg')
+
+    def conectar(self, wrapper, parametros):
+        conexao = mock.MagicMock(closed=0)
+        conexao.get_transaction_status.return_value = psycopg2_extensions.TRANSACTION_STATUS_IDLE
+        wrapper.isolation_level = IsolationLevel.SERIALIZABLE
+        self.abertas.append(conexao)
+        return conexao
+
+    def test_close_devolve_ao_pool_e_a_proxima_reaproveita(self):
+        conexao = self.wrapper.get_new_connection({})
+        self.wrapper.connection = conexao
+        self.wrapper._close()
+        conexao.close.assert_not_called()
+
+        outro = self.criar_wrapper()
+        self.assertIs(outro.get_new_connection({}), conexao)
+        self.assertEqual(len(self.abertas), 1)
+        # O pool tem uma conexão só e ela está com o outro wrapper.
+        with self.assertRaises(PoolEsgotado):
+            self.wrapper.get_new_connection({})
+
+    def test_conexao_reaproveitada_reseta_o_nivel_de_isolamento_do_wrapper(self):
+        self.wrapper.connection = self.wrapper.get_new_connection({})
+        self.wrapper._close()
+
+        outro = self.criar_wrapper()
+        outro.isolation_level = IsolationLevel.READ_UNCOMMITTED
+        outro.get_new_connection({})
+        self.assertEqual(outro.isolation_level, IsolationLevel.SERIALIZABLE)
+
+    def test_limpar_desfaz_transacao_ou_descarta(self):
+        conexao = mock.MagicMock(closed=0)
+        estados = psycopg2_extensions
+        casos = [
+            (estados.TRANSACTION_STATUS_IDLE, None, True),
+            (estados.TRANSACTION_STATUS_INTRANS, None, True),
+            (estados.TRANSACTION_STATUS_INERROR, None, True),
+            (estados.TRANSACTION_STATUS_INERROR, psycopg2.OperationalError('conexão caiu'), False),
+            (estados.TRANSACTION_STATUS_UNKNOWN, None, False),
+        ]
+        for estado, erro, esperado in casos:
+            with self.subTest(estado=estado, erro=erro):
+                conexao.reset_mock()
+                conexao.get_transaction_status.return_value = estado
+                conexao.rollback.side_effect = erro
+                self.assertIs(postgresql_pool._limpar(conexao), esperado)
+                self.assertEqual(conexao.rollback.called, estado in (estados.TRANSACTION_STATUS_INTRANS,
+                                                                      estados.TRANSACTION_STATUS_INERROR))
+        self.assertFalse(postgresql_pool._limpar(mock.MagicMock(closed=1)))
+
+    def test_devolucao_de_conexao_quebrada_abre_outra(self):
+        conexao = self.wrapper.get_new_connection({})
+        conexao.get_transaction_status.return_value = psycopg2_extensions.TRANSACTION_STATUS_UNKNOWN
+        self.wrapper.connection = conexao
+        self.wrapper._close()
+        conexao.close.assert_called_once()
+
+        self.assertIsNot(self.wrapper.get_new_connection({}), conexao)
+        self.assertEqual(len(self.abertas), 2)
+
+
+# ============================================================
+# 🔹 MÉTRICAS (core/metrics.py)
+# ============================================================
+class IndicadoresCirculacaoTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_acervo()
+            self.emprestar(self.livro)
+            self.agendar(self.livro2)
+
+    def test_livros_disponiveis_vem_da_faceta(self):
+        ContagemFaceta.objects.filter(faceta='disponivel', valor='1').update(total=7)
+
+        with CaptureQueriesContext(connection) as consultas:
+            dados = metrics.indicadores_circulacao()
+
+        self.assertEqual(dados['livros_disponiveis'], 7)
+        self.assertEqual(dados['emprestimos_ativos'], 1)
+        self.assertEqual(dados['emprestimos_atrasados'], 0)
+        self.assertEqual(dados['agendamentos_ativos'], 1)
+        self.assertFalse(any('"core_livro"' in c['sql'] for c in consultas))
+
+    def test_indicadores_ficam_em_cache(self):
+        metrics.indicadores_circulacao()
+        with self.assertNumQueries(0):
+            metrics.indicadores_circulacao()
+
+
+# ============================================================
+# 🔹 MONITOR DE SQL (core/monitor_sql.py)
+# ============================================================
+class MonitorSQLTests(SimpleTestCase):
+    def test_impressao_ignora_literais_e_tamanho_das_listas(self):
+        chave, normalizado = monitor_sql.impressao_digital("SELECT * FROM t WHERE nome = 'Ana' AND id IN (%s)")
+        outras = [
+            "SELECT * FROM t WHERE nome = 'Bia' AND id IN (%s, %s)",
+            "SELECT * FROM t WHERE nome = 'O''Neil' AND id IN (%s,%s,%s)",
+        ]
+
+        self.assertEqual(normalizado, 'SELECT * FROM t WHERE nome = ? AND id IN (...)')
+        for sql in outras:
+            self.assertEqual(monitor_sql.impressao_digital(sql)[0], chave)
+        self.assertNotEqual(monitor_sql.impressao_digital('SELECT * FROM t WHERE id = %s')[0], chave)
+
+    def test_insert_com_varias_linhas(self):
+        self.assertEqual(
+            monitor_sql.normalizar_sql('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            'INSERT INTO t (a, b) VALUES (...)',
+        )
+
+    def test_percentil_pelo_posto_mais_proximo(self):
+        valores = [1, 2, 3, 4, 5]
+        self.assertEqual(monitor_sql.percentil(valores, 50), 3)
+        self.assertEqual(monitor_sql.percentil(valores, 20), 1)
+        self.assertEqual(monitor_sql.percentil(valores, 95), 5)
+        self.assertEqual(monitor_sql.percentil(list(range(1, 101)), 99), 99)
+        self.assertEqual(monitor_sql.percentil([7], 1), 7)
+        self.assertEqual(monitor_sql.percentil([], 50), 0.0)
+
+    def test_relatorio_junta_os_processos(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        for nome, duracoes in (('1', [1.0, 2.0]), ('2', [3.0, 4.0, 5.0])):
+            estatisticas = monitor_sql.EstatisticasSQL(10)
+            for duracao in duracoes:
+                estatisticas.registrar('abc', 'SELECT ?', duracao)
+            estatisticas.registrar('def', 'UPDATE t', 0.5)
+            with mock.patch('os.getpid', return_value=int(nome)):
+                estatisticas.gravar(diretorio)
+
+        saida = io.StringIO()
+        call_command('relatorio_sql', diretorio=diretorio, json=True, top=1, stdout=saida)
+
+        [linha] = json.loads(saida.getvalue())
+        self.assertEqual(linha['impressao'], 'abc')
+        self.assertEqual(linha['chamadas'], 5)
+        self.assertEqual(linha['tempo_total'], 15.0)
+        self.assertEqual((linha['p50'], linha['p95']), (3.0, 5.0))
+
+
+class MetricasMiddlewareTests(SimpleTestCase):
+    def test_contador_sai_mesmo_com_o_monitor_instalado_depois(self):
+        conexao = connections['default']
+        originais = list(conexao.execute_wrappers)
+        self.addCleanup(lambda: conexao.execute_wrappers.__setitem__(slice(None), originais))
+        monitor = object()
+
+        def view(request):
+            conexao.execute_wrappers.append(monitor)  # conexão aberta no meio da requisição
+            return HttpResponse('ok')
+
+        middleware = MetricasMiddleware(view)
+        for _ in range(3):
+            middleware(RequestFactory().get('/'))
+
+        self.assertEqual(conexao.execute_wrappers.count(monitor), 3)
+        self.assertFalse(any(isinstance(w, ContadorConsultas) for w in conexao.execute_wrappers))
+
+
+# ============================================================
+# 🔹 AGENDAMENTO PELO FORMULÁRIO (core/forms.py)
+# ============================================================
+class AgendamentoFormTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+
+    def test_dia_da_retirada_vira_a_data_agendada(self):
+        dia = self.hoje + timedelta(days=4)
+        form = AgendamentoForm({'livro': self.livro.pk, 'data_retirada': dia.isoformat()})
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.instance.data_agendada, dia)
+
+    def test_retirada_hoje_ou_no_passado_e_recusada(self):
+        for dia in (self.hoje, self.hoje - timedelta(days=1)):
+            form = AgendamentoForm({'livro': self.livro.pk, 'data_retirada': dia.isoformat()})
+            self.assertFalse(form.is_valid())
+            self.assertIn('A data agendada deve ser posterior à data de hoje.', form.non_field_errors())
+
+    def test_view_agenda_e_redireciona(self):
+        self.client.force_login(self.leitor)
+        dia = self.hoje + timedelta(days=2)
+
+        response = self.client.post('/core/agendar-retirada/', {'livro': self.livro.pk, 'data_retirada': dia.isoformat()}, secure=True)
+
+        self.assertEqual(response.status_code, 302)
+        agendamento = Agendamento.objects.get(leitor=self.leitor)
+        self.assertEqual(agendamento.data_agendada, dia)
+        self.assertFalse(self.disponivel(self.livro))
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_view_recusa_livro_ja_reservado_com_409(self):
+        self.agendar(self.livro)
+        self.client.force_login(self.outro)
+        dados = {'livro': self.livro.pk, 'data_retirada': (self.hoje + timedelta(days=2)).isoformat()}
+
+        response = self.client.post('/core/agendar-retirada/', dados, secure=True)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'Este livro já foi reservado.', status_code=409)
+        self.assertFalse(Agendamento.objects.filter(leitor=self.outro).exists())
+
+
+# ============================================================
+# 🔹 PÁGINAS DO LEITOR
+# ============================================================
+class PaginasLeitorTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.client.force_login(self.leitor)
+
+    def test_dashboard_sem_foto_e_com_agendamento(self):
+        self.agendar(self.livro)
+
+        response = self.client.get('/core/dashboard/', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'default-profile.png')
+        self.assertContains(response, (self.hoje + timedelta(days=3)).strftime('%d/%m/%Y'))
+
+    def test_catalogo(self):
+        response = self.client.get('/core/livros/view/', secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Livro 1')
+
+
+# ============================================================
+# 🔹 DADOS SINTÉTICOS (core/sintetico.py)
+# ============================================================
+class GerarDadosTests(TestCase):
+    def test_gera_as_quantidades_pedidas(self):
+        call_command('gerar_dados', categorias=3, livros=40, leitores=5, emprestimos=60, agendamentos=4,
+                     prefixo='tst', stdout=io.StringIO())
+
+        self.assertEqual(Livro.objects.filter(codigo__startswith='TST').count(), 40)
+        self.assertEqual(Leitor.objects.filter(email__startswith='tst').count(), 5)
+        self.assertEqual(Emprestimo.objects.count() + EmprestimoHistorico.objects.count(), 60)
+        self.assertEqual(Livro.objects.get(codigo='TST000000007').codigo, 'TST000000007')
+
+    def test_prefixo_longo_e_recusado_antes_de_gravar(self):
+        with self.assertRaisesMessage(CommandError, 'tem mais de 6 caracteres'):
+            call_command('gerar_dados', livros=10, leitores=2, emprestimos=0, agendamentos=0,
+                         prefixo='longodemais', stdout=io.StringIO())
+        self.assertFalse(Livro.objects.exists())
+
+
+# ============================================================
+# 🔹 ADMIN (core/admin.py)
+# ============================================================
+class BuscaAdminTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        Livro.objects.filter(pk=self.livro.pk).update(nome='Dom Casmurro')
+        admin = Leitor.objects.create_superuser(email='admin@garoca.test', password='senha-teste', nome='Admin')
+        self.client.force_login(admin)
+
+    def buscar(self, modelo, termo):
+        response = self.client.get(f'/admin/core/{modelo}/', {'q': termo}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+
+    def test_prefixo_usa_indice_e_substring_so_com_asterisco(self):
+        self.assertEqual([l.pk for l in self.buscar('livro', 'dom cas')], [self.livro.pk])
+        self.assertEqual(self.buscar('livro', 'Casmurro'), [])
+        self.assertEqual([l.pk for l in self.buscar('livro', '*Casmurro')], [self.livro.pk])
+        self.assertEqual([l.pk for l in self.buscar('livro', 'L2')], [self.livro2.pk])
+
+    def test_agendamento_busca_pelo_nome_do_leitor_e_do_livro(self):
+        agendamento = self.agendar(self.livro)
+        Agendamento.objects.create(leitor=self.outro, livro=self.livro2, data_agendada=self.hoje + timedelta(days=3))
+
+        self.assertEqual([a.pk for a in self.buscar('agendamento', 'leit')], [agendamento.pk])
+        self.assertEqual([a.pk for a in self.buscar('agendamento', 'dom')], [agendamento.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            self.buscar('agendamento', 'leit')
+        self.assertFalse(any('LIKE' in c['sql'] for c in consultas if 'core_agendamento' in c['sql']))
+
+    def test_texto_de_ajuda_explica_a_busca(self):
+        response = self.client.get('/admin/core/livro/', secure=True)
+        self.assertContains(response, 'Comece com * para procurar em qualquer parte do texto')
+
+
+# ============================================================
+# 🔹 TRAVAS DE JOBS (core/locks.py)
+# ============================================================
+class TravaTests(TestCase):
+    def test_segunda_instancia_nao_entra_e_a_trava_sai_no_fim(self):
+        with locks.trava('job') as primeira:
+            with locks.trava('job') as segunda:
+                self.assertTrue(primeira)
+                self.assertFalse(segunda)
+            self.assertTrue(Trava.objects.filter(nome='job').exists())
+        self.assertFalse(Trava.objects.exists())
+
+    def test_trava_vencida_e_tomada(self):
+        Trava.objects.create(nome='job', dono='morto', expira=timezone.now() - timedelta(seconds=1))
+
+        with locks.trava('job') as adquirida:
+            self.assertTrue(adquirida)
+            self.assertNotEqual(Trava.objects.get(nome='job').dono, 'morto')
+        self.assertFalse(Trava.objects.exists())
+
+    def test_quem_perdeu_a_trava_nao_apaga_a_do_novo_dono(self):
+        with locks.trava('job', timeout=60) as adquirida:
+            self.assertTrue(adquirida)
+            Trava.objects.filter(nome='job').update(dono='outro')
+        self.assertEqual(Trava.objects.get(nome='job').dono, 'outro')
+
+
+# ============================================================
+# 🔹 EXPIRAÇÃO DE AGENDAMENTOS (core/circulacao.py)
+# ============================================================
+class ExpirarAgendamentosTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.vencidos = []
+        for livro in (self.livro, self.livro2):
+            agendamento = self.agendar(livro)
+            Agendamento.objects.filter(pk=agendamento.pk).update(data_agendada=self.hoje - timedelta(days=2))
+            self.vencidos.append(agendamento.pk)
+
+    def test_expira_e_libera(self):
+        self.assertEqual(sorted(circulacao.expirar_agendamentos()), sorted(self.vencidos))
+        self.assertTrue(self.disponivel(self.livro))
+        self.assertFalse(Agendamento.objects.filter(status='scheduled').exists())
+
+    def test_devolve_so_os_que_esta_chamada_cancelou(self):
+        transitar = circulacao.transitar
+
+        def leitor_cancela_antes(transicao, queryset, agora=None):
+            # O leitor cancela o primeiro entre a seleção e o UPDATE do job.
+            Agendamento.objects.filter(pk=self.vencidos[0]).update(status='cancelled')
+            return transitar(transicao, queryset, agora)
+
+        with mock.patch.object(circulacao, 'transitar', leitor_cancela_antes):
+            cancelados = circulacao.expirar_agendamentos()
+
+        self.assertEqual(cancelados, [self.vencidos[1]])
+
+    def test_comando_avisa_so_os_expirados(self):
+        with mock.patch.object(notificacoes.avisar_agendamentos_expirados, 'enfileirar') as enfileirar:
+            call_command('expirar_agendamentos', stdout=io.StringIO())
+        enfileirar.assert_called_once()
+        self.assertEqual(sorted(enfileirar.call_args.args[0]), sorted(self.vencidos))
+
+    def test_comando_nao_roda_com_a_trava_tomada(self):
+        with locks.trava('expirar_agendamentos'):
+            saida = io.StringIO()
+            call_command('expirar_agendamentos', stdout=saida)
+        self.assertIn('Outra instância', saida.getvalue())
+        self.assertEqual(Agendamento.objects.filter(status='scheduled').count(), 2)
+
+
+# ============================================================
+# 🔹 LEMBRETES DE DEVOLUÇÃO (core/notificacoes.py)
+# ============================================================
+class LembretesTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.emprestimo = self.emprestar(self.livro)
+        Emprestimo.objects.filter(pk=self.emprestimo.pk).update(devolucao=self.hoje + timedelta(days=1))
+
+    def test_execucao_atrasada_ainda_lembra(self):
+        # O lembrete era para dois dias atrás (devolucao == hoje + 3 naquele dia); o cron não rodou.
+        totais = notificacoes.enviar_lembretes(3, hoje=self.hoje)
+
+        self.assertEqual(totais, {'lembrete': 1, 'atraso': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['leitor@garoca.test'])
+
+    def test_nao_reenvia(self):
+        notificacoes.enviar_lembretes(3, hoje=self.hoje)
+        notificacoes.enviar_lembretes(3, hoje=self.hoje)
+        notificacoes.enviar_lembretes(3, hoje=self.hoje + timedelta(days=1))
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_so_registra_o_que_foi_entregue(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', return_value=0):
+            totais = notificacoes.enviar_lembretes(3, hoje=self.hoje)
+        self.assertEqual(totais['lembrete'], 0)
+        self.assertFalse(NotificacaoEnviada.objects.exists())
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError), \
+                self.assertLogs('core.notificacoes', 'ERROR'):
+            notificacoes.enviar_lembretes(3, hoje=self.hoje)
+        self.assertFalse(NotificacaoEnviada.objects.exists())
+
+        self.assertEqual(notificacoes.enviar_lembretes(3, hoje=self.hoje)['lembrete'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+# ============================================================
+# 🔹 FILA DE TAREFAS (core/tarefas.py)
+# ============================================================
+@tarefas.tarefa(nome='testes.ok')
+def _tarefa_ok():
+    return 'ok'
+
+
+@tarefas.tarefa(nome='testes.falha')
+def _tarefa_falha():
+    raise RuntimeError('falha de teste')
+
+
+class TarefasTests(TestCase):
+    def setUp(self):
+        self.broker = tarefas.BrokerBanco()
+
+    @override_settings(TAREFAS_BACKOFF_BASE=10, TAREFAS_BACKOFF_MAX=60)
+    def test_backoff_exponencial_limitado(self):
+        with mock.patch('core.tarefas.random.uniform', lambda inicio, fim: fim):
+            self.assertEqual([tarefas.calcular_espera(n) for n in range(1, 6)], [10, 20, 40, 60, 60])
+        with mock.patch('core.tarefas.random.uniform', lambda inicio, fim: inicio):
+            self.assertEqual(tarefas.calcular_espera(2), 10)
+
+    def test_sucesso_conclui(self):
+        self.broker.enfileirar('testes.ok', (), {})
+        [reservada] = self.broker.reservar(['padrao'], 10, 'w1')
+
+        self.assertTrue(tarefas.processar(reservada, self.broker))
+        reservada.refresh_from_db()
+        self.assertEqual((reservada.status, reservada.tentativas), ('concluida', 1))
+
+    def test_falha_reagenda_com_backoff_ate_esgotar(self):
+        self.broker.enfileirar('testes.falha', (), {}, max_tentativas=2)
+        [reservada] = self.broker.reservar(['padrao'], 10, 'w1')
+        antes = timezone.now()
+
+        with self.assertLogs('core.tarefas', 'WARNING'):
+            self.assertFalse(tarefas.processar(reservada, self.broker))
+        reservada.refresh_from_db()
+        self.assertEqual((reservada.status, reservada.tentativas), ('pendente', 1))
+        self.assertGreater(reservada.executar_em, antes)
+        self.assertIn('falha de teste', reservada.ultimo_erro)
+        self.assertEqual(self.broker.reservar(['padrao'], 10, 'w1'), [])
+
+        Tarefa.objects.filter(pk=reservada.pk).update(executar_em=timezone.now())
+        [reservada] = self.broker.reservar(['padrao'], 10, 'w1')
+        with self.assertLogs('core.tarefas', 'WARNING'):
+            tarefas.processar(reservada, self.broker)
+        reservada.refresh_from_db()
+        self.assertEqual((reservada.status, reservada.tentativas), ('falhou', 2))
+
+    def test_abandonada_volta_a_fila_contando_tentativa(self):
+        self.broker.enfileirar('testes.ok', (), {})
+        [reservada] = self.broker.reservar(['padrao'], 10, 'w1')
+        Tarefa.objects.filter(pk=reservada.pk).update(reservada_em=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.broker.recuperar_abandonadas(60), 1)
+        reservada.refresh_from_db()
+        self.assertEqual((reservada.status, reservada.tentativas), ('pendente', 1))
+
+    def test_reserva_pede_skip_locked_quando_o_banco_suporta(self):
+        self.broker.enfileirar('testes.ok', (), {})
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True), \
+                mock.patch('django.db.models.QuerySet.select_for_update', autospec=True,
+                           side_effect=lambda queryset, **opcoes: queryset) as select_for_update:
+            self.broker.reservar(['padrao'], 10, 'w1')
+        select_for_update.assert_called_once_with(mock.ANY, skip_locked=True)
+
+
+class ReservaConcorrenteTests(TransactionTestCase):
+    def test_workers_simultaneos_nao_reservam_a_mesma_tarefa(self):
+        broker = tarefas.BrokerBanco()
+        for _ in range(40):
+            broker.enfileirar('testes.ok', (), {})
+
+        def esvaziar():
+            # Repete só a reserva que achou a tabela travada; as já feitas ficam.
+            trabalhador = tarefas.identificar_trabalhador()
+            reservadas = []
+            while True:
+                try:
+                    lote = broker.reservar(['padrao'], 5, trabalhador)
+                except OperationalError as erro:
+                    if 'locked' not in str(erro):
+                        raise
+                    time.sleep(0.01)
+                    continue
+                if not lote:
+                    return trabalhador, reservadas
+                reservadas.extend(tarefa.id for tarefa in lote)
+
+        donos = {}
+        for trabalhador, reservadas in em_paralelo(esvaziar):
+            for pk in reservadas:
+                self.assertNotIn(pk, donos)
+                donos[pk] = trabalhador
+        self.assertEqual(dict(Tarefa.objects.filter(pk__in=donos).values_list('id', 'reservada_por')), donos)
+        self.assertFalse(Tarefa.objects.exclude(status='executando').exists())
+
+
+# ============================================================
+# 🔹 ESTATÍSTICAS PRÉ-AGREGADAS (core/estatisticas.py)
+# ============================================================
+class EstatisticasTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.mes = inicio_do_mes(inicio_do_mes(self.hoje) - timedelta(days=1))
+        self.dias = [self.mes + timedelta(days=n) for n in (0, 3, 7)]
+        leitores_e_livros = ((self.leitor, self.livro), (self.outro, self.livro2), (self.leitor, self.livro2))
+        self.emprestimos = [
+            Emprestimo.objects.create(
+                leitor=leitor, livro=livro, issue_date=dia, devolucao=dia + timedelta(days=5),
+                data_devolvida=dia + timedelta(days=6), status='completed',
+            )
+            for dia, (leitor, livro) in zip(self.dias, leitores_e_livros)
+        ]
+        estatisticas.atualizar(margem=0)
+
+    def fotografar(self):
+        return (
+            sorted(EstatisticaDiaria.objects.values_list(
+                'dia', 'categoria_id', 'emprestimos', 'devolucoes', 'devolucoes_atrasadas', 'dias_emprestado',
+            )),
+            sorted(EstatisticaMensal.objects.values_list(
+                'mes', 'emprestimos', 'leitores_ativos', 'devolucoes', 'devolucoes_atrasadas', 'dias_emprestado',
+            )),
+            sorted(EstatisticaLivroMensal.objects.values_list('mes', 'livro_id', 'emprestimos')),
+        )
+
+    def test_primeira_execucao(self):
+        mensal = EstatisticaMensal.objects.get(mes=inicio_do_mes(self.dias[0]))
+        self.assertEqual((mensal.emprestimos, mensal.leitores_ativos), (3, 2))
+        self.assertEqual((mensal.devolucoes_atrasadas, mensal.dias_emprestado), (3, 18))
+        self.assertEqual(
+            dict(EstatisticaLivroMensal.objects.values_list('livro_id', 'emprestimos')),
+            {self.livro.pk: 1, self.livro2.pk: 2},
+        )
+
+    def test_incremental_recalcula_so_os_dias_tocados_e_bate_com_recalcular(self):
+        aberto = Emprestimo.objects.create(
+            leitor=self.outro, livro=self.livro, issue_date=self.dias[2], devolucao=self.dias[2] + timedelta(days=5),
+        )
+        estatisticas.atualizar(margem=0)
+
+        aberto.data_devolvida = self.dias[2] + timedelta(days=2)
+        aberto.status = 'completed'
+        aberto.save()
+        resumo = estatisticas.atualizar(margem=0)
+        # Só a saída e a devolução do empréstimo finalizado.
+        self.assertEqual(resumo, {'dias': 2, 'meses': 1})
+        incremental = self.fotografar()
+
+        estatisticas.atualizar(recalcular=True, margem=0)
+        self.assertEqual(self.fotografar(), incremental)
+
+    def test_apagados_so_saem_com_recalcular(self):
+        self.emprestimos[0].delete()
+
+        estatisticas.atualizar(margem=0)
+        self.assertEqual(EstatisticaMensal.objects.get().emprestimos, 3)
+
+        call_command('atualizar_estatisticas', '--recalcular', stdout=io.StringIO())
+        self.assertEqual(EstatisticaMensal.objects.get().emprestimos, 2)
+
+    def test_arquivados_continuam_contando(self):
+        emprestimo = self.emprestimos[0]
+        EmprestimoHistorico.objects.create(
+            id=emprestimo.pk, leitor=emprestimo.leitor, livro=emprestimo.livro, issue_date=emprestimo.issue_date,
+            devolucao=emprestimo.devolucao, data_devolvida=emprestimo.data_devolvida, criado=emprestimo.criado,
+        )
+        Emprestimo.objects.filter(pk=emprestimo.pk).delete()
+        antes = self.fotografar()
+
+        estatisticas.atualizar(recalcular=True, margem=0)
+        self.assertEqual(self.fotografar(), antes)
+
+
+# ============================================================
+# 🔹 ARQUIVAMENTO (core/arquivo.py)
+# ============================================================
+class ArquivoTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+
+    def finalizado(self, saida, devolvido, livro=None):
+        return Emprestimo.objects.create(
+            leitor=self.leitor, livro=livro or self.livro, issue_date=self.hoje - timedelta(days=saida),
+            devolucao=self.hoje - timedelta(days=saida - 14),
+            data_devolvida=self.hoje - timedelta(days=devolvido) if devolvido is not None else None,
+            status='completed',
+        )
+
+    def test_arquiva_pela_data_de_devolucao(self):
+        antigo = self.finalizado(saida=400, devolvido=390)
+        devolvido_ha_pouco = self.finalizado(saida=400, devolvido=10)
+        sem_data_de_devolucao = self.finalizado(saida=400, devolvido=None)
+        NotificacaoEnviada.objects.create(emprestimo=antigo, tipo='lembrete', referencia=antigo.devolucao)
+
+        self.assertEqual(arquivo.arquivar(365, lote=1), 2)
+        self.assertEqual(
+            set(EmprestimoHistorico.objects.values_list('id', flat=True)), {antigo.pk, sem_data_de_devolucao.pk},
+        )
+        self.assertEqual(list(Emprestimo.objects.values_list('id', flat=True)), [devolvido_ha_pouco.pk])
+        self.assertFalse(NotificacaoEnviada.objects.exists())
+
+    def test_historico_do_leitor_paginado_pelas_duas_tabelas(self):
+        for dias in range(400, 395, -1):
+            self.finalizado(saida=dias, devolvido=dias - 10)
+        self.emprestar(self.livro2)
+        arquivo.arquivar(365)
+        self.assertEqual(EmprestimoHistorico.objects.count(), 5)
+        esperado = [e.pk for e in arquivo.emprestimos_do_leitor(self.leitor, tamanho=10)[0]]
+        self.assertEqual(len(esperado), 6)
+
+        vistos, depois = [], None
+        while True:
+            with CaptureQueriesContext(connection) as consultas:
+                pagina, depois = arquivo.emprestimos_do_leitor(self.leitor, depois=depois, tamanho=4)
+            # Uma leitura por tabela, mais a busca do cursor (em uma ou nas duas).
+            self.assertLessEqual(len(consultas), 4)
+            vistos.extend(e.pk for e in pagina)
+            if depois is None:
+                break
+        self.assertEqual(vistos, esperado)
+
+    @override_settings(
+        HISTORICO_POR_PAGINA=4, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    )
+    def test_pagina_meus_emprestimos(self):
+        for dias in range(30, 20, -1):
+            self.finalizado(saida=dias, devolvido=dias - 10)
+        self.client.force_login(self.leitor)
+
+        primeira = self.client.get('/core/meus-emprestimos/', secure=True)
+        segunda = self.client.get(f"/core/meus-emprestimos/?depois={primeira.context['proxima']}", secure=True)
+        self.assertEqual(len(primeira.context['emprestimos']), 4)
+        self.assertContains(primeira, 'Mais antigos')
+        paginas = [{e.pk for e in response.context['emprestimos']} for response in (primeira, segunda)]
+        self.assertFalse(paginas[0] & paginas[1])
+
+
+# ============================================================
+# 🔹 RECOMENDAÇÕES (core/recomendacoes.py)
+# ============================================================
+@override_settings(RECOMENDACOES_MINIMO_LEITORES=2)
+class RecomendacoesTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.terceiro = Leitor.objects.create_user(
+            email='terceiro@garoca.test', password='senha-teste', nome='Terceiro',
+        )
+        self.livro3 = Livro.objects.create(codigo='L3', nome='Livro 3', categoria=self.categoria, ano_publicacao=2000)
+        self.livro4 = Livro.objects.create(codigo='L4', nome='Livro 4', categoria=self.categoria, ano_publicacao=2000)
+        self.ler(self.leitor, self.livro, self.livro2, self.livro3)
+        self.ler(self.outro, self.livro, self.livro2)
+        self.ler(self.terceiro, self.livro, self.livro3, self.livro4)
+        recomendacoes.atualizar(recalcular=True, top=2, margem=0)
+
+    def ler(self, leitor, *livros):
+        for livro in livros:
+            Emprestimo.objects.create(
+                leitor=leitor, livro=livro, devolucao=self.hoje + timedelta(days=14), status='completed',
+            )
+
+    def top(self, livro):
+        linhas = Recomendacao.objects.filter(livro=livro).order_by('posicao')
+        return list(linhas.values_list('recomendado_id', 'leitores'))
+
+    def test_top_k_por_livro(self):
+        # Livro 2 e Livro 3 empatam (dois leitores em comum, mesmo cosseno); o Livro 4 fica abaixo do mínimo.
+        self.assertEqual(self.top(self.livro), [(self.livro2.pk, 2), (self.livro3.pk, 2)])
+        self.assertEqual(self.top(self.livro4), [])
+
+        recomendacoes.atualizar(recalcular=True, top=1, margem=0)
+        self.assertEqual(Recomendacao.objects.filter(livro=self.livro).count(), 1)
+
+    def test_atualizacao_incremental_so_refaz_os_afetados_e_bate_com_recalcular(self):
+        self.ler(self.outro, self.livro3)
+
+        marca = MarcaProcessamento.objects.get(nome=recomendacoes.MARCA).valor
+        self.assertEqual(recomendacoes.livros_afetados(marca), {self.livro.pk, self.livro2.pk, self.livro3.pk})
+        self.assertEqual(recomendacoes.atualizar(top=2, margem=0), 3)
+        self.assertEqual(self.top(self.livro), [(self.livro3.pk, 3), (self.livro2.pk, 2)])
+        incremental = sorted(Recomendacao.objects.values_list('livro_id', 'recomendado_id', 'posicao', 'leitores'))
+
+        recomendacoes.atualizar(recalcular=True, top=2, margem=0)
+        self.assertEqual(
+            sorted(Recomendacao.objects.values_list('livro_id', 'recomendado_id', 'posicao', 'leitores')), incremental,
+        )
+
+    def test_sem_emprestimos_novos_nao_recalcula_nada(self):
+        self.assertEqual(recomendacoes.atualizar(top=2, margem=0), 0)
+
+    def test_para_leitor_ignora_os_ja_lidos(self):
+        emprestimos = list(Emprestimo.objects.filter(leitor=self.outro).order_by('-criado'))
+
+        sugestoes = recomendacoes.para_leitor(self.outro, emprestimos)
+        self.assertEqual([sugestao['id'] for sugestao in sugestoes], [self.livro3.pk])
+
+
+# ============================================================
+# 🔹 FACETAS DO CATÁLOGO (core/facetas.py)
+# ============================================================
+class FacetasTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_acervo()
+
+    def contagens(self):
+        linhas = ContagemFaceta.objects.filter(total__gt=0).values_list('faceta', 'valor', 'total')
+        return {(faceta, valor): total for faceta, valor, total in linhas}
+
+    def assertBateComRecalculo(self):
+        incremental = self.contagens()
+        with self.captureOnCommitCallbacks(execute=True):
+            facetas.recalcular()
+        self.assertEqual(incremental, self.contagens())
+        return incremental
+
+    def test_criar_alterar_e_apagar_livro(self):
+        poesia = Categoria.objects.create(nome='Poesia')
+        with self.captureOnCommitCallbacks(execute=True):
+            livro = Livro.objects.create(
+                codigo='L3', nome='Livro 3', autor='Machado de Assis', categoria=poesia, ano_publicacao=1899,
+            )
+        contagens = self.assertBateComRecalculo()
+        self.assertEqual(contagens[('categoria', str(poesia.pk))], 1)
+        self.assertEqual(contagens[('ano', '1899')], 1)
+        self.assertEqual(contagens[('disponivel', '1')], 3)
+        self.assertEqual(contagens[('autor', str(livro.autores.get().pk))], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            livro.categoria = self.categoria
+            livro.ano_publicacao = 2000
+            livro.save()
+        contagens = self.assertBateComRecalculo()
+        self.assertNotIn(('categoria', str(poesia.pk)), contagens)
+        self.assertEqual(contagens[('ano', '2000')], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            livro.delete()
+        contagens = self.assertBateComRecalculo()
+        self.assertEqual(contagens[('categoria', str(self.categoria.pk))], 2)
+        self.assertFalse([chave for chave in contagens if chave[0] == 'autor'])
+
+    def test_emprestimo_e_devolucao(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            emprestimo = self.emprestar(self.livro)
+        self.assertEqual(self.assertBateComRecalculo()[('disponivel', '0')], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            circulacao.transitar_um('devolver', emprestimo.pk)
+        contagens = self.assertBateComRecalculo()
+        self.assertEqual(contagens[('disponivel', '1')], 2)
+        self.assertNotIn(('disponivel', '0'), contagens)
+
+    def test_catalogo_ve_a_contagem_nova(self):
+        self.assertEqual(facetas.contagens()['disponivel'], [('1', 'Disponível', 2)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.emprestar(self.livro)
+        disponivel = {valor: total for valor, _, total in facetas.contagens()['disponivel']}
+        self.assertEqual(disponivel, {'1': 1, '0': 1})
+
+
+# ============================================================
+# 🔹 AUTOCOMPLETAR (core/autocompletar.py)
+# ============================================================
+class IndiceAutocompletarTests(SimpleTestCase):
+    LIVROS = [
+        (1, 'Dom Casmurro', 'Machado de Assis'),
+        (2, 'Memórias Póstumas de Brás Cubas', 'Machado de Assis'),
+        (3, 'Coração das Trevas', 'Joseph Conrad'),
+        (4, 'O Cortiço', 'Aluísio Azevedo'),
+        (5, 'Domingo no Parque', 'Autor Qualquer'),
+    ]
+
+    def setUp(self):
+        self.indice = autocompletar.Indice(self.LIVROS)
+
+    def test_prefixo_do_titulo_vem_primeiro(self):
+        self.assertEqual(self.indice.buscar('dom'), [1, 5])
+
+    def test_sem_acentos(self):
+        self.assertEqual(self.indice.buscar('coracao'), [3])
+        self.assertEqual(self.indice.buscar('memorias postumas'), [2])
+        self.assertEqual(self.indice.buscar('aluisio'), [4])
+
+    def test_todas_as_palavras_com_a_ultima_como_prefixo(self):
+        self.assertEqual(self.indice.buscar('assis brás'), [2])
+        self.assertEqual(sorted(self.indice.buscar('machado')), [1, 2])
+
+    def test_um_erro_de_digitacao_por_palavra(self):
+        self.assertEqual(self.indice.buscar('casmruro'), [1])        # transposição
+        self.assertEqual(self.indice.buscar('machdo casmurro'), [1])  # letra faltando
+        self.assertEqual(self.indice.buscar('cortico azevdo'), [4])   # última palavra como prefixo
+        self.assertEqual(self.indice.buscar('cazmurro'), [1])         # letra trocada
+
+    def test_nao_corrige_palavras_curtas_nem_dois_erros(self):
+        self.assertEqual(self.indice.buscar('xom'), [])
+        self.assertEqual(self.indice.buscar('csamrruo'), [])
+        self.assertEqual(self.indice.buscar('d'), [])
+
+
+class BuscaAutocompletarTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.livro3 = Livro.objects.create(codigo='L3', nome='Livro 3 Coração', categoria=self.categoria)
+        Livro.objects.filter(pk=self.livro.pk).update(status=False)
+        estado = mock.patch.dict(autocompletar._estado, {'indice': None, 'geracao': None, 'carregado_em': 0.0})
+        estado.start()
+        self.addCleanup(estado.stop)
+
+    def test_api_filtra_os_indisponiveis_no_banco(self):
+        todos = self.client.get('/core/api/livros/autocompletar/', {'q': 'livro'}, secure=True).json()
+        todos = [livro['id'] for livro in todos['resultados']]
+        self.assertEqual(todos, [self.livro.pk, self.livro2.pk, self.livro3.pk])
+
+        disponiveis = self.client.get(
+            '/core/api/livros/autocompletar/', {'q': 'livro', 'disponiveis': '1'}, secure=True,
+        ).json()
+        self.assertEqual([livro['id'] for livro in disponiveis['resultados']], [self.livro2.pk, self.livro3.pk])
+
+    def test_acento_e_erro_pela_api(self):
+        resposta = self.client.get('/core/api/livros/autocompletar/', {'q': 'corasao'}, secure=True).json()
+        self.assertEqual([livro['id'] for livro in resposta['resultados']], [self.livro3.pk])
+
+
+# ============================================================
+# 🔹 AUTORES (core/autores.py)
+# ============================================================
+class AgrupamentoAutoresTests(SimpleTestCase):
+    def grupos(self, *nomes):
+        return sorted(sorted(grupo) for grupo in autores.agrupar((nome, nome) for nome in nomes))
+
+    def test_mesma_chave_sem_acento_ordem_nem_particulas(self):
+        chaves = {autores.chave(nome) for nome in ('Machado de Assis', 'ASSIS, Machado de', 'Machado de Assís')}
+        self.assertEqual(chaves, {'assis machado'})
+        self.assertEqual(autores.separar('Machado de Assis e José de Alencar; Desconhecido'),
+                         ['Machado de Assis', 'José de Alencar'])
+
+    def test_agrupa_acentos_inversao_iniciais_e_erro_de_digitacao(self):
+        self.assertEqual(
+            self.grupos('Machado de Assis', 'Assis, Machado de', 'M. de Assis', 'Machado de Asis', 'Clarice Lispector'),
+            [['Assis, Machado de', 'M. de Assis', 'Machado de Asis', 'Machado de Assis'], ['Clarice Lispector']],
+        )
+
+    def test_iniciais_ambiguas_nao_juntam(self):
+        self.assertEqual(
+            self.grupos('João Silva', 'José Silva', 'J. Silva'),
+            [['J. Silva'], ['José Silva'], ['João Silva']],
+        )
+
+    def test_nomes_diferentes_nao_juntam(self):
+        self.assertEqual(len(self.grupos('Ana Souza', 'Ana Sousa Lima', 'Ivo Souza')), 3)
+
+
+class DeduplicarAutoresTests(CirculacaoMixin, TestCase):
+    def test_mescla_variantes_e_move_os_livros(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_acervo()
+            for livro, nome in ((self.livro, 'Machado de Assis'), (self.livro2, 'M. de Assis')):
+                livro.autor = nome
+                livro.save()
+        self.assertEqual(Autor.objects.count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(autores.deduplicar(), 1)
+
+        autor = Autor.objects.get()
+        self.assertEqual(autor.nome, 'Machado de Assis')
+        self.assertEqual(set(autor.livros.values_list('id', flat=True)), {self.livro.pk, self.livro2.pk})
+        self.assertEqual(ContagemFaceta.objects.get(faceta='autor', valor=str(autor.pk)).total, 2)
+        self.assertEqual(autores.resolver('Assis, M.'), autor.pk)
+
+
+# ============================================================
+# 🔹 ENRIQUECIMENTO BIBLIOGRÁFICO (core/bibliografia.py)
+# ============================================================
+class EnriquecimentoTests(TestCase):
+    EDICOES = [
+        {'key': '/authors/OL1A', 'type': {'key': '/type/author'}, 'name': 'Aluísio Azevedo'},
+        {'title': 'Dom Casmurro', 'authors': [{'name': 'Machado de Assis'}], 'isbn_13': ['9788572326972'],
+         'publish_date': '1899'},
+        {'title': 'Memórias Póstumas de Brás Cubas', 'authors': [{'name': 'Machado de Assis'}],
+         'isbn_13': ['9788500000002'], 'publish_date': '1881'},
+        {'title': 'O Cortiço', 'authors': [{'key': '/authors/OL1A'}], 'isbn_10': ['8500000003'],
+         'publish_date': 'março de 1890'},
+    ]
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        dump = f'{pasta}/edicoes.jsonl'
+        with open(dump, 'w', encoding='utf-8') as arquivo:
+            arquivo.writelines(json.dumps(edicao, ensure_ascii=False) + '\n' for edicao in self.EDICOES)
+        self.assertEqual(bibliografia.construir_indice(dump, f'{pasta}/indice.sqlite3'), 3)
+        self.indice = bibliografia.Indice(f'{pasta}/indice.sqlite3')
+        self.addCleanup(self.indice.fechar)
+
+        categoria = Categoria.objects.create(nome='Romance')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sem_isbn_nem_ano = Livro.objects.create(
+                codigo='L1', nome='Dom Casmurro', autor='Machado de Assis', categoria=categoria,
+            )
+            self.sem_autor = Livro.objects.create(
+                codigo='L2', nome='Memórias Póstumas de Brás Cubas', categoria=categoria, ano_publicacao=1900,
+            )
+            self.pelo_isbn = Livro.objects.create(
+                codigo='L3', nome='Cortiço (edição escolar)', autor='Aluísio Azevedo', categoria=categoria,
+                isbn='850-0000003',
+            )
+            self.outro_autor = Livro.objects.create(
+                codigo='L4', nome='O Cortiço', autor='Outra Pessoa', categoria=categoria,
+            )
+
+    def valores(self, livro):
+        return Livro.objects.filter(pk=livro.pk).values_list('isbn', 'ano_publicacao', 'autor').get()
+
+    def test_so_preenche_o_que_falta(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = bibliografia.enriquecer(self.indice)
+
+        self.assertEqual(self.valores(self.sem_isbn_nem_ano), ('9788572326972', 1899, 'Machado de Assis'))
+        # O ano já informado (1900) não é trocado pelo do dump (1881).
+        self.assertEqual(self.valores(self.sem_autor), ('9788500000002', 1900, 'Machado de Assis'))
+        # Casou pelo ISBN (o título é outro); o ISBN como foi digitado fica.
+        self.assertEqual(self.valores(self.pelo_isbn), ('850-0000003', 1890, 'Aluísio Azevedo'))
+        # Mesmo título, autor diferente: nada muda.
+        self.assertEqual(self.valores(self.outro_autor), (None, None, 'Outra Pessoa'))
+
+        self.assertEqual(resultado['alterados'], 3)
+        self.assertEqual(list(self.sem_autor.autores.values_list('nome', flat=True)), ['Machado de Assis'])
+        self.assertEqual(ContagemFaceta.objects.get(faceta='ano', valor='').total, 1)
+
+    def test_nao_repete_isbn_ja_usado(self):
+        Livro.objects.filter(pk=self.outro_autor.pk).update(isbn='9788572326972')
+
+        resultado = bibliografia.enriquecer(self.indice)
+
+        self.assertEqual(resultado['isbn_em_uso'], 1)
+        self.assertEqual(self.valores(self.sem_isbn_nem_ano), (None, 1899, 'Machado de Assis'))
+
+    def test_simular_nao_grava(self):
+        livros = (self.sem_isbn_nem_ano, self.sem_autor, self.pelo_isbn)
+        antes = [self.valores(livro) for livro in livros]
+
+        self.assertEqual(bibliografia.enriquecer(self.indice, simular=True)['alterados'], 3)
+        self.assertEqual([self.valores(livro) for livro in livros], antes)
+
+
+# ============================================================
+# 🔹 PERFIL DE PRODUÇÃO DO SQLITE (core/sqlite.py)
+# ============================================================
+class PerfilSQLiteTests(SimpleTestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        connection_created.connect(sqlite_perfil.aplicar_pragmas, dispatch_uid='testes.sqlite')
+        self.addCleanup(connection_created.disconnect, dispatch_uid='testes.sqlite')
+        configuracao = {**connection.settings_dict, 'ENGINE': 'core.backends.sqlite', 'NAME': f'{pasta}/banco.sqlite3'}
+        banco = mock.patch.dict(connections.settings, {'perfil_sqlite': configuracao})
+        banco.start()
+        self.addCleanup(banco.stop)
+        self.conexao = connections['perfil_sqlite']
+        self.addCleanup(connections.__delitem__, 'perfil_sqlite')
+        self.addCleanup(self.conexao.close)
+
+    def pragma(self, nome):
+        with self.conexao.cursor() as cursor:
+            cursor.execute(f'PRAGMA {nome}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'mmap_size': 1048576, 'cache_size': -2048,
+        'busy_timeout': 1234, 'temp_store': 'MEMORY',
+    })
+    def test_pragmas_aplicados_ao_conectar(self):
+        self.conexao.ensure_connection()
+
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)    # NORMAL
+        self.assertEqual(self.pragma('mmap_size'), 1048576)
+        self.assertEqual(self.pragma('cache_size'), -2048)
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        self.assertEqual(self.pragma('temp_store'), 2)     # MEMORY
+
+    def test_pragmas_valem_para_cada_conexao_nova(self):
+        self.conexao.ensure_connection()
+        self.conexao.close()
+
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_transacao_abre_com_begin_immediate(self):
+        with CaptureQueriesContext(self.conexao) as consultas, transaction.atomic(using='perfil_sqlite'):
+            pass
+        self.assertEqual(consultas[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+# ============================================================
+# 🔹 RÉPLICAS DE LEITURA (core/replicas.py)
+# ============================================================
+@mock.patch.object(replicas, 'replicas', return_value=['replica_1', 'replica_2'])
+class ReplicasTests(SimpleTestCase):
+    def setUp(self):
+        self.roteador = replicas.RoteadorReplicas()
+
+    def ler(self, request):
+        @replicas.usar_replica
+        def view(request):
+            return [self.roteador.db_for_read(Livro) for _ in range(20)]
+        return view(request)
+
+    def test_mesma_replica_em_todas_as_leituras_da_requisicao(self, _):
+        with mock.patch.object(replicas.random, 'choice', wraps=replicas.random.choice) as sorteio:
+            aliases = self.ler(RequestFactory().get('/'))
+
+        sorteio.assert_called_once()
+        self.assertEqual(len(set(aliases)), 1)
+        self.assertIn(aliases[0], ['replica_1', 'replica_2'])
+
+    def test_cada_requisicao_sorteia_a_sua(self, _):
+        with mock.patch.object(replicas.random, 'choice', side_effect=['replica_1', 'replica_2']):
+            self.assertEqual(set(self.ler(RequestFactory().get('/'))), {'replica_1'})
+            self.assertEqual(set(self.ler(RequestFactory().get('/'))), {'replica_2'})
+
+    def test_primario_fora_da_view_e_com_cookie_fixado(self, _):
+        self.assertIsNone(self.roteador.db_for_read(Livro))
+
+        request = RequestFactory().get('/')
+        request.COOKIES[replicas.COOKIE_PRIMARIO] = str(time.time() + 60)
+        self.assertEqual(set(self.ler(request)), {None})
+
+    def test_primario_dentro_de_transacao(self, _):
+        @replicas.usar_replica
+        def view(request):
+            with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+                return self.roteador.db_for_read(Livro)
+
+        self.assertIsNone(view(RequestFactory().get('/')))
+
+
+# ============================================================
+# 🔹 SAVE SÓ DO QUE MUDOU (core/models.py)
+# ============================================================
+class SalvarAlteradosTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+
+    def test_save_sem_alteracao_nao_vai_ao_banco(self):
+        livro = Livro.objects.get(pk=self.livro.pk)
+        with self.assertNumQueries(0):
+            livro.save()
+
+    def test_update_so_com_as_colunas_alteradas(self):
+        livro = Livro.objects.get(pk=self.livro.pk)
+        livro.nome = 'Outro nome'
+        with CaptureQueriesContext(connection) as consultas:
+            livro.save()
+
+        self.assertEqual(len(consultas), 1)
+        sql = consultas[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertIn('"nome"', sql)
+        self.assertIn('"modificado"', sql)
+        for coluna in ('"codigo"', '"autor"', '"status"', '"ano_publicacao"', '"criado"'):
+            self.assertNotIn(coluna, sql)
+        self.assertEqual(Livro.objects.get(pk=self.livro.pk).nome, 'Outro nome')
+
+    def test_atribuicao_com_o_mesmo_valor_e_gravada(self):
+        livro = Livro.objects.get(pk=self.livro.pk)
+        Livro.objects.filter(pk=livro.pk).update(nome='Mudado por outro')
+
+        livro.nome = livro.nome
+        livro.save()
+
+        self.assertEqual(Livro.objects.get(pk=livro.pk).nome, 'Livro 1')
+
+    def test_linha_apagada_e_inserida_de_novo(self):
+        livro = Livro.objects.get(pk=self.livro2.pk)
+        Livro.objects.filter(pk=livro.pk).delete()
+
+        livro.nome = 'De volta'
+        livro.save()
+
+        self.assertEqual(Livro.objects.get(pk=livro.pk).nome, 'De volta')
+
+    def test_validacao_ignora_campos_nao_alterados(self):
+        emprestimo = self.emprestar(self.livro)
+        # Datas inválidas gravadas por fora da validação, como em dados antigos.
+        Emprestimo.objects.filter(pk=emprestimo.pk).update(devolucao=emprestimo.issue_date)
+        emprestimo = Emprestimo.objects.get(pk=emprestimo.pk)
+
+        emprestimo.status = 'completed'
+        emprestimo.save()
+        self.assertEqual(Emprestimo.objects.get(pk=emprestimo.pk).status, 'completed')
+
+        emprestimo.devolucao = emprestimo.issue_date - timedelta(days=1)
+        with self.assertRaises(ValidationError):
+            emprestimo.save()
+
+    def test_set_password_e_gravado(self):
+        leitor = Leitor.objects.get(pk=self.leitor.pk)
+        leitor.set_password('senha-nova')
+        leitor.save()
+
+        self.assertTrue(Leitor.objects.get(pk=leitor.pk).check_password('senha-nova'))
+
+
+# ============================================================
+# 🔹 IDEMPOTÊNCIA (core/idempotencia.py)
+# ============================================================
+class IdempotenciaTests(CirculacaoMixin, TestCase):
+    def setUp(self):
+        self.criar_acervo()
+        self.chamadas = 0
+
+    def requisicao(self, corpo='{"livro": 1}', chave='chave-1'):
+        request = RequestFactory().post(
+            '/core/teste/', corpo, content_type='application/json', HTTP_IDEMPOTENCY_KEY=chave,
+        )
+        request.user = self.leitor
+        return request
+
+    def view(self, status=200):
+        @idempotencia.idempotente
+        def view(request):
+            self.chamadas += 1
+            return HttpResponse(f'resposta {self.chamadas}', status=status)
+        return view
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_mesma_chave_repete_a_resposta_sem_agendar_de_novo(self):
+        self.client.force_login(self.leitor)
+        dados = {'livro': self.livro.pk, 'data_retirada': (self.hoje + timedelta(days=2)).isoformat()}
+
+        primeira = self.client.post('/core/agendar-retirada/', dados, HTTP_IDEMPOTENCY_KEY='k', secure=True)
+        segunda = self.client.post('/core/agendar-retirada/', dados, HTTP_IDEMPOTENCY_KEY='k', secure=True)
+
+        self.assertEqual(primeira.status_code, 302)
+        self.assertEqual(segunda.status_code, 302)
+        self.assertEqual(segunda['Location'], primeira['Location'])
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(Agendamento.objects.filter(livro=self.livro).count(), 1)
+
+    def test_mesma_chave_com_outro_corpo_e_recusada(self):
+        view = self.view()
+        view(self.requisicao('{"livro": 1}'))
+
+        response = view(self.requisicao('{"livro": 2}'))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.chamadas, 1)
+
+    def test_repeticao_durante_a_primeira_recebe_409(self):
+        respostas = []
+
+        @idempotencia.idempotente
+        def view(request):
+            respostas.append(view(self.requisicao()))
+            return HttpResponse('ok')
+
+        self.assertEqual(view(self.requisicao()).status_code, 200)
+        self.assertEqual(respostas[0].status_code, 409)
+        self.assertEqual(respostas[0]['Retry-After'], '1')
+
+    def test_erro_5xx_nao_e_guardado(self):
+        view = self.view(status=503)
+
+        self.assertEqual(view(self.requisicao()).status_code, 503)
+        self.assertEqual(view(self.requisicao()).status_code, 503)
+        self.assertEqual(self.chamadas, 2)
+        self.assertFalse(RespostaIdempotente.objects.exists())
+
+    def test_reserva_abandonada_expira(self):
+        view = self.view()
+        # Um worker que morreu no meio da view deixa a reserva sem resposta.
+        with mock.patch.object(idempotencia, '_guardar'):
+            view(self.requisicao())
+
+        self.assertEqual(view(self.requisicao()).status_code, 409)
+        depois = timezone.now() + idempotencia.ABANDONO + timedelta(seconds=1)
+        with mock.patch.object(idempotencia.timezone, 'now', return_value=depois):
+            response = view(self.requisicao())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'resposta 2')
+
+    def test_limpeza_em_lotes(self):
+        agora = timezone.now()
+        RespostaIdempotente.objects.bulk_create(
+            [RespostaIdempotente(chave=f'vencida-{i}', impressao='x', status=200, expira=agora) for i in range(5)]
+            + [RespostaIdempotente(chave='valida', impressao='x', status=200, expira=agora + timedelta(hours=1))]
+        )
+        lotes = []
+
+        self.assertEqual(idempotencia.limpar(lote=2, agora=agora, progresso=lotes.append), 5)
+        self.assertEqual(len(lotes), 3)
+        self.assertEqual(list(RespostaIdempotente.objects.values_list('chave', flat=True)), ['valida'])
+
+
+# ============================================================
+# 🔹 CACHE COM CÁLCULO ÚNICO (core/cache.py)
+# ============================================================
+class CacheCalculoUnicoTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calculos = 0
+
+    def calcular(self, valor='novo', demora=0):
+        def calcular():
+            self.calculos += 1
+            time.sleep(demora)
+            return valor
+        return calcular
+
+    def guardar(self, valor, duracao, vence_em):
+        cache.set('chave', (valor, duracao, time.time() + vence_em), 600)
+
+    def test_leituras_simultaneas_calculam_uma_vez(self):
+        calcular = self.calcular(demora=0.2)
+
+        resultados = em_paralelo(lambda: cache_calculado.obter('chave', calcular, 60, 'testes'))
+
+        self.assertEqual(resultados, ['novo'] * 4)
+        self.assertEqual(self.calculos, 1)
+
+    def test_valor_valido_e_servido_sem_calcular(self):
+        self.guardar('guardado', duracao=0.01, vence_em=60)
+
+        self.assertEqual(cache_calculado.obter('chave', self.calcular(), 60, 'testes'), 'guardado')
+        self.assertEqual(self.calculos, 0)
+
+    def test_renovacao_antecipada_perto_do_vencimento(self):
+        # Um cálculo de 10s vencendo em 5s: o sorteio do XFetch quase sempre passa do vencimento.
+        self.guardar('guardado', duracao=10, vence_em=5)
+
+        with mock.patch.object(cache_calculado.random, 'random', return_value=0.9), \
+                mock.patch.object(metrics, 'registrar_recalculo') as recalculo:
+            self.assertEqual(cache_calculado.obter('chave', self.calcular(), 60, 'testes'), 'novo')
+
+        self.assertEqual(recalculo.call_args.args[:2], ('testes', 'antecipado'))
+        with override_settings(CACHE_XFETCH_BETA=0):
+            self.assertEqual(cache_calculado.obter('chave', self.calcular('outro'), 60, 'testes'), 'novo')
+        self.assertEqual(self.calculos, 1)
+
+    def test_vencido_servido_enquanto_outro_recalcula(self):
+        self.guardar('antigo', duracao=0.01, vence_em=-1)
+
+        with locks.trava_cache(cache_calculado.PREFIXO_TRAVA + 'chave'), \
+                mock.patch.object(metrics, 'registrar_coalescida') as coalescida:
+            self.assertEqual(cache_calculado.obter('chave', self.calcular(), 60, 'testes'), 'antigo')
+
+        coalescida.assert_called_once_with('testes', 'obsoleto')
+        self.assertEqual(self.calculos, 0)
+        self.assertEqual(cache_calculado.obter('chave', self.calcular(), 60, 'testes'), 'novo')
+
+
+class CacheLocalTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        cache_calculado.local.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(cache_calculado.local.clear)
+
+    def tamanho(self, valor):
+        return len(pickle.dumps(valor, pickle.HIGHEST_PROTOCOL))
+
+    def test_limite_em_bytes_expulsa_o_menos_usado(self):
+        valor = 'x' * 100
+        local = cache_calculado.CacheLocal(max_bytes=self.tamanho(valor) * 4)
+        for chave in 'abcd':
+            local.set(chave, valor, 60)
+        local.get('a')
+
+        local.set('e', valor, 60)
+
+        self.assertIs(local.get('b'), cache_calculado._AUSENTE)
+        for chave in 'acde':
+            self.assertEqual(local.get(chave), valor)
+        self.assertEqual(local.bytes, self.tamanho(valor) * 4)
+
+    def test_valor_acima_de_um_quarto_do_limite_nao_e_guardado(self):
+        local = cache_calculado.CacheLocal(max_bytes=400)
+        pequeno, grande = 'x' * 50, 'x' * 150
+        self.assertLessEqual(self.tamanho(pequeno), 100)
+        self.assertGreater(self.tamanho(grande), 100)
+
+        local.set('pequeno', pequeno, 60)
+        local.set('grande', grande, 60)
+
+        self.assertEqual(local.get('pequeno'), pequeno)
+        self.assertIs(local.get('grande'), cache_calculado._AUSENTE)
+        self.assertEqual(local.bytes, self.tamanho(pequeno))
+
+    def test_entrada_vencida_sai_e_atualiza_as_metricas(self):
+        local = cache_calculado.CacheLocal(max_bytes=1024)
+        local.set('vencida', 'valor', 0)
+
+        with mock.patch.object(metrics, 'registrar_cache_local') as registrar:
+            self.assertIs(local.get('vencida'), cache_calculado._AUSENTE)
+
+        registrar.assert_called_once_with(0, 0)
+        self.assertEqual(local.bytes, 0)
+
+    def test_invalidar_namespace_troca_a_versao(self):
+        calculos = []
+
+        def calcular():
+            calculos.append(1)
+            return len(calculos)
+
+        self.assertEqual(cache_calculado.obter_local('testes', 'chave', calcular, 60, 'testes'), 1)
+        self.assertEqual(cache_calculado.obter_local('testes', 'chave', calcular, 60, 'testes'), 1)
+        versao = cache_calculado.versao('testes')
+
+        cache_calculado.invalidar('testes')
+
+        self.assertGreater(cache_calculado.versao('testes'), versao)
+        self.assertEqual(cache_calculado.obter_local('testes', 'chave', calcular, 60, 'testes'), 2)
+        self.assertEqual(len(calculos), 2)
+
+
+# ============================================================
+# 🔹 CONTROLE DE ADMISSÃO (core/admissao.py)
+# ============================================================
+@override_settings(
+    ADMISSAO_MAXIMO=4, ADMISSAO_MAXIMO_GLOBAL=4, ADMISSAO_ESPERA={'circulacao': 0, 'normal': 0, 'baixa': 0},
+)
+class AdmissaoTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        processo = mock.patch.object(admissao, '_processo', admissao._Processo())
+        processo.start()
+        self.addCleanup(processo.stop)
+
+    def middleware(self, view=None):
+        return AdmissaoMiddleware(view or (lambda request: HttpResponse('ok')))
+
+    def ocupar(self, vagas):
+        for _ in range(vagas):
+            self.assertTrue(admissao.entrar('circulacao'))
+            self.addCleanup(admissao.sair)
+
+    def test_sem_vaga_recebe_503_com_retry_after(self):
+        self.ocupar(4)
+
+        response = self.middleware()(RequestFactory().get('/core/dashboard/'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ADMISSAO_RETRY_AFTER))
+
+    def test_reserva_para_a_circulacao(self):
+        self.ocupar(3)
+        middleware = self.middleware()
+
+        self.assertEqual(middleware(RequestFactory().get('/core/')).status_code, 503)            # baixa: 2 vagas
+        self.assertEqual(middleware(RequestFactory().get('/core/dashboard/')).status_code, 503)  # normal: 3 vagas
+        self.assertEqual(middleware(RequestFactory().post('/core/devolver-livro/')).status_code, 200)
+        self.assertEqual(admissao._processo.em_andamento, 3)
+        self.assertEqual(cache.get(admissao.CHAVE_GLOBAL), 3)
+
+    def test_vaga_devolvida_quando_a_view_falha(self):
+        def view(request):
+            raise RuntimeError('falha')
+
+        with self.assertRaises(RuntimeError):
+            self.middleware(view)(RequestFactory().get('/core/dashboard/'))
+
+        self.assertEqual(admissao._processo.em_andamento, 0)
+        self.assertEqual(cache.get(admissao.CHAVE_GLOBAL), 0)
+
+    def test_contador_global_renovado_a_cada_entrada(self):
+        with mock.patch.object(admissao.cache, 'touch', wraps=admissao.cache.touch) as renovar:
+            self.ocupar(2)
+
+        renovar.assert_called_with(admissao.CHAVE_GLOBAL, settings.ADMISSAO_GLOBAL_JANELA)
+
+    def test_contador_global_nao_fica_negativo(self):
+        self.assertTrue(admissao.entrar('normal'))
+        # Expirou no meio da requisição e outra já o recriou.
+        cache.delete(admissao.CHAVE_GLOBAL)
+        self.assertTrue(admissao.entrar('normal'))
+
+        admissao.sair()
+        admissao.sair()
+
+        self.assertEqual(cache.get(admissao.CHAVE_GLOBAL), 0)
@@ -0,0 +1,76 @@
+"""
+Normalização de texto para busca.
+
+Tira acentos, passa para minúsculas e troca pontuação por espaço, para que
+"Coração" e "coracao" (ou "São-Paulo" e "sao paulo") sejam a mesma coisa.
+"""
+import re
+import unicodedata
+
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+class _TabelaSemAcentos(dict):
+    """Tabela para str.translate que aprende cada caractere na primeira vez que o vê."""
+
+    def __missing__(self, codigo):
+        decomposto = unicodedata.normalize('NFKD', chr(codigo))
+        self[codigo] = ''.join(c for c in decomposto if not unicodedata.combining(c))
+        return self[codigo]
+
+
+_SEM_ACENTOS = _TabelaSemAcentos()
+
+
+def normalizar(texto):
+    texto = (texto or '').casefold()
+    if not texto.isascii():
+        texto = texto.translate(_SEM_ACENTOS)
+    return _SEPARADORES.sub(' ', texto).strip()
+
+
+def palavras(texto):
+    return normalizar(texto).split()
+
+
+def trigramas(palavra, prefixo=False):
+    """
+    Trigramas da palavra com bordas marcadas por espaço. Com ``prefixo``, o
+    fim fica aberto (a palavra pode continuar).
+    """
+    marcada = f'  {palavra}' if prefixo else f'  {palavra} '
+    return {marcada[i:i + 3] for i in range(len(marcada) - 2)}
+
+
+def ate_uma_edicao(a, b):
+    """True se ``a`` e ``b`` diferem por no máximo uma inserção, remoção, troca ou transposição."""
+    if a == b:
+        return True
+    tamanho_a, tamanho_b = len(a), len(b)
+    if abs(tamanho_a - tamanho_b) > 1:
+        return False
+    inicio = 0
+    while inicio < min(tamanho_a, tamanho_b) and a[inicio] == b[inicio]:
+        inicio += 1
+    if tamanho_a == tamanho_b:
+        if a[inicio + 1:] == b[inicio + 1:]:
+            return True
+        # Transposição de letras vizinhas: "lviro" -> "livro".
+        return (
+            inicio + 1 < tamanho_a
+            and a[inicio] == b[inicio + 1] and a[inicio + 1] == b[inicio]
+            and a[inicio + 2:] == b[inicio + 2:]
+        )
+    if tamanho_a > tamanho_b:
+        return a[inicio + 1:] == b[inicio:]
+    return a[inicio:] == b[inicio + 1:]
+
+
+def prefixo_proximo(prefixo, palavra):
+    """True se algum começo de ``palavra`` está a no máximo uma edição de ``prefixo``."""
+    tamanho = len(prefixo)
+    return any(
+        ate_uma_edicao(prefixo, palavra[:tamanho + ajuste])
+        for ajuste in (-1, 0, 1)
+        if 0 < tamanho + ajuste <= len(palavra)
+    )
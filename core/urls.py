@@ -47,11 +47,13 @@ urlpatterns = [
     path('agendar-retirada/', views.agendar_retirada, name='agendar_retirada'),
     path('api/devolver-livro/<int:emprestimo_id>/', views.api_devolver_livro, name='api_devolver_livro'),
     path('devolver-livro/', views.devolver_livro_view, name='devolver_livro'),
+    path('api/livros/autocompletar/', views.api_autocompletar_livros, name='api_autocompletar_livros'),
 
     # ======================
     # 🔹 PÁGINAS ADICIONAIS
     # ======================
     path('livros/view/', views.livros_view, name='livros-view'),
+    path('autor/<int:pk>/', views.autor_view, name='autor-view'),
 
     # ======================
     # 🔹 NOVAS TELAS DO LEITOR
@@ -61,6 +63,11 @@ urlpatterns = [
     path('perfil/editar/', views.editar_perfil_ajax, name='editar_perfil_ajax'),
     path('agendamento/<int:agendamento_id>/cancelar/', views.cancelar_agendamento, name='cancelar_agendamento'),
 
+    # ======================
+    # 🔹 RELATÓRIOS DA EQUIPE
+    # ======================
+    path('relatorios/circulacao/', views.relatorio_circulacao, name='relatorio_circulacao'),
+
 ]
 
 # ======================
@@ -1,16 +1,23 @@
 import logging
+import uuid
 from datetime import datetime, date
 from django.views.generic import TemplateView, CreateView, DeleteView, UpdateView
 from django.urls import reverse_lazy
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils.timezone import make_aware
 from core.forms import LoginForm, LeitorModelForm, AgendamentoForm, LivroModelForm
-from core.models import Emprestimo, Leitor, Livro, Agendamento
+from core.models import Autor, Emprestimo, Leitor, Livro, Agendamento
 from django.views.decorators.http import require_POST
+from django.views.decorators.cache import never_cache
+from django.conf import settings
+from core import arquivo, autocompletar, circulacao, estatisticas, facetas, metrics, notificacoes, recomendacoes
+from core.idempotencia import idempotente
+from core.replicas import usar_replica
 
 # Configura o logger
 logger = logging.getLogger(__name__)
@@ -81,15 +88,46 @@ class LivroDeleteView(DeleteView):
 
 
 # ===========================================
-# 🔹 LISTAGEM SIMPLES DE LIVROS (RESTAURADA)
+# 🔹 CATÁLOGO DE LIVROS (FILTROS POR FACETA)
 # ===========================================
+@usar_replica
 def livros_view(request):
     """
-    Exibe uma lista simples de todos os livros disponíveis no sistema.
-    Essa view é pública e pode ser usada para o leitor visualizar o catálogo.
+    Catálogo público com filtros por categoria, autor, ano e disponibilidade.
+    As contagens de cada filtro vêm da tabela pré-agregada (core/facetas.py) e
+    a paginação é por chave (``?depois=<id>``), sem COUNT.
     """
-    livros = Livro.objects.all().order_by('nome')
-    return render(request, 'livros.html', {'livros': livros})
+    filtros = facetas.filtros_da_requisicao(request.GET)
+    depois = request.GET.get('depois', '')
+    livros, proxima = facetas.pagina(
+        filtros, depois=int(depois) if depois.isdigit() else None, tamanho=settings.CATALOGO_POR_PAGINA,
+    )
+    parametros = request.GET.copy()
+    parametros.pop('depois', None)
+    return render(request, 'livros.html', {
+        'livros': livros,
+        'facetas': facetas.contagens(),
+        'filtros': filtros,
+        'autor_filtrado': Autor.objects.filter(pk=filtros['autor']).first() if 'autor' in filtros else None,
+        'proxima': proxima,
+        'parametros': parametros.urlencode(),
+    })
+
+
+@usar_replica
+def autor_view(request, pk):
+    """Página do autor com seus livros, pelo índice de ``Livro.autores`` e paginada por chave."""
+    autor = get_object_or_404(Autor, pk=pk)
+    depois = request.GET.get('depois', '')
+    livros, proxima = facetas.pagina(
+        {'autor': str(autor.pk)}, depois=int(depois) if depois.isdigit() else None, tamanho=settings.CATALOGO_POR_PAGINA,
+    )
+    return render(request, 'autor.html', {
+        'autor': autor,
+        'total': autor.livros.count(),
+        'livros': livros,
+        'proxima': proxima,
+    })
 
 
 # ===========================================
@@ -122,25 +160,46 @@ def reservas_view(request):
 
 
 @login_required
+@idempotente
 def agendar_retirada(request):
-    livros_disponiveis = Livro.objects.filter(status=True)
+    livro_escolhido = None
+    status = 200
     if request.method == 'POST':
         form = AgendamentoForm(request.POST)
         if form.is_valid():
             livro = form.cleaned_data['livro']
-            if livro.status:
-                agendamento = form.save(commit=False)
-                agendamento.leitor = request.user
-                agendamento.save()
-                livro.status = False
-                livro.save()
+            agendamento = form.save(commit=False)
+            agendamento.leitor = request.user
+            try:
+                # Prende o livro num UPDATE condicional (veja core/circulacao.py)
+                circulacao.agendar(agendamento)
+            except circulacao.LivroIndisponivel:
+                form.add_error('livro', 'Este livro já foi reservado.')
+                status = 409
+            else:
+                notificacoes.confirmar_agendamento.enfileirar(agendamento.id)
                 messages.success(request, f'Agendamento realizado com sucesso para o livro "{livro.nome}"!')
                 return redirect('dashboard_leitor')
-            else:
-                form.add_error('livro', 'Este livro já foi reservado.')
+        livro_escolhido = form.cleaned_data.get('livro') if hasattr(form, 'cleaned_data') else None
     else:
         form = AgendamentoForm()
-    return render(request, 'agendar_retirada.html', {'form': form, 'livros_list': livros_disponiveis})
+    return render(request, 'agendar_retirada.html', {
+        'form': form, 'livro_escolhido': livro_escolhido, 'chave_idempotencia': uuid.uuid4().hex,
+    }, status=status)
+
+
+@usar_replica
+def api_autocompletar_livros(request):
+    """
+    Sugestões de livros por título ou autor para o campo de busca, vindas do
+    índice em memória (core/autocompletar.py). Tolera acentos faltando e um
+    erro de digitação por palavra. ``disponiveis=1`` filtra os emprestados.
+    """
+    sugestoes = autocompletar.buscar(
+        request.GET.get('q', '')[:100],
+        disponiveis=request.GET.get('disponiveis') == '1',
+    )
+    return JsonResponse({'resultados': sugestoes})
 
 
 def success(request):
@@ -148,20 +207,16 @@ def success(request):
 
 @login_required
 @require_POST
+@idempotente
 def cancelar_agendamento(request, agendamento_id):
     try:
-        agendamento = get_object_or_404(Agendamento, id=agendamento_id, leitor=request.user)
-        if agendamento.status != 'scheduled':
-            return JsonResponse({'error': 'Este agendamento não pode ser cancelado.'}, status=400)
-
-        agendamento.status = 'cancelled'
-        agendamento.save()
-
-        # Libera o livro novamente
-        agendamento.livro.status = True
-        agendamento.livro.save()
-
+        # Cancela e libera o livro num UPDATE condicional (veja core/circulacao.py)
+        circulacao.transitar_um('cancelar', agendamento_id, leitor=request.user)
         return JsonResponse({'success': True, 'message': 'Agendamento cancelado com sucesso!'})
+    except Agendamento.DoesNotExist:
+        return JsonResponse({'error': 'Agendamento não encontrado.'}, status=404)
+    except circulacao.TransicaoInvalida:
+        return JsonResponse({'error': 'Este agendamento não pode ser cancelado.'}, status=409)
     except Exception as e:
         logger.error(f"Erro ao cancelar agendamento: {str(e)}")
         return JsonResponse({'error': 'Erro ao cancelar o agendamento.'}, status=500)
@@ -252,16 +307,18 @@ def editar_perfil_ajax(request):
 # 🔹 DASHBOARD DO LEITOR
 # ===========================================
 @login_required
+@usar_replica
 def dashboard_leitor(request):
     leitor = request.user
 
-    emprestimos = Emprestimo.objects.filter(leitor=leitor).order_by('-criado')
+    emprestimos, _ = arquivo.emprestimos_do_leitor(leitor)
     agendamentos = Agendamento.objects.filter(leitor=leitor).order_by('-criado')
 
     context = {
         'leitor': leitor,
         'emprestimos': emprestimos,
         'agendamentos': agendamentos,
+        'recomendacoes': recomendacoes.para_leitor(leitor, emprestimos),
     }
     return render(request, 'leitor_dashboard/dashboard.html', context)
 
@@ -270,20 +327,15 @@ def dashboard_leitor(request):
 # 🔹 DEVOLUÇÃO DE LIVROS
 # ===========================================
 @login_required
+@idempotente
 def api_devolver_livro(request, emprestimo_id):
     try:
-        emprestimo = get_object_or_404(Emprestimo, id=emprestimo_id, leitor=request.user)
-        if emprestimo.status != 'in_progress':
-            return JsonResponse({'error': 'Este empréstimo já foi finalizado.'}, status=400)
-
-        emprestimo.status = 'completed'
-        emprestimo.save()
-
-        livro = emprestimo.livro
-        livro.status = True
-        livro.save()
-
+        circulacao.transitar_um('devolver', emprestimo_id, leitor=request.user)
         return JsonResponse({'message': 'Livro devolvido com sucesso!'})
+    except Emprestimo.DoesNotExist:
+        return JsonResponse({'error': 'Empréstimo não encontrado.'}, status=404)
+    except circulacao.TransicaoInvalida:
+        return JsonResponse({'error': 'Este empréstimo já foi finalizado.'}, status=409)
     except Exception as e:
         logger.error(f"Erro ao processar devolução do livro: {str(e)}")
         return JsonResponse({'error': 'Erro ao processar a devolução.'}, status=500)
@@ -294,18 +346,13 @@ def devolver_livro_view(request):
     if request.method == 'POST':
         codigo_livro = request.POST.get('codigo_livro')
         try:
-            livro = get_object_or_404(Livro, codigo=codigo_livro)
-            emprestimo = get_object_or_404(Emprestimo, livro=livro, status='in_progress')
-            emprestimo.status = 'completed'
-            emprestimo.save()
-            livro.status = True
-            livro.save()
-            messages.success(request, f'Livro "{livro.nome}" devolvido com sucesso!')
-            return redirect('devolver_livro')
+            livro = Livro.objects.only('nome').get(codigo=codigo_livro)
+            if circulacao.devolver_emprestimos(Emprestimo.objects.filter(livro=livro)):
+                messages.success(request, f'Livro "{livro.nome}" devolvido com sucesso!')
+                return redirect('devolver_livro')
+            messages.error(request, 'Este livro não está emprestado.')
         except Livro.DoesNotExist:
             messages.error(request, 'Código do livro não encontrado.')
-        except Emprestimo.DoesNotExist:
-            messages.error(request, 'Este livro não está emprestado.')
         except Exception as e:
             logger.error(f"Erro ao processar devolução: {str(e)}")
             messages.error(request, 'Erro ao processar devolução.')
@@ -314,11 +361,43 @@ def devolver_livro_view(request):
 # 🔹 MEUS EMPRÉSTIMOS (PARA O LEITOR LOGADO)
 # ===========================================
 @login_required
+@usar_replica
 def meus_emprestimos(request):
     """
     Exibe todos os empréstimos feitos pelo leitor logado.
-    Mostra tanto os ativos quanto os finalizados.
+    Mostra tanto os ativos quanto os finalizados, inclusive os arquivados,
+    paginados por chave (``?depois=<id>``).
     """
-    emprestimos = Emprestimo.objects.filter(leitor=request.user).order_by('-criado')
-    return render(request, 'leitor_dashboard/meus_emprestimos.html', {'emprestimos': emprestimos})
+    depois = request.GET.get('depois', '')
+    emprestimos, proxima = arquivo.emprestimos_do_leitor(request.user, depois=int(depois) if depois.isdigit() else None)
+    return render(request, 'leitor_dashboard/meus_emprestimos.html', {'emprestimos': emprestimos, 'proxima': proxima})
 
+
+# ===========================================
+# 🔹 RELATÓRIO DE CIRCULAÇÃO (EQUIPE)
+# ===========================================
+@staff_member_required
+@usar_replica
+def relatorio_circulacao(request):
+    """
+    Estatísticas mensais, por categoria e livros mais emprestados.
+    Lê só as tabelas pré-agregadas (veja core/estatisticas.py).
+    """
+    mes = estatisticas.mes_do_parametro(request.GET.get('mes'))
+    contexto = estatisticas.relatorio(mes=mes)
+    return render(request, 'relatorio_circulacao.html', contexto)
+
+
+# ===========================================
+# 🔹 MÉTRICAS (PROMETHEUS)
+# ===========================================
+@never_cache
+def metricas_view(request):
+    """
+    Exposição das métricas para o Prometheus.
+    Se METRICS_TOKEN estiver definido, exige o cabeçalho "Authorization: Bearer <token>".
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.gerar_metricas(), content_type=metrics.CONTENT_TYPE)
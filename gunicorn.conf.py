@@ -0,0 +1,21 @@
+"""
+Configuração do gunicorn, carregada automaticamente quando o servidor é
+iniciado a partir da raiz do projeto (Procfile / Dockerfile).
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    # Métricas em modo multiprocesso: começa sempre com o diretório limpo,
+    # senão contadores de execuções anteriores seriam somados aos novos.
+    diretorio = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if diretorio:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.makedirs(diretorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
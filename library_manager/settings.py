@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 from django.core.management.utils import get_random_secret_key
 import dotenv
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 # 🧱 MIDDLEWARE
 # ==============================
 MIDDLEWARE = [
+    'core.middleware.MetricasMiddleware',
+    'core.middleware.MonitorSQLMiddleware',
+    'core.middleware.AdmissaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.http.ConditionalGetMiddleware',
@@ -49,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.FixarPrimarioMiddleware',
 ]
 
 # ==============================
@@ -103,11 +108,60 @@ elif DEBUG and os.getenv('DB_ENGINE') == 'django.db.backends.mysql':
         }
     }
 
-DATABASES['default']['CONN_MAX_AGE'] = 600
+# Réplicas de leitura (core/replicas.py): URLs separadas por vírgula, viram replica_1, replica_2...
+# Nos testes elas espelham o default. Sem réplicas, tudo vai para o default.
+for numero, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica_{numero}'] = {**dj_database_url.parse(url.strip()), 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['core.replicas.RoteadorReplicas']
+# Segundos lendo só do primário depois de uma escrita do mesmo navegador (atraso da replicação).
+REPLICA_JANELA_PRIMARIO = int(os.getenv('REPLICA_JANELA_PRIMARIO', '10'))
+
+# Os ajustes abaixo valem para o default e para as réplicas.
+DB_POOL = os.getenv('DB_POOL', 'False').lower() in ['true', '1', 'yes']
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False').lower() in ['true', '1', 'yes']
+for banco in DATABASES.values():
+    # Conexões persistentes: segundos que uma conexão sobrevive entre requisições (0 = uma por
+    # requisição). Com health checks, uma conexão reaproveitada é testada antes do primeiro uso.
+    banco['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+    banco['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() in ['true', '1', 'yes']
+
+    # Pool de conexões por processo para o Postgres (core/backends/postgresql). As conexões
+    # voltam para o pool ao fim de cada requisição, por isso CONN_MAX_AGE fica em 0.
+    if DB_POOL and banco['ENGINE'] == 'django.db.backends.postgresql':
+        banco['ENGINE'] = 'core.backends.postgresql'
+        banco['CONN_MAX_AGE'] = 0
+        banco['POOL'] = {
+            'MAXIMO': int(os.getenv('DB_POOL_MAXIMO', '10')),  # conexões por worker
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # segundos esperando vaga
+            'MAX_IDADE': float(os.getenv('DB_POOL_MAX_IDADE', '1800')),  # segundos até reciclar
+            'VERIFICAR_APOS': float(os.getenv('DB_POOL_VERIFICAR_APOS', '30')),  # ociosa por mais que isso: SELECT 1
+        }
+
+    # pgbouncer em modo transaction: cada transação pode cair numa conexão diferente do
+    # servidor, então cursores do lado do servidor (iterator() no Postgres) não funcionam.
+    if DB_PGBOUNCER:
+        banco['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Perfil de produção do SQLite (core/sqlite.py): WAL, PRAGMAs por conexão e BEGIN IMMEDIATE.
+# Opcional: só vale quando o banco é SQLite e SQLITE_OTIMIZADO está ligado.
+SQLITE_OTIMIZADO = os.getenv('SQLITE_OTIMIZADO', 'False').lower() in ['true', '1', 'yes']
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', '65536')),  # negativo = KiB
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'temp_store': 'MEMORY',
+}
+for banco in DATABASES.values():
+    if SQLITE_OTIMIZADO and banco['ENGINE'] == 'django.db.backends.sqlite3':
+        banco['ENGINE'] = 'core.backends.sqlite'
 
 # ==============================
 # ⚡ CACHE E SESSÕES
 # ==============================
+# LocMemCache é por processo: o cálculo único e as travas de core/cache.py e core/locks.py valem só
+# dentro de cada worker. Para valerem entre workers, aponte CACHES para Redis ou Memcached.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -115,6 +169,125 @@ CACHES = {
     }
 }
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Valores calculados uma vez por chave (core/cache.py): por quanto tempo um valor vencido ainda
+# é servido enquanto outro processo recalcula, quanto esperar pelo primeiro cálculo e o XFetch
+# (beta > 1 renova mais cedo, 0 desliga a renovação antecipada).
+CACHE_OBSOLETO_MAXIMO = int(os.getenv('CACHE_OBSOLETO_MAXIMO', '300'))  # segundos
+CACHE_ESPERA_MAXIMA = float(os.getenv('CACHE_ESPERA_MAXIMA', '2'))  # segundos
+CACHE_TRAVA_TIMEOUT = int(os.getenv('CACHE_TRAVA_TIMEOUT', '30'))  # segundos até a trava de um cálculo expirar
+CACHE_XFETCH_BETA = float(os.getenv('CACHE_XFETCH_BETA', '1.0'))
+# Primeiro nível por processo (core.cache.obter_local) na frente do CACHES acima.
+CACHE_LOCAL_MAX_BYTES = int(os.getenv('CACHE_LOCAL_MAX_BYTES', str(16 * 1024 * 1024)))  # por worker
+CACHE_LOCAL_TIMEOUT = int(os.getenv('CACHE_LOCAL_TIMEOUT', '30'))  # segundos de uma cópia local
+CACHE_LOCAL_VERSAO_TTL = float(os.getenv('CACHE_LOCAL_VERSAO_TTL', '1'))  # segundos até reler as versões
+
+# ==============================
+# 📈 MÉTRICAS (PROMETHEUS)
+# ==============================
+# Com vários workers, defina também PROMETHEUS_MULTIPROC_DIR (veja gunicorn.conf.py).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_CACHE_TIMEOUT = int(os.getenv('METRICS_CACHE_TIMEOUT', '60'))  # segundos
+
+# ==============================
+# 🚦 CONTROLE DE ADMISSÃO (core.admissao)
+# ==============================
+# Requisições simultâneas por worker e, com um cache compartilhado, no total; 0 desliga.
+ADMISSAO_MAXIMO = int(os.getenv('ADMISSAO_MAXIMO', '0'))
+ADMISSAO_MAXIMO_GLOBAL = int(os.getenv('ADMISSAO_MAXIMO_GLOBAL', '0'))
+ADMISSAO_GLOBAL_JANELA = int(os.getenv('ADMISSAO_GLOBAL_JANELA', '60'))  # segundos sem entradas até zerar o global
+ADMISSAO_RETRY_AFTER = int(os.getenv('ADMISSAO_RETRY_AFTER', '5'))  # segundos
+# Prioridade por nome de rota; as demais são 'normal'.
+ADMISSAO_PRIORIDADES = {
+    'devolver_livro': 'circulacao',
+    'api_devolver_livro': 'circulacao',
+    'cancelar_agendamento': 'circulacao',
+    'emprestimo-create': 'circulacao',
+    'metricas': 'circulacao',
+    'home': 'baixa',
+    'appgaroca': 'baixa',
+    'livros-view': 'baixa',
+    'autor-view': 'baixa',
+    'api_autocompletar_livros': 'baixa',
+}
+# Fração da capacidade que cada prioridade pode ocupar; o que sobra acima de 'normal' é a reserva da circulação.
+ADMISSAO_FRACOES = {'circulacao': 1.0, 'normal': 0.75, 'baixa': 0.5}
+# Segundos esperando vaga antes do 503.
+ADMISSAO_ESPERA = {'circulacao': 5.0, 'normal': 0.5, 'baixa': 0.0}
+
+# ==============================
+# 🐢 CONSULTAS LENTAS (core.monitor_sql)
+# ==============================
+SQL_MONITOR = os.getenv('SQL_MONITOR', 'True').lower() in ['true', '1', 'yes']
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SQL_MONITOR_AMOSTRAS = int(os.getenv('SQL_MONITOR_AMOSTRAS', '500'))  # janela por impressão digital
+SQL_MONITOR_FLUSH = int(os.getenv('SQL_MONITOR_FLUSH', '60'))  # segundos entre gravações
+SQL_MONITOR_DIR = os.getenv('SQL_MONITOR_DIR', os.path.join(tempfile.gettempdir(), 'garoca_sql'))
+
+# ==============================
+# ✉️ E-MAIL
+# ==============================
+EMAIL_BACKEND = os.getenv(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.console.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend',
+)
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() in ['true', '1', 'yes']
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', '30'))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Garoca Libro <nao-responda@localhost>')
+# Usado com EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', os.path.join(tempfile.gettempdir(), 'garoca_emails'))
+
+# ==============================
+# 📅 CIRCULAÇÃO
+# ==============================
+# Dias de tolerância após a data agendada antes de o agendamento expirar.
+AGENDAMENTO_TOLERANCIA_DIAS = int(os.getenv('AGENDAMENTO_TOLERANCIA_DIAS', '1'))
+# Com quantos dias de antecedência o leitor é lembrado da devolução.
+LEMBRETE_DIAS_ANTES = int(os.getenv('LEMBRETE_DIAS_ANTES', '2'))
+# Empréstimos finalizados há mais que isso vão para o histórico (arquivar_emprestimos).
+ARQUIVO_EMPRESTIMOS_DIAS = int(os.getenv('ARQUIVO_EMPRESTIMOS_DIAS', '365'))
+# Empréstimos por página no histórico do leitor (core.arquivo.emprestimos_do_leitor).
+HISTORICO_POR_PAGINA = int(os.getenv('HISTORICO_POR_PAGINA', '25'))
+# Respostas guardadas para retransmissões com Idempotency-Key (core.idempotencia, limpar_idempotencia).
+IDEMPOTENCIA_TTL = int(os.getenv('IDEMPOTENCIA_TTL', '86400'))  # segundos
+IDEMPOTENCIA_MAX_BYTES = int(os.getenv('IDEMPOTENCIA_MAX_BYTES', '65536'))  # maior corpo guardado
+
+# ==============================
+# 📖 RECOMENDAÇÕES (core.recomendacoes)
+# ==============================
+RECOMENDACOES_TOP = int(os.getenv('RECOMENDACOES_TOP', '10'))  # guardadas por livro
+RECOMENDACOES_POR_LEITOR = int(os.getenv('RECOMENDACOES_POR_LEITOR', '100'))  # livros recentes de cada leitor
+RECOMENDACOES_MINIMO_LEITORES = int(os.getenv('RECOMENDACOES_MINIMO_LEITORES', '2'))
+RECOMENDACOES_CACHE_TIMEOUT = int(os.getenv('RECOMENDACOES_CACHE_TIMEOUT', '3600'))  # segundos
+
+# ==============================
+# 🔎 CATÁLOGO POR FACETAS (core.facetas)
+# ==============================
+FACETAS_AUTORES = int(os.getenv('FACETAS_AUTORES', '30'))  # autores listados no filtro
+FACETAS_CACHE_TIMEOUT = int(os.getenv('FACETAS_CACHE_TIMEOUT', '300'))  # segundos
+CATALOGO_POR_PAGINA = int(os.getenv('CATALOGO_POR_PAGINA', '25'))
+# Autocompletar de títulos e autores (core.autocompletar): índice em memória por processo.
+AUTOCOMPLETAR_LIMITE = int(os.getenv('AUTOCOMPLETAR_LIMITE', '10'))
+AUTOCOMPLETAR_INTERVALO_MINIMO = int(os.getenv('AUTOCOMPLETAR_INTERVALO_MINIMO', '30'))  # segundos entre remontagens
+AUTOCOMPLETAR_MAX_IDADE = int(os.getenv('AUTOCOMPLETAR_MAX_IDADE', '3600'))  # remonta mesmo sem aviso
+# Índice do dump bibliográfico usado por enriquecer_livros (core.bibliografia); refeito com --dump.
+BIBLIOGRAFIA_INDICE = os.getenv(
+    'BIBLIOGRAFIA_INDICE', os.path.join(tempfile.gettempdir(), 'garoca_bibliografia.sqlite3')
+)
+
+# ==============================
+# 🧵 TAREFAS EM SEGUNDO PLANO (core.tarefas)
+# ==============================
+# Use core.tarefas.BrokerImediato para executar tudo na hora, sem worker.
+TAREFAS_BROKER = os.getenv('TAREFAS_BROKER', 'core.tarefas.BrokerBanco')
+TAREFAS_MODULOS = ['core.notificacoes']
+TAREFAS_TENTATIVAS = int(os.getenv('TAREFAS_TENTATIVAS', '3'))
+TAREFAS_BACKOFF_BASE = float(os.getenv('TAREFAS_BACKOFF_BASE', '10'))  # segundos
+TAREFAS_BACKOFF_MAX = float(os.getenv('TAREFAS_BACKOFF_MAX', '3600'))  # segundos
+TAREFAS_TIMEOUT = int(os.getenv('TAREFAS_TIMEOUT', '900'))  # segundos até uma execução ser dada como abandonada
 
 # ==============================
 # 🔑 SENHAS E AUTENTICAÇÃO
@@ -244,6 +417,10 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'level': 'DEBUG' if DEBUG else 'ERROR',
         },
+        'avisos': {
+            'class': 'logging.StreamHandler',
+            'level': 'WARNING',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -255,6 +432,11 @@ LOGGING = {
             'level': 'DEBUG' if DEBUG else 'ERROR',
             'propagate': False,
         },
+        'core.monitor_sql': {
+            'handlers': ['avisos'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
         'storages.backends.s3boto3': {
             'handlers': ['console'],
             'level': 'DEBUG' if DEBUG else 'ERROR',
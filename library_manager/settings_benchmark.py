@@ -0,0 +1,16 @@
+"""
+Configurações usadas pelo gunicorn do benchmark (core/benchmark.py).
+
+Mesmo projeto de produção, mas servido em HTTP puro na máquina local e sem
+exigir o manifest do collectstatic. O banco vem de JAWSDB_URL, definido pelo
+comando medir_desempenho.
+"""
+from library_manager.settings import *  # noqa: F401,F403
+
+DEBUG = False
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+SECURE_SSL_REDIRECT = False
+SECURE_HSTS_SECONDS = 0
+SESSION_COOKIE_SECURE = False
+CSRF_COOKIE_SECURE = False
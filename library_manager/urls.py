@@ -2,12 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
-from core.views import home_view
+from core.views import home_view, metricas_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', home_view, name='home'),  # A vírgula extra foi removida aqui
     path('core/', include('core.urls')),
+    path('metrics', metricas_view, name='metricas'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG: